@@ -0,0 +1,189 @@
+import calendar
+import datetime
+from itertools import islice
+from decimal import Decimal
+
+import numpy as np
+
+
+SISTEMA_DIRECTO = 'directo'
+SISTEMA_FRANCES = 'frances'
+SISTEMA_ALEMAN = 'aleman'
+SISTEMAS = (SISTEMA_DIRECTO, SISTEMA_FRANCES, SISTEMA_ALEMAN)
+
+TAMANO_LOTE_PROYECCION = 20000
+
+
+def cronogramas(montos, tasas, meses, sistemas):
+    """
+    Calcula el cronograma completo de muchos préstamos a la vez.
+
+    `montos`, `tasas` (en %), `meses` y `sistemas` son secuencias paralelas de largo L.
+    En el sistema directo la tasa es el interés total sobre el capital (como siempre
+    lo calculó Prestamo); en el francés y el alemán es la tasa nominal anual.
+
+    Devuelve un dict de arrays L x N (N = plazo más largo) con capital, interes, cuota y
+    saldo (capital pendiente después de cada cuota), redondeados a centavos, más la
+    máscara `activa` de las cuotas que existen. La última cuota absorbe el redondeo,
+    así que el capital siempre suma exactamente el monto prestado.
+    """
+    montos = np.asarray(montos, dtype=np.float64)
+    tasas = np.asarray(tasas, dtype=np.float64) / 100
+    meses = np.asarray(meses, dtype=np.int64)
+    sistemas = np.asarray(sistemas)
+
+    plazo = int(meses.max()) if meses.size else 0
+    k = np.arange(1, plazo + 1)
+    activa = k[None, :] <= meses[:, None]
+
+    P = montos[:, None]
+    n = meses[:, None].astype(np.float64)
+    capital = np.zeros((montos.size, plazo))
+    interes = np.zeros((montos.size, plazo))
+
+    directo = sistemas == SISTEMA_DIRECTO
+    if directo.any():
+        capital[directo] = np.broadcast_to(P[directo] / n[directo], (directo.sum(), plazo))
+        interes[directo] = np.broadcast_to(P[directo] * tasas[directo, None] / n[directo], (directo.sum(), plazo))
+
+    mensual = tasas[:, None] / 12
+    frances = sistemas == SISTEMA_FRANCES
+    if frances.any():
+        i, p, m = mensual[frances], P[frances], n[frances]
+        con_tasa = i > 0
+        factor = np.power(1 + i, -m)
+        cuota = np.where(con_tasa, p * i / np.where(con_tasa, 1 - factor, 1), p / m)
+        crecimiento = np.power(1 + i, k - 1)
+        # saldo antes de pagar la cuota k: P(1+i)^(k-1) - cuota((1+i)^(k-1) - 1)/i
+        saldo_previo = np.where(
+            con_tasa,
+            p * crecimiento - cuota * (crecimiento - 1) / np.where(con_tasa, i, 1),
+            p - cuota * (k - 1),
+        )
+        interes[frances] = saldo_previo * i
+        capital[frances] = cuota - interes[frances]
+
+    aleman = sistemas == SISTEMA_ALEMAN
+    if aleman.any():
+        amortizacion = P[aleman] / n[aleman]
+        capital[aleman] = np.broadcast_to(amortizacion, (aleman.sum(), plazo))
+        interes[aleman] = (P[aleman] - amortizacion * (k - 1)) * mensual[aleman]
+
+    capital = np.where(activa, np.round(capital, 2), 0)
+    interes = np.where(activa, np.round(interes, 2), 0)
+
+    # la última cuota ajusta el redondeo: el capital cierra en cero y, en el sistema
+    # directo, el interés suma exactamente el recargo pactado
+    filas = np.arange(montos.size)
+    ultima = meses - 1
+    if montos.size and plazo:
+        capital[filas, ultima] = 0
+        capital[filas, ultima] = np.round(montos - capital.sum(axis=1), 2)
+        recargo = np.round(montos[directo] * tasas[directo], 2)
+        interes[filas[directo], ultima[directo]] = 0
+        interes[filas[directo], ultima[directo]] = np.round(recargo - interes[directo].sum(axis=1), 2)
+
+    # + 0.0 descarta los -0.0 que deja el redondeo
+    saldo = np.where(activa, np.round(montos[:, None] - np.cumsum(capital, axis=1), 2), 0) + 0.0
+    return {
+        'capital': capital,
+        'interes': interes,
+        'cuota': np.round(capital + interes, 2),
+        'saldo': saldo,
+        'activa': activa,
+    }
+
+
+def sumar_meses(fecha, cantidad):
+    mes = fecha.month - 1 + cantidad
+    anio = fecha.year + mes // 12
+    mes = mes % 12 + 1
+    return datetime.date(anio, mes, min(fecha.day, calendar.monthrange(anio, mes)[1]))
+
+
+def centavos(valor):
+    return Decimal(f"{valor:.2f}")
+
+
+def resumen_prestamo(monto, tasa, meses, sistema):
+    """
+    Devuelve (pago_total, primera_cuota) de un préstamo individual.
+    """
+    cronograma = cronogramas([float(monto)], [float(tasa)], [int(meses)], [sistema])
+    return centavos(cronograma['cuota'][0].sum()), centavos(cronograma['cuota'][0, 0])
+
+
+def construir_cuotas(prestamos):
+    """
+    Arma (sin guardar) las CuotaPrestamo de todos los préstamos recibidos, listas para bulk_create.
+    """
+    from .models import CuotaPrestamo
+
+    prestamos = list(prestamos)
+    if not prestamos:
+        return []
+    cronograma = cronogramas(
+        [float(p.monto_prestado) for p in prestamos],
+        [float(p.interes) for p in prestamos],
+        [int(p.meses_duracion) for p in prestamos],
+        [p.sistema for p in prestamos],
+    )
+    cuotas = []
+    for fila, prestamo in enumerate(prestamos):
+        for columna in range(int(prestamo.meses_duracion)):
+            cuotas.append(CuotaPrestamo(
+                prestamo=prestamo,
+                numero=columna + 1,
+                fecha_vencimiento=sumar_meses(prestamo.fecha_inicio, columna + 1),
+                capital=centavos(cronograma['capital'][fila, columna]),
+                interes=centavos(cronograma['interes'][fila, columna]),
+                cuota=centavos(cronograma['cuota'][fila, columna]),
+                saldo_restante=centavos(cronograma['saldo'][fila, columna]),
+            ))
+    return cuotas
+
+
+def generar_cronogramas(prestamos, tamano_lote=2000):
+    """
+    Calcula y guarda el cronograma de los préstamos recibidos. Devuelve las cuotas creadas.
+    """
+    from .models import CuotaPrestamo
+
+    creadas = 0
+    lote = []
+    for prestamo in prestamos:
+        lote.append(prestamo)
+        if len(lote) == tamano_lote:
+            creadas += len(CuotaPrestamo.objects.bulk_create(construir_cuotas(lote), batch_size=5000))
+            lote = []
+    if lote:
+        creadas += len(CuotaPrestamo.objects.bulk_create(construir_cuotas(lote), batch_size=5000))
+    return creadas
+
+
+def proyectar_cartera(filas, desde, horizonte=12):
+    """
+    Proyecta capital, interés y cuota a cobrar por mes calendario para una cartera.
+
+    `filas` es un iterable de (monto, tasa, meses, sistema, fecha_inicio). `desde` es el
+    primer mes de la proyección. Devuelve arrays de largo `horizonte` por concepto.
+    """
+    totales = {concepto: np.zeros(horizonte) for concepto in ('capital', 'interes', 'cuota')}
+    cantidad = np.zeros(horizonte, dtype=np.int64)
+    base = desde.year * 12 + desde.month - 1
+
+    filas = iter(filas)
+    while lote := list(islice(filas, TAMANO_LOTE_PROYECCION)):
+        montos, tasas, meses, sistemas, fechas = zip(*lote)
+        cronograma = cronogramas(montos, tasas, meses, sistemas)
+
+        # mes calendario de cada cuota relativo a `desde`: la cuota k vence k meses después del inicio
+        inicio = np.array([f.year * 12 + f.month - 1 for f in fechas]) - base
+        columna = inicio[:, None] + np.arange(1, cronograma['activa'].shape[1] + 1)[None, :]
+        dentro = cronograma['activa'] & (columna >= 0) & (columna < horizonte)
+        for concepto in totales:
+            np.add.at(totales[concepto], columna[dentro], cronograma[concepto][dentro])
+        np.add.at(cantidad, columna[dentro], 1)
+
+    totales['cuotas'] = cantidad
+    return totales
@@ -0,0 +1,237 @@
+import json
+import random
+import statistics
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from sucursales.models import Sucursal
+from usuarios.models import Usuario
+from . import cartera
+from .amortizacion import generar_cronogramas
+from .models import Cuenta, Facturador, Prestamo, SaldoSnapshot, Servicios, Transferencia
+from .numeracion import numeros_cuenta
+
+
+PASSWORD = 'benchmark-1234'
+SERVICIOS = ['Luz', 'Internet', 'Escolar', 'Comida', 'Viaje', 'Negocios', 'Varios']
+
+
+def sembrar(clientes=200, historial=20, prefijo='bench'):
+    """
+    Carga un conjunto de datos realista: clientes con una cuenta con saldo, historial
+    de transferencias y pagos, y préstamos en distintos estados. Devuelve los usernames.
+    """
+    sucursal = Sucursal.objects.filter(id=1).first() or Sucursal.objects.create(
+        id=1, nombre=f'{prefijo} central', direccion=f'{prefijo} calle 1'
+    )
+    # un solo hash para todos: sembrar no debería medir PBKDF2
+    password = make_password(PASSWORD)
+    usuarios = Usuario.objects.bulk_create([
+        Usuario(username=f'{prefijo}{i}', password=password, email=f'{prefijo}{i}@example.com', sucursal=sucursal)
+        for i in range(clientes)
+    ])
+    Usuario.objects.create_user(
+        username=f'{prefijo}-empleado', password=PASSWORD, es_empleado=True, sucursal=sucursal
+    )
+
+    cuentas = Cuenta.objects.bulk_create([
+        Cuenta(usuario=usuario, tipo_cuenta='ahorro', balance_pesos=Decimal('1000000'), numero_cuenta=numero)
+        for usuario, numero in zip(usuarios, numeros_cuenta(len(usuarios)))
+    ])
+    # el saldo inicial queda como punto de partida del libro mayor
+    SaldoSnapshot.objects.bulk_create([
+        SaldoSnapshot(cuenta=cuenta, balance_pesos=cuenta.balance_pesos) for cuenta in cuentas
+    ])
+
+    azar = random.Random(0)
+    ahora = timezone.now()
+    facturadores = {facturador.nombre: facturador for facturador in Facturador.objects.filter(nombre__in=SERVICIOS)}
+    transferencias, pagos, prestamos = [], [], []
+    for cuenta, usuario in zip(cuentas, usuarios):
+        for _ in range(historial):
+            destino = azar.choice(cuentas)
+            if destino.id != cuenta.id:
+                transferencias.append(Transferencia(
+                    cuenta_origen=cuenta, cuenta_destino=destino, monto=Decimal(azar.randint(1, 5000)),
+                    username_emisor=usuario.username, username_receptor=destino.usuario.username,
+                ))
+            servicio = azar.choice(SERVICIOS)
+            pagos.append(Servicios(
+                cuenta=cuenta, facturador=facturadores.get(servicio), servicio=servicio,
+                monto=Decimal(azar.randint(1, 500)),
+            ))
+        prestamos.append(Prestamo(
+            cuenta=cuenta, monto_prestado=Decimal(azar.randint(1000, 100000)), interes=Decimal('10'),
+            meses_duracion=azar.choice([6, 12, 24]), estado=azar.choice(['pendiente', 'aprobado']),
+            pago_total=0, cuota_mensual=0, fecha_inicio=ahora.date(),
+        ))
+    for prestamo in prestamos:
+        prestamo.calcular_cuotas()
+    Transferencia.objects.bulk_create(transferencias, batch_size=1000)
+    Servicios.objects.bulk_create(pagos, batch_size=1000)
+    prestamos = Prestamo.objects.bulk_create(prestamos, batch_size=1000)
+    generar_cronogramas(prestamos)
+    for estado in ('pendiente', 'aprobado'):
+        cartera.mover([p for p in prestamos if p.estado == estado], None, estado)
+    return [usuario.username for usuario in usuarios]
+
+
+def escenarios(usernames):
+    """
+    Cada escenario es (nombre, metodo, ruta, cuerpo); el cuerpo puede depender del cliente.
+    """
+    def destino(username):
+        return random.choice([u for u in usernames[:50] if u != username] or usernames)
+
+    return [
+        ('resumen', 'get', '/api/finanzas/resumen/', None),
+        ('cuentas', 'get', '/api/finanzas/cuentas/', None),
+        ('transferencias_listado', 'get', '/api/finanzas/transferencias/', None),
+        ('pagos_listado', 'get', '/api/finanzas/pagos/', None),
+        ('prestamos_listado', 'get', '/api/finanzas/prestamos/', None),
+        ('transferencia', 'post', '/api/finanzas/transferencias/',
+         lambda username: {'destinatario': destino(username), 'monto': '1.00', 'descripcion': 'benchmark'}),
+        ('pago', 'post', '/api/finanzas/pagos/', None),
+        ('prestamo', 'post', '/api/finanzas/prestamos/', None),
+    ]
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    if not ordenados:
+        return None
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados) + 0.5) - 1))
+    return ordenados[indice]
+
+
+def resumir(muestras, duracion):
+    latencias = [m['ms'] for m in muestras]
+    consultas = [m['consultas'] for m in muestras if m.get('consultas') is not None]
+    resultado = {
+        'solicitudes': len(muestras),
+        'errores': sum(1 for m in muestras if m['status'] >= 400),
+        'throughput_rps': round(len(muestras) / duracion, 2) if duracion else None,
+        'media_ms': round(statistics.fmean(latencias), 3) if latencias else None,
+        'p50_ms': round(percentil(latencias, 50), 3) if latencias else None,
+        'p95_ms': round(percentil(latencias, 95), 3) if latencias else None,
+        'p99_ms': round(percentil(latencias, 99), 3) if latencias else None,
+    }
+    if consultas:
+        resultado['consultas_promedio'] = round(statistics.fmean(consultas), 2)
+        resultado['consultas_max'] = max(consultas)
+    return resultado
+
+
+class DriverLocal:
+    # usa el test client de Django en el mismo proceso: permite contar las consultas SQL
+    def __init__(self):
+        self.client = Client()
+
+    def solicitar(self, metodo, ruta, cuerpo=None, token=None):
+        encabezados = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            if metodo == 'get':
+                respuesta = self.client.get(ruta, **encabezados)
+            else:
+                respuesta = self.client.post(ruta, data=json.dumps(cuerpo or {}), content_type='application/json',
+                                             **encabezados)
+            ms = (time.perf_counter() - inicio) * 1000
+        datos = respuesta.json() if respuesta.get('Content-Type', '').startswith('application/json') else None
+        return {'status': respuesta.status_code, 'ms': ms, 'consultas': len(consultas), 'datos': datos}
+
+
+class DriverHTTP:
+    # pega contra un servidor real; no puede contar consultas
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def solicitar(self, metodo, ruta, cuerpo=None, token=None):
+        datos = json.dumps(cuerpo or {}).encode() if metodo == 'post' else None
+        pedido = urllib.request.Request(self.url + ruta, data=datos, method=metodo.upper())
+        pedido.add_header('Content-Type', 'application/json')
+        if token:
+            pedido.add_header('Authorization', f'Bearer {token}')
+        inicio = time.perf_counter()
+        try:
+            with urllib.request.urlopen(pedido) as respuesta:
+                contenido, status = respuesta.read(), respuesta.status
+        except urllib.error.HTTPError as e:
+            contenido, status = e.read(), e.code
+        ms = (time.perf_counter() - inicio) * 1000
+        try:
+            return {'status': status, 'ms': ms, 'consultas': None, 'datos': json.loads(contenido)}
+        except ValueError:
+            return {'status': status, 'ms': ms, 'consultas': None, 'datos': None}
+
+
+def _cuerpo(nombre, cuerpo, username, cuenta_id):
+    if callable(cuerpo):
+        return cuerpo(username)
+    if nombre == 'pago':
+        return {'cuenta': cuenta_id, 'servicio': random.choice(SERVICIOS), 'monto': '1.00'}
+    if nombre == 'prestamo':
+        return {'cuenta': cuenta_id, 'monto_prestado': '10000', 'interes': '10', 'meses_duracion': 12}
+    return cuerpo
+
+
+def ejecutar(driver, usernames, iteraciones=50, concurrencia=1, incluir=None):
+    """
+    Corre cada escenario `iteraciones` veces repartido entre `concurrencia` hilos y devuelve
+    las métricas por endpoint. El login se mide aparte porque además provee los tokens.
+    """
+    sesiones = {}
+    muestras_login = []
+    inicio = time.perf_counter()
+    for username in usernames[:max(iteraciones, concurrencia)]:
+        muestra = driver.solicitar('post', '/api/usuarios/login/', {'username': username, 'password': PASSWORD})
+        muestras_login.append(muestra)
+        if muestra['datos'] and 'access' in muestra['datos']:
+            sesiones[username] = muestra['datos']['access']
+    resultados = {'login': resumir(muestras_login, time.perf_counter() - inicio)}
+    if not sesiones:
+        return resultados
+
+    cuentas = dict(Cuenta.objects.filter(usuario__username__in=sesiones).values_list('usuario__username', 'id'))
+    lock = threading.Lock()
+
+    for nombre, metodo, ruta, cuerpo in escenarios(usernames):
+        if incluir and nombre not in incluir:
+            continue
+        muestras = []
+        clientes = list(sesiones.items())
+
+        def trabajar(i, nombre=nombre, metodo=metodo, ruta=ruta, cuerpo=cuerpo, muestras=muestras):
+            username, token = clientes[i % len(clientes)]
+            muestra = driver.solicitar(metodo, ruta, _cuerpo(nombre, cuerpo, username, cuentas.get(username)), token)
+            with lock:
+                muestras.append(muestra)
+
+        inicio = time.perf_counter()
+        if concurrencia > 1:
+            with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+                list(pool.map(trabajar, range(iteraciones)))
+        else:
+            for i in range(iteraciones):
+                trabajar(i)
+        resultados[nombre] = resumir(muestras, time.perf_counter() - inicio)
+    return resultados
+
+
+def commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
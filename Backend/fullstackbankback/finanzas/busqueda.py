@@ -0,0 +1,449 @@
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import connection
+
+from usuarios.models import Usuario
+
+from .models import Cuenta
+
+
+CONFIGURACION = {
+    # armarlo al arrancar el worker (wsgi/asgi) en lugar de en la primera búsqueda
+    'PRECARGAR': False,
+    # cada cuánto se rearma el índice para ver los cambios hechos en otros procesos (None: nunca)
+    'DURACION': 900,
+    # con más clientes no se arma: la búsqueda responde 503 en lugar de agotar la memoria del worker
+    'MAXIMO_CLIENTES': 2000000,
+}
+LIMITE_CANDIDATOS = 1000
+LIMITE_RESULTADOS = 200
+MAXIMO_PALABRAS = 5
+UMBRAL_SIMILITUD = 0.4
+# hasta cuántos términos nuevos o borrados se insertan de a uno en la lista ordenada; con más se fusiona entera
+CAMBIOS_PUNTUALES = 64
+FIN_PREFIJO = '\U0010ffff'
+NO_DIGITOS = re.compile(r'\D')
+CAMPOS_USUARIO = ('username', 'first_name', 'last_name', 'email', 'telefono')
+
+
+def configuracion():
+    return {**CONFIGURACION, **getattr(settings, 'BUSQUEDA_CLIENTES', {})}
+
+
+class IndiceExcedido(Exception):
+    pass
+
+
+def normalizar(texto):
+    # minúsculas y sin tildes: "Pérez" y "perez" son el mismo término
+    texto = str(texto or '')
+    if not texto.isascii():
+        texto = ''.join(caracter for caracter in unicodedata.normalize('NFKD', texto)
+                        if not unicodedata.combining(caracter))
+    return texto.lower().strip()
+
+
+def solo_digitos(texto):
+    return NO_DIGITOS.sub('', str(texto or ''))
+
+
+def es_numerica(consulta):
+    # teléfonos y números de cuenta se buscan por sus dígitos, sin importar guiones ni espacios
+    return len(solo_digitos(consulta)) >= 2 and all(caracter.isdigit() or caracter in ' -+()' for caracter in consulta)
+
+
+def trigramas(termino):
+    relleno = f"  {termino} "
+    return frozenset(relleno[i:i + 3] for i in range(len(relleno) - 2))
+
+
+def terminos_usuario(username, first_name, last_name, email, telefono):
+    """
+    Devuelve (terminos, nombres) de un cliente: los términos buscables por prefijo y, de
+    ellos, las palabras del nombre y el apellido, que además se buscan aproximadas.
+    """
+    nombres = tuple(dict.fromkeys(normalizar(f"{first_name or ''} {last_name or ''}").replace('-', ' ').split()))
+    terminos = (normalizar(username), normalizar(email), solo_digitos(telefono), *nombres)
+    return tuple(dict.fromkeys(termino for termino in terminos if termino)), nombres
+
+
+class _Particion:
+    """
+    Índice de los clientes de una sucursal: una lista ordenada de términos para buscar por
+    prefijo con bisect, los clientes de cada término, y un índice de trigramas sobre el
+    vocabulario de nombres para las búsquedas aproximadas.
+
+    Cada cliente se guarda como (terminos, nombres, cuentas), con las cuentas por sus dígitos.
+    """
+
+    def __init__(self):
+        self.terminos = []
+        # término -> id del cliente, o set de ids si lo comparten varios (casi todos son únicos)
+        self.postings = {}
+        self.nombres = {}
+        self.trigramas_de = {}
+        self.por_trigrama = {}
+        self.usuarios = {}
+
+    def _agregar_posting(self, termino, usuario_id):
+        actual = self.postings.get(termino)
+        if actual is None:
+            self.postings[termino] = usuario_id
+        elif isinstance(actual, set):
+            actual.add(usuario_id)
+        elif actual != usuario_id:
+            self.postings[termino] = {actual, usuario_id}
+
+    def _quitar_posting(self, termino, usuario_id):
+        actual = self.postings.get(termino)
+        if isinstance(actual, set):
+            actual.discard(usuario_id)
+            if len(actual) == 1:
+                self.postings[termino] = next(iter(actual))
+        elif actual == usuario_id:
+            del self.postings[termino]
+
+    def _contar_nombre(self, nombre, cantidad):
+        self.nombres[nombre] = self.nombres.get(nombre, 0) + cantidad
+        if self.nombres[nombre] <= 0:
+            del self.nombres[nombre]
+            for trigrama in self.trigramas_de.pop(nombre):
+                self.por_trigrama[trigrama].discard(nombre)
+                if not self.por_trigrama[trigrama]:
+                    del self.por_trigrama[trigrama]
+        elif nombre not in self.trigramas_de:
+            self.trigramas_de[nombre] = trigramas(nombre)
+            for trigrama in self.trigramas_de[nombre]:
+                self.por_trigrama.setdefault(trigrama, set()).add(nombre)
+
+    def aplicar(self, cambios):
+        """
+        `cambios` es una lista de (usuario_id, (terminos, nombres, cuentas)), o (usuario_id,
+        None) para sacarlo. Los términos que aparecen o desaparecen se llevan a la lista
+        ordenada al final: de a uno si son pocos, fusionando la lista entera si son muchos.
+        """
+        vacia = not self.postings
+        antes = {}
+        for usuario_id, nueva in cambios:
+            vieja = self.usuarios.pop(usuario_id, None)
+            if vieja is not None:
+                # un término repetido (la cuenta igual al teléfono) no molesta: los postings lo toleran
+                for termino in vieja[0] + vieja[2]:
+                    antes.setdefault(termino, True)
+                    self._quitar_posting(termino, usuario_id)
+                for nombre in vieja[1]:
+                    self._contar_nombre(nombre, -1)
+            if nueva is not None:
+                self.usuarios[usuario_id] = nueva
+                for termino in nueva[0] + nueva[2]:
+                    if not vacia:
+                        antes.setdefault(termino, termino in self.postings)
+                    self._agregar_posting(termino, usuario_id)
+                for nombre in nueva[1]:
+                    self._contar_nombre(nombre, 1)
+
+        if vacia:
+            # la carga inicial: se ordena una sola vez
+            self.terminos = sorted(self.postings)
+            return
+        agregados = sorted(termino for termino, estaba in antes.items() if not estaba and termino in self.postings)
+        borrados = {termino for termino, estaba in antes.items() if estaba and termino not in self.postings}
+        if len(agregados) + len(borrados) <= CAMBIOS_PUNTUALES:
+            for termino in borrados:
+                del self.terminos[bisect_left(self.terminos, termino)]
+            for termino in agregados:
+                insort(self.terminos, termino)
+        else:
+            self.terminos = [termino for termino in heapq.merge(self.terminos, agregados) if termino not in borrados]
+
+    def _usuarios_de(self, termino):
+        actual = self.postings.get(termino)
+        return actual if isinstance(actual, set) else (actual,)
+
+    def _parecidos(self, palabra):
+        """
+        Nombres del vocabulario parecidos a la palabra, del más parecido al menos. Los
+        candidatos salen de sus trigramas menos frecuentes (los muy comunes, como "ez ",
+        traerían medio vocabulario) y a cada uno se le calcula la similitud exacta.
+        """
+        if len(palabra) < 3:
+            return []
+        propios = trigramas(palabra)
+        listas = sorted((self.por_trigrama.get(trigrama, ()) for trigrama in propios), key=len)
+        nombres = set()
+        for lista in listas:
+            if nombres and len(nombres) + len(lista) > LIMITE_CANDIDATOS:
+                break
+            nombres.update(lista)
+        parecidos = []
+        for nombre in nombres:
+            ajenos = self.trigramas_de[nombre]
+            comunes = len(propios & ajenos)
+            valor = comunes / (len(propios) + len(ajenos) - comunes)
+            if valor >= UMBRAL_SIMILITUD:
+                parecidos.append((valor, nombre))
+        parecidos.sort(reverse=True)
+        return parecidos
+
+    def _puntaje(self, palabra, propios, usuario_id):
+        # 3 si algún término es la palabra, 2 si empieza con ella, la similitud si un nombre se le parece
+        entrada = self.usuarios[usuario_id]
+        mejor = 0
+        for termino in entrada[0] + entrada[2]:
+            if termino == palabra:
+                return 3
+            if termino.startswith(palabra):
+                mejor = 2
+        if mejor or len(palabra) < 3:
+            return mejor
+        for nombre in entrada[1]:
+            ajenos = self.trigramas_de[nombre]
+            comunes = len(propios & ajenos)
+            if comunes:
+                mejor = max(mejor, comunes / (len(propios) + len(ajenos) - comunes))
+        return mejor if mejor >= UMBRAL_SIMILITUD else 0
+
+    def _filtrar(self, puntajes, palabras):
+        for palabra in palabras:
+            propios = trigramas(palabra)
+            for usuario_id in list(puntajes):
+                puntaje = self._puntaje(palabra, propios, usuario_id)
+                if puntaje:
+                    puntajes[usuario_id] += puntaje
+                else:
+                    del puntajes[usuario_id]
+        return puntajes
+
+    def buscar(self, palabras):
+        """
+        Devuelve (ids, limitado): los ids de los clientes que coinciden con todas las palabras,
+        del más parecido al menos, y si se cortaron en LIMITE_CANDIDATOS o LIMITE_RESULTADOS
+        (entonces hay más coincidencias que las devueltas). Los candidatos salen de la palabra más selectiva (la de menos
+        términos con ese prefijo) y las demás se verifican sobre los términos de cada uno.
+        Una palabra con la que no empieza ningún término se busca por trigramas.
+        """
+        rangos = []
+        for palabra in palabras:
+            inicio = bisect_left(self.terminos, palabra)
+            fin = bisect_left(self.terminos, palabra + FIN_PREFIJO, inicio)
+            rangos.append((fin - inicio, inicio, fin, palabra))
+        rangos.sort()
+        _, inicio, fin, pivote = rangos[0]
+        otras = [palabra for _, _, _, palabra in rangos[1:]]
+
+        candidatos = {}
+        limitado = False
+        for posicion in range(inicio, fin):
+            termino = self.terminos[posicion]
+            for usuario_id in self._usuarios_de(termino):
+                candidatos[usuario_id] = max(candidatos.get(usuario_id, 0), 3 if termino == pivote else 2)
+            if len(candidatos) >= LIMITE_CANDIDATOS:
+                limitado = posicion + 1 < fin
+                break
+        if inicio == fin:
+            # ningún término empieza con la palabra: probablemente esté mal escrita
+            parecidos = self._parecidos(pivote)
+            for posicion, (valor, nombre) in enumerate(parecidos):
+                for usuario_id in self._usuarios_de(nombre):
+                    candidatos.setdefault(usuario_id, valor)
+                if len(candidatos) >= LIMITE_CANDIDATOS:
+                    limitado = posicion + 1 < len(parecidos)
+                    break
+        puntajes = self._filtrar(candidatos, otras)
+
+        # a igual puntaje, por username (el primer término de cada cliente)
+        ordenados = sorted(puntajes, key=lambda usuario_id: (-puntajes[usuario_id], self.usuarios[usuario_id][0][0]))
+        return ordenados[:LIMITE_RESULTADOS], limitado or len(ordenados) > LIMITE_RESULTADOS
+
+
+class IndiceClientes:
+    """
+    Índice en memoria de los clientes para la búsqueda del personal, particionado por
+    sucursal. Se arma entero con dos consultas la primera vez que se busca y después se
+    actualiza de a un cliente desde las señales (y desde las altas y correcciones masivas).
+
+    Los cambios hechos en otros procesos se ven al rearmarlo, cada DURACION segundos: el
+    rearmado corre en un hilo y mientras tanto se sigue buscando en el índice anterior, así
+    que en ese rato el proceso tiene los dos en memoria. El tamaño y el dimensionado de los
+    workers están en BUSQUEDA_CLIENTES, en settings.
+    """
+
+    def __init__(self, duracion=None):
+        # sin duración, la de BUSQUEDA_CLIENTES
+        self.duracion = duracion
+        self._particiones = None
+        self._vence = 0
+        self._pendientes = None
+        self._lock = threading.Lock()
+        self._carga = threading.Lock()
+
+    @staticmethod
+    def _leer():
+        cuentas = {}
+        for usuario_id, numero in Cuenta.objects.exclude(numero_cuenta=None).values_list(
+                'usuario_id', 'numero_cuenta').iterator(chunk_size=10000):
+            cuentas.setdefault(usuario_id, []).append(solo_digitos(numero))
+        clientes = Usuario.objects.filter(es_empleado=False).values_list('id', 'sucursal_id', *CAMPOS_USUARIO)
+        for usuario_id, sucursal_id, *textos in clientes.iterator(chunk_size=10000):
+            yield usuario_id, sucursal_id, textos, tuple(cuentas.pop(usuario_id, ()))
+
+    def _duracion(self):
+        return self.duracion if self.duracion is not None else configuracion()['DURACION']
+
+    def _construir(self):
+        maximo = configuracion()['MAXIMO_CLIENTES']
+        if maximo is not None and Usuario.objects.filter(es_empleado=False).count() > maximo:
+            raise IndiceExcedido(f"Hay más de {maximo} clientes: el índice de búsqueda no se arma.")
+        cambios = {}
+        for usuario_id, sucursal_id, textos, cuentas in self._leer():
+            cambios.setdefault(sucursal_id, []).append((usuario_id, (*terminos_usuario(*textos), cuentas)))
+        particiones = {}
+        for sucursal_id, lista in cambios.items():
+            particiones[sucursal_id] = _Particion()
+            particiones[sucursal_id].aplicar(lista)
+        return particiones
+
+    def _recargar(self, si_falta=False):
+        with self._carga:
+            if si_falta and self._particiones is not None:
+                # otro hilo lo armó mientras este esperaba
+                return
+            with self._lock:
+                # lo que cambie mientras se lee la base se vuelve a aplicar sobre el índice nuevo
+                self._pendientes = []
+            try:
+                particiones = self._construir()
+            except Exception:
+                with self._lock:
+                    self._pendientes = None
+                raise
+            with self._lock:
+                pendientes, self._pendientes = self._pendientes, None
+                self._particiones = particiones
+                for operacion, argumentos in pendientes:
+                    operacion(*argumentos)
+                self._vence = time.monotonic() + (self._duracion() or 0)
+
+    def _recargar_en_segundo_plano(self, si_falta=False):
+        try:
+            self._recargar(si_falta)
+        finally:
+            connection.close()
+
+    def cargar(self):
+        # lo arma si todavía no existe; si venció, lanza el rearmado en segundo plano
+        if self._particiones is None:
+            self._recargar(si_falta=True)
+        elif self._duracion() is not None and self._vence <= time.monotonic() and not self._carga.locked():
+            self._vence = time.monotonic() + self._duracion()
+            threading.Thread(target=self._recargar_en_segundo_plano, daemon=True).start()
+
+    def precargar(self):
+        """
+        Con PRECARGAR, arma el índice en un hilo al arrancar el worker, para que la primera
+        búsqueda no espere el armado. Devuelve el hilo, o None.
+        """
+        if not configuracion()['PRECARGAR']:
+            return None
+        hilo = threading.Thread(target=self._recargar_en_segundo_plano, args=(True,), daemon=True)
+        hilo.start()
+        return hilo
+
+    def buscar(self, sucursal_id, consulta):
+        """
+        Devuelve (ids, limitado) con los clientes de la sucursal que coinciden con `consulta`,
+        del más parecido al menos (a lo sumo LIMITE_RESULTADOS; `limitado` indica que había
+        más). Lanza IndiceExcedido si hay más clientes que MAXIMO_CLIENTES. Cada palabra se busca como prefijo de username,
+        email, nombre o apellido, y aproximada (por trigramas) en nombre y apellido; una
+        consulta solo con dígitos se busca en teléfonos y números de cuenta.
+        """
+        if es_numerica(consulta):
+            palabras = [solo_digitos(consulta)]
+        else:
+            palabras = list(dict.fromkeys(normalizar(consulta).split()))[:MAXIMO_PALABRAS]
+        if not palabras:
+            return [], False
+        self.cargar()
+        with self._lock:
+            particion = self._particiones.get(sucursal_id)
+            return particion.buscar(palabras) if particion else ([], False)
+
+    def _aplicar(self, operacion, *argumentos):
+        # antes de la primera búsqueda no hay índice que mantener: se arma leyendo la base
+        with self._lock:
+            if self._pendientes is not None:
+                self._pendientes.append((operacion, argumentos))
+            if self._particiones is not None:
+                operacion(*argumentos)
+
+    def _ubicar(self, usuario_id):
+        # hay pocas sucursales: buscar al cliente en cada una es más barato que mantener otro diccionario
+        for sucursal_id, particion in self._particiones.items():
+            entrada = particion.usuarios.get(usuario_id)
+            if entrada is not None:
+                return sucursal_id, entrada
+        return None, None
+
+    def _aplicar_cambios(self, cambios):
+        for sucursal_id, lista in cambios.items():
+            self._particiones.setdefault(sucursal_id, _Particion()).aplicar(lista)
+
+    def _guardar_usuarios(self, registros):
+        cambios = {}
+        for usuario_id, sucursal_id, es_empleado, textos in registros:
+            anterior, entrada = self._ubicar(usuario_id)
+            if anterior is not None and (anterior != sucursal_id or es_empleado):
+                cambios.setdefault(anterior, []).append((usuario_id, None))
+            if not es_empleado:
+                cuentas = entrada[2] if entrada else ()
+                cambios.setdefault(sucursal_id, []).append((usuario_id, (*terminos_usuario(*textos), cuentas)))
+        self._aplicar_cambios(cambios)
+
+    def _cambiar_cuentas(self, numeros, agregar):
+        cambios = {}
+        for usuario_id, numero in numeros:
+            sucursal_id, entrada = self._ubicar(usuario_id)
+            numero = solo_digitos(numero)
+            if entrada is None or agregar == (numero in entrada[2]):
+                continue
+            cuentas = entrada[2] + (numero,) if agregar else tuple(otro for otro in entrada[2] if otro != numero)
+            cambios.setdefault(sucursal_id, []).append((usuario_id, (entrada[0], entrada[1], cuentas)))
+        self._aplicar_cambios(cambios)
+
+    def _quitar_usuarios(self, ids):
+        cambios = {}
+        for usuario_id in ids:
+            sucursal_id, _ = self._ubicar(usuario_id)
+            if sucursal_id is not None:
+                cambios.setdefault(sucursal_id, []).append((usuario_id, None))
+        self._aplicar_cambios(cambios)
+
+    def guardar_usuarios(self, registros):
+        """
+        `registros` es un iterable de (id, sucursal_id, es_empleado, (username, first_name,
+        last_name, email, telefono)). Los empleados se sacan del índice.
+        """
+        self._aplicar(self._guardar_usuarios, list(registros))
+
+    def quitar_usuarios(self, ids):
+        self._aplicar(self._quitar_usuarios, list(ids))
+
+    def agregar_cuentas(self, numeros):
+        # numeros: [(usuario_id, numero_cuenta)]
+        self._aplicar(self._cambiar_cuentas, list(numeros), True)
+
+    def quitar_cuentas(self, numeros):
+        self._aplicar(self._cambiar_cuentas, list(numeros), False)
+
+    def limpiar(self):
+        with self._lock:
+            self._particiones = None
+
+
+indice = IndiceClientes()
@@ -0,0 +1,138 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import Cuenta, Prestamo, ResumenCartera
+
+
+CENTAVOS = Decimal('0.01')
+CONCEPTOS = ('cantidad', 'capital', 'pago_total', 'cuota_mensual')
+
+
+def mes_de(fecha):
+    return fecha.replace(day=1)
+
+
+def _aplicar(deltas):
+    # deltas: (sucursal_id, estado, mes) -> [cantidad, capital, pago_total, cuota_mensual]
+    for (sucursal_id, estado, mes), valores in deltas.items():
+        if not any(valores):
+            continue
+        cambios = {concepto: F(concepto) + valor for concepto, valor in zip(CONCEPTOS, valores)}
+        fila = ResumenCartera.objects.filter(sucursal_id=sucursal_id, estado=estado, mes=mes)
+        if fila.update(**cambios):
+            continue
+        try:
+            with transaction.atomic():
+                ResumenCartera.objects.create(
+                    sucursal_id=sucursal_id, estado=estado, mes=mes, **dict(zip(CONCEPTOS, valores))
+                )
+        except IntegrityError:
+            # otra transacción creó la fila entre el UPDATE y el INSERT
+            fila.update(**cambios)
+
+
+def _sucursales(prestamos):
+    cuenta_ids = {prestamo.cuenta_id for prestamo in prestamos}
+    return dict(Cuenta.objects.filter(id__in=cuenta_ids).values_list('id', 'usuario__sucursal_id'))
+
+
+def mover(prestamos, estado_anterior, estado_nuevo):
+    """
+    Refleja en el resumen de cartera que los préstamos pasaron de `estado_anterior` a
+    `estado_nuevo`. Con estado_anterior None los suma (alta) y con estado_nuevo None los
+    resta (baja). Hace una consulta para las sucursales y un UPDATE por fila del resumen
+    afectada, nunca por préstamo.
+    """
+    prestamos = list(prestamos)
+    if not prestamos:
+        return
+    sucursales = _sucursales(prestamos)
+    deltas = defaultdict(lambda: [0, Decimal('0'), Decimal('0'), Decimal('0')])
+    for prestamo in prestamos:
+        valores = (1, prestamo.monto_prestado, prestamo.pago_total, prestamo.cuota_mensual)
+        mes = mes_de(prestamo.fecha_inicio)
+        sucursal_id = sucursales.get(prestamo.cuenta_id)
+        for estado, factor in ((estado_anterior, -1), (estado_nuevo, 1)):
+            if estado is None:
+                continue
+            acumulado = deltas[(sucursal_id, estado, mes)]
+            for i, valor in enumerate(valores):
+                acumulado[i] += factor * valor
+    _aplicar(deltas)
+
+
+def cambiar_sucursal(usuario_id, sucursal_anterior, sucursal_nueva):
+    """
+    Pasa los préstamos de un cliente que cambió de sucursal al resumen de la nueva. El
+    resumen se agrupa por la sucursal actual del cliente, así que sin esto la anterior
+    seguiría contándolos. Una consulta agregada y un UPDATE por fila del resumen afectada.
+    """
+    filas = Prestamo.objects.filter(cuenta__usuario_id=usuario_id).annotate(mes=TruncMonth('fecha_inicio')).values(
+        'estado', 'mes'
+    ).annotate(
+        cantidad=Count('id'), capital=Sum('monto_prestado'), total=Sum('pago_total'), cuota=Sum('cuota_mensual'),
+    ).order_by()
+    deltas = defaultdict(lambda: [0, Decimal('0'), Decimal('0'), Decimal('0')])
+    for fila in filas:
+        valores = (fila['cantidad'], fila['capital'], fila['total'], fila['cuota'])
+        for sucursal_id, factor in ((sucursal_anterior, -1), (sucursal_nueva, 1)):
+            acumulado = deltas[(sucursal_id, fila['estado'], fila['mes'])]
+            for i, valor in enumerate(valores):
+                acumulado[i] += factor * valor
+    with transaction.atomic():
+        _aplicar(deltas)
+
+
+def reconstruir():
+    """
+    Vuelve a calcular el resumen completo desde la tabla de préstamos. Solo hace falta
+    para cargas masivas que no pasan por el modelo (o cambios de sucursal hechos con
+    QuerySet.update) y para corregir diferencias.
+    """
+    with transaction.atomic():
+        ResumenCartera.objects.all().delete()
+        filas = Prestamo.objects.annotate(mes=TruncMonth('fecha_inicio')).values(
+            'cuenta__usuario__sucursal_id', 'estado', 'mes'
+        ).annotate(
+            cantidad=Count('id'), capital=Sum('monto_prestado'), total=Sum('pago_total'), cuota=Sum('cuota_mensual'),
+        ).order_by()
+        return len(ResumenCartera.objects.bulk_create([
+            ResumenCartera(
+                sucursal_id=fila['cuenta__usuario__sucursal_id'], estado=fila['estado'], mes=fila['mes'],
+                cantidad=fila['cantidad'], capital=fila['capital'], pago_total=fila['total'],
+                cuota_mensual=fila['cuota'],
+            )
+            for fila in filas
+        ], batch_size=1000))
+
+
+def cartera_de_sucursal(sucursal_id, desde=None, hasta=None, estado=None):
+    """
+    Lee el resumen de la sucursal: una fila por estado y mes, más los totales por estado.
+    """
+    filas = ResumenCartera.objects.filter(sucursal_id=sucursal_id).exclude(cantidad=0).order_by('mes', 'estado')
+    if desde:
+        filas = filas.filter(mes__gte=mes_de(desde))
+    if hasta:
+        filas = filas.filter(mes__lte=mes_de(hasta))
+    if estado:
+        filas = filas.filter(estado=estado)
+
+    meses = []
+    totales = {}
+    for fila in filas:
+        valores = {
+            'cantidad': fila.cantidad,
+            'capital': fila.capital.quantize(CENTAVOS),
+            'pago_total': fila.pago_total.quantize(CENTAVOS),
+            'cuota_mensual': fila.cuota_mensual.quantize(CENTAVOS),
+        }
+        meses.append({'mes': fila.mes.strftime('%Y-%m'), 'estado': fila.estado, **valores})
+        total = totales.setdefault(fila.estado, dict.fromkeys(CONCEPTOS, 0))
+        for concepto in CONCEPTOS:
+            total[concepto] += valores[concepto]
+    return {'sucursal': sucursal_id, 'totales': totales, 'meses': meses}
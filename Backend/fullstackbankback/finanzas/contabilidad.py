@@ -0,0 +1,175 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Max, OuterRef, Subquery, Sum
+
+from .models import Asiento, Cuenta, Movimiento, SaldoSnapshot
+
+
+# contrapartidas externas de los asientos que no son entre cuentas del banco
+CONTRAPARTIDA_SERVICIOS = 'servicios'
+CONTRAPARTIDA_PRESTAMOS = 'prestamos'
+
+CENTAVOS = Decimal('0.01')
+
+
+def registrar_asientos(asientos):
+    """
+    Inserta asientos con sus movimientos en dos INSERT masivos.
+
+    `asientos` es una lista de (Asiento sin guardar, [(cuenta_id, contrapartida, monto), ...]);
+    los montos de cada asiento deben sumar cero.
+    """
+    if not asientos:
+        return []
+    for _, lineas in asientos:
+        if sum(monto for _, _, monto in lineas) != 0:
+            raise ValueError("Los movimientos de un asiento deben sumar cero.")
+
+    creados = Asiento.objects.bulk_create([asiento for asiento, _ in asientos])
+    Movimiento.objects.bulk_create([
+        Movimiento(asiento=asiento, cuenta_id=cuenta_id, contrapartida=contrapartida or '', monto=monto)
+        for asiento, (_, lineas) in zip(creados, asientos)
+        for cuenta_id, contrapartida, monto in lineas
+    ])
+    return creados
+
+
+def registrar_transferencias(transferencias):
+    return registrar_asientos([
+        (
+            Asiento(tipo='transferencia', transferencia=t),
+            [(t.cuenta_origen_id, None, -t.monto), (t.cuenta_destino_id, None, t.monto)],
+        )
+        for t in transferencias
+    ])
+
+
+def registrar_pagos(pagos):
+    return registrar_asientos([
+        (
+            Asiento(tipo='pago', pago=pago),
+            [(pago.cuenta_id, None, -pago.monto), (None, CONTRAPARTIDA_SERVICIOS, pago.monto)],
+        )
+        for pago in pagos
+    ])
+
+
+def registrar_prestamos(prestamos_y_montos):
+    # monto positivo acredita el préstamo en la cuenta (aprobación), negativo lo revierte (anulación)
+    return registrar_asientos([
+        (
+            Asiento(tipo='prestamo', prestamo=prestamo),
+            [(prestamo.cuenta_id, None, monto), (None, CONTRAPARTIDA_PRESTAMOS, -monto)],
+        )
+        for prestamo, monto in prestamos_y_montos
+    ])
+
+
+def registrar_cuotas(cuotas):
+    # cuotas: (prestamo_id, cuenta_id, monto) cobradas de la cuenta a favor de la cartera de préstamos
+    return registrar_asientos([
+        (
+            Asiento(tipo='cuota', prestamo_id=prestamo_id),
+            [(cuenta_id, None, -monto), (None, CONTRAPARTIDA_PRESTAMOS, monto)],
+        )
+        for prestamo_id, cuenta_id, monto in cuotas
+    ])
+
+
+def _saldos_desde_snapshots(cuenta_ids, hasta=None):
+    ultimos = Cuenta.objects.filter(id__in=cuenta_ids).annotate(
+        snapshot_id=Subquery(
+            SaldoSnapshot.objects.filter(cuenta=OuterRef('pk')).order_by('-ultimo_movimiento_id', '-id').values('id')[:1]
+        )
+    ).values_list('snapshot_id', flat=True)
+    snapshots = {s.cuenta_id: s for s in SaldoSnapshot.objects.filter(id__in=[i for i in ultimos if i])}
+
+    # agrupamos las cuentas por punto de corte: los snapshots se toman en tandas con el mismo corte
+    por_corte = defaultdict(list)
+    saldos = {}
+    for cuenta_id in cuenta_ids:
+        snapshot = snapshots.get(cuenta_id)
+        saldos[cuenta_id] = {
+            'pesos': snapshot.balance_pesos if snapshot else Decimal('0'),
+            'dolares': snapshot.balance_dolares if snapshot else Decimal('0'),
+        }
+        por_corte[snapshot.ultimo_movimiento_id if snapshot else 0].append(cuenta_id)
+
+    for corte, ids in por_corte.items():
+        movimientos = Movimiento.objects.filter(cuenta_id__in=ids, id__gt=corte)
+        if hasta is not None:
+            movimientos = movimientos.filter(id__lte=hasta)
+        for fila in movimientos.values('cuenta_id', 'moneda').annotate(total=Sum('monto')):
+            saldos[fila['cuenta_id']][fila['moneda']] += fila['total'].quantize(CENTAVOS)
+    return saldos
+
+
+def corte_confirmado():
+    """
+    Devuelve el mayor id de movimiento tal que todos los menores ya hicieron commit o no
+    van a existir. Los ids no se asignan en orden de commit: una transacción larga (una
+    importación, un lote de cobranza) puede confirmar ids menores que otros ya visibles.
+
+    En postgres se toma el lock SHARE de la tabla, que espera a las transacciones que
+    están insertando y frena las nuevas mientras se lee el máximo. En sqlite hay un solo
+    escritor a la vez, así que los ids sin confirmar siempre son mayores que los visibles.
+    """
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {Movimiento._meta.db_table} IN SHARE MODE')
+        return Movimiento.objects.aggregate(corte=Max('id'))['corte'] or 0
+
+
+def crear_snapshots(tamano_lote=1000):
+    """
+    Toma un checkpoint de todas las cuentas hasta corte_confirmado(). Devuelve la
+    cantidad de snapshots creados.
+    """
+    corte = corte_confirmado()
+
+    creados = 0
+    cuenta_ids = list(Cuenta.objects.order_by('id').values_list('id', flat=True))
+    for i in range(0, len(cuenta_ids), tamano_lote):
+        lote = cuenta_ids[i:i + tamano_lote]
+        saldos = _saldos_desde_snapshots(lote, hasta=corte)
+        SaldoSnapshot.objects.bulk_create([
+            SaldoSnapshot(
+                cuenta_id=cuenta_id,
+                balance_pesos=saldo['pesos'],
+                balance_dolares=saldo['dolares'],
+                ultimo_movimiento_id=corte,
+            )
+            for cuenta_id, saldo in saldos.items()
+        ])
+        creados += len(lote)
+    return creados
+
+
+def verificar_saldos(tamano_lote=1000):
+    """
+    Compara el saldo de cada cuenta con el que resulta de repetir el libro mayor.
+    Devuelve una lista de (cuenta_id, saldo_actual, saldo_reconstruido) con las diferencias.
+    """
+    diferencias = []
+    cuentas = Cuenta.objects.order_by('id').values_list('id', 'balance_pesos', 'balance_dolares')
+    lote = []
+    for cuenta in cuentas.iterator(chunk_size=tamano_lote):
+        lote.append(cuenta)
+        if len(lote) == tamano_lote:
+            diferencias.extend(_comparar(lote))
+            lote = []
+    if lote:
+        diferencias.extend(_comparar(lote))
+    return diferencias
+
+
+def _comparar(cuentas):
+    saldos = _saldos_desde_snapshots([cuenta_id for cuenta_id, _, _ in cuentas])
+    return [
+        (cuenta_id, {'pesos': pesos, 'dolares': dolares}, saldos[cuenta_id])
+        for cuenta_id, pesos, dolares in cuentas
+        if saldos[cuenta_id]['pesos'] != pesos or saldos[cuenta_id]['dolares'] != dolares
+    ]
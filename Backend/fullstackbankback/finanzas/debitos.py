@@ -0,0 +1,152 @@
+import time
+from datetime import timedelta
+
+from django.db.models import F
+
+from .amortizacion import sumar_meses
+from .contabilidad import registrar_pagos
+from .facturadores import catalogo
+from .models import Cuenta, DebitoAutomatico, Servicios
+from .operaciones import con_reintentos, transaccion_exclusiva
+from .resumen import invalidar_resumen
+
+
+TAMANO_LOTE = 1000
+# después de tantos intentos sin saldo el período se da por impago y se pasa al siguiente
+MAXIMO_INTENTOS_FALLIDOS = 3
+
+
+def siguiente_vencimiento(fecha, frecuencia):
+    if frecuencia == 'semanal':
+        return fecha + timedelta(weeks=1)
+    if frecuencia == 'quincenal':
+        return fecha + timedelta(days=15)
+    if frecuencia == 'anual':
+        return sumar_meses(fecha, 12)
+    return sumar_meses(fecha, 1)
+
+
+def vencimiento_posterior(fecha, frecuencia, corte):
+    # si el programador no corrió durante varios períodos se cobra uno solo y se salta al próximo futuro
+    while fecha <= corte:
+        fecha = siguiente_vencimiento(fecha, frecuencia)
+    return fecha
+
+
+def debitos_vencidos(fecha):
+    return DebitoAutomatico.objects.filter(activo=True, proximo_vencimiento__lte=fecha)
+
+
+def _procesar_lote(ids, fecha):
+    pagados, fallidos = 0, 0
+    with transaccion_exclusiva():
+        # se vuelven a leer dentro de la transacción: si otra corrida ya los procesó quedan afuera
+        debitos = list(
+            debitos_vencidos(fecha).filter(id__in=ids).select_for_update(skip_locked=True).order_by('cuenta_id', 'id')
+        )
+        if not debitos:
+            return pagados, fallidos
+
+        por_cuenta = {}
+        for debito in debitos:
+            por_cuenta.setdefault(debito.cuenta_id, []).append(debito)
+        saldos = dict(Cuenta.objects.filter(id__in=por_cuenta).values_list('id', 'balance_pesos'))
+
+        aceptados = []
+        rechazados = []
+        for cuenta_id, lista in por_cuenta.items():
+            # los débitos de la cuenta entran en orden mientras alcance el saldo leído
+            disponible = saldos.get(cuenta_id, 0)
+            propios = []
+            for debito in lista:
+                if debito.monto <= disponible:
+                    disponible -= debito.monto
+                    propios.append(debito)
+                else:
+                    rechazados.append(debito)
+            if not propios:
+                continue
+            total = sum(debito.monto for debito in propios)
+            # el UPDATE condicionado es lo único que toca el saldo: si entre la lectura y acá
+            # cambió y ya no alcanza, no debita nada y los débitos se reintentan en la próxima corrida
+            if Cuenta.objects.filter(id=cuenta_id, balance_pesos__gte=total).update(
+                balance_pesos=F('balance_pesos') - total
+            ):
+                aceptados.extend(propios)
+            else:
+                rechazados.extend(propios)
+
+        # las adhesiones anteriores al catálogo pueden apuntar a un facturador ya inactivo
+        pagos = Servicios.objects.bulk_create([
+            Servicios(cuenta_id=debito.cuenta_id, facturador=catalogo.buscar(debito.servicio, incluir_inactivos=True),
+                      servicio=debito.servicio, monto=debito.monto, estado='pagado')
+            for debito in aceptados
+        ], batch_size=1000)
+        registrar_pagos(pagos)
+
+        # los débitos se actualizan agrupados por resultado y nuevo vencimiento: pocos UPDATE por lote
+        cambios = {}
+        for debito in aceptados:
+            nuevo = vencimiento_posterior(debito.proximo_vencimiento, debito.frecuencia, fecha)
+            cambios.setdefault(('pagado', nuevo), []).append(debito.id)
+        for debito in rechazados:
+            if debito.intentos_fallidos + 1 >= MAXIMO_INTENTOS_FALLIDOS:
+                nuevo = vencimiento_posterior(debito.proximo_vencimiento, debito.frecuencia, fecha)
+                cambios.setdefault(('impago', nuevo), []).append(debito.id)
+            else:
+                cambios.setdefault(('saldo_insuficiente', None), []).append(debito.id)
+        for (estado, nuevo), ids_debitos in cambios.items():
+            campos = {'ultimo_estado': estado}
+            if estado == 'pagado':
+                campos.update(intentos_fallidos=0, ultimo_cobro=fecha, proximo_vencimiento=nuevo)
+            elif estado == 'impago':
+                campos.update(intentos_fallidos=0, proximo_vencimiento=nuevo)
+            else:
+                campos['intentos_fallidos'] = F('intentos_fallidos') + 1
+            for inicio in range(0, len(ids_debitos), 500):
+                DebitoAutomatico.objects.filter(id__in=ids_debitos[inicio:inicio + 500]).update(**campos)
+
+        if aceptados:
+            usuarios = Cuenta.objects.filter(id__in={d.cuenta_id for d in aceptados}).values_list('usuario_id', flat=True)
+            invalidar_resumen(usuarios)
+        pagados, fallidos = len(aceptados), len(rechazados)
+    return pagados, fallidos
+
+
+def procesar_lote(ids, fecha):
+    """
+    Cobra un lote de débitos automáticos vencidos en una transacción corta. Devuelve
+    (pagados, fallidos).
+    """
+    return con_reintentos(_procesar_lote, ids, fecha)
+
+
+def procesar_vencidos(fecha, tamano_lote=TAMANO_LOTE, progreso=None):
+    """
+    Recorre por id los débitos activos vencidos a `fecha` de a `tamano_lote`. Cada lote
+    debita las cuentas con UPDATEs condicionados, crea los pagos con bulk_create y
+    deja marcados los que no tuvieron saldo. Devuelve totales y pagos por minuto.
+    """
+    inicio = time.perf_counter()
+    pagados, fallidos = 0, 0
+    ultimo_id = 0
+    while True:
+        ids = list(
+            debitos_vencidos(fecha).filter(id__gt=ultimo_id).order_by('id').values_list('id', flat=True)[:tamano_lote]
+        )
+        if not ids:
+            break
+        lote_pagados, lote_fallidos = procesar_lote(ids, fecha)
+        pagados += lote_pagados
+        fallidos += lote_fallidos
+        ultimo_id = ids[-1]
+        if progreso:
+            progreso(pagados, fallidos)
+
+    duracion = time.perf_counter() - inicio
+    return {
+        'pagados': pagados,
+        'fallidos': fallidos,
+        'segundos': round(duracion, 2),
+        'pagos_por_minuto': round(pagados / duracion * 60) if duracion else None,
+    }
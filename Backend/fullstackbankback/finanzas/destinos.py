@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import Cuenta
+
+
+CAPACIDAD = 10000
+DURACION = 300
+# cada cuánto se mira la versión compartida: es el atraso máximo con que un proceso ve lo que se
+# borró o renombró en otro
+INTERVALO_VERSION = 1
+CLAVE_VERSION = 'destinos:version'
+
+
+def es_numero_cuenta(alias):
+    return '-' in alias
+
+
+class ResolvedorDestinos:
+    """
+    Traduce un alias de destino (username o número de cuenta) a (cuenta_id, username).
+
+    Guarda los resultados en un LRU acotado con vencimiento; los alias que no
+    existen no se guardan, así una cuenta recién creada se encuentra enseguida.
+    Cuando se borra una cuenta o cambia un username, se publica una versión nueva en
+    la caché compartida y todos los procesos vacían su LRU (como el catálogo de
+    facturadores): un proceso lo ve a lo sumo INTERVALO_VERSION segundos después.
+    """
+
+    def __init__(self, capacidad=CAPACIDAD, duracion=DURACION):
+        self.capacidad = capacidad
+        self.duracion = duracion
+        self._entradas = OrderedDict()
+        self._version = None
+        self._revisada = 0
+        self._lock = threading.Lock()
+
+    def _revisar_version(self):
+        ahora = time.monotonic()
+        if self._revisada + INTERVALO_VERSION > ahora:
+            return
+        version = cache.get(CLAVE_VERSION)
+        with self._lock:
+            if version != self._version:
+                self._entradas.clear()
+                self._version = version
+            self._revisada = ahora
+
+    def _leer(self, alias):
+        with self._lock:
+            entrada = self._entradas.get(alias)
+            if entrada is None:
+                return None
+            destino, vence = entrada
+            if vence < time.monotonic():
+                del self._entradas[alias]
+                return None
+            self._entradas.move_to_end(alias)
+            return destino
+
+    def _guardar(self, encontrados):
+        vence = time.monotonic() + self.duracion
+        with self._lock:
+            for alias, destino in encontrados.items():
+                self._entradas[alias] = (destino, vence)
+                self._entradas.move_to_end(alias)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+
+    def _buscar(self, aliases):
+        numeros = {alias for alias in aliases if es_numero_cuenta(alias)}
+        usernames = set(aliases) - numeros
+        encontrados = {}
+        # una sola consulta; si un usuario tiene varias cuentas se usa la primera
+        destinos = Cuenta.objects.filter(
+            Q(numero_cuenta__in=numeros) | Q(usuario__username__in=usernames)
+        ).order_by('id').values_list('id', 'numero_cuenta', 'usuario__username')
+        for cuenta_id, numero_cuenta, username in destinos:
+            if numero_cuenta in numeros:
+                encontrados[numero_cuenta] = (cuenta_id, username)
+            if username in usernames:
+                encontrados.setdefault(username, (cuenta_id, username))
+        return encontrados
+
+    def resolver(self, alias):
+        return self.resolver_varios([alias]).get(alias)
+
+    def resolver_varios(self, aliases):
+        """
+        Resuelve muchos alias con a lo sumo una consulta para los que no están en caché.
+        Devuelve un dict alias -> (cuenta_id, username) solo con los encontrados.
+        """
+        self._revisar_version()
+        resultado = {}
+        faltantes = set()
+        for alias in aliases:
+            destino = self._leer(alias)
+            if destino is None:
+                faltantes.add(alias)
+            else:
+                resultado[alias] = destino
+        if faltantes:
+            encontrados = self._buscar(faltantes)
+            self._guardar(encontrados)
+            resultado.update(encontrados)
+        return resultado
+
+    def invalidar(self, *aliases):
+        # solo en este proceso: para un alias que resultó estar desactualizado
+        with self._lock:
+            for alias in aliases:
+                self._entradas.pop(alias, None)
+
+    def invalidar_todo(self):
+        # la nueva versión hace que los demás procesos también vacíen su LRU
+        cache.set(CLAVE_VERSION, time.time_ns(), None)
+        self.limpiar()
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+
+resolvedor = ResolvedorDestinos()
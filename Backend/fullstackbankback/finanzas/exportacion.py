@@ -0,0 +1,77 @@
+import csv
+import heapq
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from .models import Cuenta, Transferencia, Servicios
+
+
+TAMANO_CHUNK = 2000
+
+COLUMNAS = ['tipo', 'id', 'fecha', 'cuenta', 'contraparte', 'monto', 'estado', 'descripcion']
+
+
+class Eco:
+    # pseudo-buffer para csv.writer: devuelve la línea en lugar de guardarla
+    def write(self, valor):
+        return valor
+
+
+def _filtrar_fechas(queryset, campo, desde, hasta):
+    if desde:
+        queryset = queryset.filter(**{f'{campo}__gte': desde})
+    if hasta:
+        queryset = queryset.filter(**{f'{campo}__lt': hasta})
+    return queryset
+
+
+def _transferencias(cuenta_ids, desde, hasta):
+    queryset = Transferencia.objects.filter(Q(cuenta_origen_id__in=cuenta_ids) | Q(cuenta_destino_id__in=cuenta_ids))
+    filas = _filtrar_fechas(queryset, 'fecha', desde, hasta).order_by('fecha', 'id').values_list(
+        'id', 'fecha', 'cuenta_origen_id', 'cuenta_destino_id', 'username_emisor', 'username_receptor',
+        'monto', 'descripcion',
+    )
+    for id, fecha, origen, destino, emisor, receptor, monto, descripcion in filas.iterator(chunk_size=TAMANO_CHUNK):
+        if origen in cuenta_ids:
+            yield fecha, ['transferencia_enviada', id, fecha, origen, receptor, -monto, '', descripcion or '']
+        if destino in cuenta_ids:
+            yield fecha, ['transferencia_recibida', id, fecha, destino, emisor, monto, '', descripcion or '']
+
+
+def _pagos(cuenta_ids, desde, hasta):
+    queryset = Servicios.objects.filter(cuenta_id__in=cuenta_ids)
+    filas = _filtrar_fechas(queryset, 'fecha_pago', desde, hasta).order_by('fecha_pago', 'id').values_list(
+        'id', 'fecha_pago', 'cuenta_id', 'servicio', 'monto', 'estado',
+    )
+    for id, fecha, cuenta, servicio, monto, estado in filas.iterator(chunk_size=TAMANO_CHUNK):
+        yield fecha, ['pago', id, fecha, cuenta, servicio, -monto, estado, '']
+
+
+def movimientos(usuario_id, tipo='todos', desde=None, hasta=None):
+    """
+    Recorre los movimientos del usuario en orden cronológico sin cargarlos en memoria:
+    cada origen se lee con un cursor del lado del servidor y se intercalan por fecha.
+    """
+    cuenta_ids = set(Cuenta.objects.filter(usuario_id=usuario_id).values_list('id', flat=True))
+    fuentes = []
+    if tipo in ('todos', 'transferencias'):
+        fuentes.append(_transferencias(cuenta_ids, desde, hasta))
+    if tipo in ('todos', 'pagos'):
+        fuentes.append(_pagos(cuenta_ids, desde, hasta))
+    for _, fila in heapq.merge(*fuentes, key=lambda elemento: elemento[0]):
+        yield fila
+
+
+def como_csv(filas):
+    escritor = csv.writer(Eco())
+    yield escritor.writerow(COLUMNAS)
+    for fila in filas:
+        fila[2] = fila[2].isoformat()
+        yield escritor.writerow(fila)
+
+
+def como_ndjson(filas):
+    for fila in filas:
+        yield json.dumps(dict(zip(COLUMNAS, fila)), cls=DjangoJSONEncoder) + '\n'
@@ -0,0 +1,91 @@
+import threading
+import time
+
+from django.core.cache import cache
+
+from .models import Facturador
+
+
+DURACION = 300
+# cada cuánto se mira la versión compartida: así una búsqueda casi nunca sale del proceso
+INTERVALO_VERSION = 1
+CLAVE_VERSION = 'facturadores:version'
+
+
+class CatalogoFacturadores:
+    """
+    Copia en memoria del catálogo de facturadores: se carga entero con una consulta y
+    se busca por código o nombre sin tocar la base.
+
+    Se recarga cuando vence, cuando una señal avisa que el catálogo cambió en este
+    proceso, o cuando cambia la versión publicada en la caché compartida (otro
+    proceso lo modificó).
+    """
+
+    def __init__(self, duracion=DURACION):
+        self.duracion = duracion
+        self._claves = None
+        self._por_id = {}
+        self._version = None
+        self._vence = 0
+        self._revisada = 0
+        self._lock = threading.Lock()
+
+    def _vigente(self):
+        ahora = time.monotonic()
+        if self._claves is None or self._vence <= ahora:
+            return False
+        if self._revisada + INTERVALO_VERSION <= ahora:
+            if self._version != cache.get(CLAVE_VERSION):
+                return False
+            self._revisada = ahora
+        return True
+
+    def cargar(self):
+        # devuelve los índices vigentes; se toman juntos para que una invalidación concurrente no los deje a medias
+        with self._lock:
+            if self._vigente():
+                return self._claves, self._por_id
+            version = cache.get(CLAVE_VERSION)
+            facturadores = list(Facturador.objects.order_by('nombre'))
+            self._por_id = {facturador.id: facturador for facturador in facturadores}
+            self._claves = {}
+            for facturador in facturadores:
+                self._claves[facturador.codigo.lower()] = facturador
+                self._claves[facturador.nombre.lower()] = facturador
+            self._version = version
+            self._revisada = time.monotonic()
+            self._vence = self._revisada + self.duracion
+            return self._claves, self._por_id
+
+    def buscar(self, texto, incluir_inactivos=False):
+        """
+        Devuelve el facturador cuyo código o nombre coincide con `texto` (sin distinguir
+        mayúsculas), o None. Los inactivos solo se devuelven si se piden.
+        """
+        claves, _ = self.cargar()
+        facturador = claves.get(str(texto or '').strip().lower())
+        if facturador is None or not (facturador.activo or incluir_inactivos):
+            return None
+        return facturador
+
+    def obtener(self, facturador_id):
+        _, por_id = self.cargar()
+        return por_id.get(facturador_id)
+
+    def activos(self):
+        _, por_id = self.cargar()
+        return [facturador for facturador in por_id.values() if facturador.activo]
+
+    def invalidar(self):
+        # la nueva versión hace que los demás procesos también recarguen
+        cache.set(CLAVE_VERSION, time.time_ns(), None)
+        self.limpiar()
+
+    def limpiar(self):
+        with self._lock:
+            self._claves = None
+            self._por_id = {}
+
+
+catalogo = CatalogoFacturadores()
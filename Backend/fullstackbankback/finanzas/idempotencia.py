@@ -0,0 +1,135 @@
+import hashlib
+import json
+import random
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import ClaveIdempotencia
+
+
+ENCABEZADO = 'Idempotency-Key'
+
+# tiempo que una clave queda reservada mientras la primera solicitud se procesa;
+# si el proceso muere, la clave se libera sola al vencer
+RESERVA_EN_PROCESO = timedelta(minutes=5)
+ESPERA_MAXIMA = 10
+INTERVALO_ESPERA = 0.05
+PROBABILIDAD_PURGA = 0.01
+
+
+def ttl():
+    return getattr(settings, 'IDEMPOTENCIA_TTL', timedelta(hours=24))
+
+
+def huella_de(request):
+    datos = request.data
+    if hasattr(datos, 'lists'):
+        # formularios: todos los valores de cada campo; los archivos entran aparte, por su contenido
+        datos = {clave: valores for clave, valores in datos.lists() if clave not in request.FILES}
+    contenido = json.dumps(datos, sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    huella = hashlib.sha256(f"{request.method} {request.path} {contenido}".encode())
+    for campo in sorted(request.FILES):
+        for archivo in request.FILES.getlist(campo):
+            huella.update(f" {campo}:{archivo.name}:{archivo.size}:".encode())
+            for parte in archivo.chunks():
+                huella.update(parte)
+            # la vista lee el archivo desde el principio
+            archivo.seek(0)
+    return huella.hexdigest()
+
+
+def purgar_vencidas():
+    return ClaveIdempotencia.objects.filter(expira__lt=timezone.now()).delete()[0]
+
+
+def reservar(usuario, clave, ruta, huella):
+    """
+    Intenta reservar la clave para esta solicitud. Devuelve (registro, es_nueva):
+    si otra solicitud ya la tiene, es_nueva es False y registro es el existente.
+    """
+    if random.random() < PROBABILIDAD_PURGA:
+        purgar_vencidas()
+
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                registro = ClaveIdempotencia.objects.create(
+                    usuario=usuario, clave=clave, ruta=ruta, huella=huella,
+                    expira=timezone.now() + RESERVA_EN_PROCESO,
+                )
+            return registro, True
+        except IntegrityError:
+            existente = ClaveIdempotencia.objects.filter(usuario=usuario, clave=clave).first()
+            if existente is None:
+                continue
+            if existente.expira < timezone.now():
+                # vencida: se descarta y se vuelve a intentar la reserva
+                ClaveIdempotencia.objects.filter(id=existente.id, expira__lt=timezone.now()).delete()
+                continue
+            return existente, False
+    return ClaveIdempotencia.objects.get(usuario=usuario, clave=clave), False
+
+
+def esperar_resultado(registro):
+    limite = time.monotonic() + ESPERA_MAXIMA
+    while registro is not None and registro.estado == 'en_proceso' and time.monotonic() < limite:
+        time.sleep(INTERVALO_ESPERA)
+        registro = ClaveIdempotencia.objects.filter(id=registro.id).first()
+    return registro
+
+
+def idempotente(vista):
+    """
+    Decorador para acciones POST que mueven dinero. Si la solicitud trae el encabezado
+    Idempotency-Key, la primera respuesta queda guardada bajo esa clave y los reintentos
+    la reciben tal cual sin volver a ejecutar la vista. Los reintentos que llegan mientras
+    la primera sigue en curso esperan a que termine.
+    """
+    @wraps(vista)
+    def envoltura(self, request, *args, **kwargs):
+        clave = request.headers.get(ENCABEZADO)
+        if not clave:
+            return vista(self, request, *args, **kwargs)
+        if len(clave) > 255:
+            return Response({"error": "La clave de idempotencia es demasiado larga."}, status=status.HTTP_400_BAD_REQUEST)
+
+        huella = huella_de(request)
+        registro, es_nueva = reservar(request.user, clave, request.path, huella)
+
+        if not es_nueva:
+            if registro.huella != huella:
+                return Response({"error": "La clave de idempotencia ya se usó con otra solicitud."},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            registro = esperar_resultado(registro)
+            if registro is None or registro.estado != 'completada':
+                return Response({"error": "Hay una solicitud en curso con la misma clave de idempotencia."},
+                                status=status.HTTP_409_CONFLICT)
+            return Response(registro.respuesta, status=registro.status_code, headers={'Idempotent-Replayed': 'true'})
+
+        try:
+            respuesta = vista(self, request, *args, **kwargs)
+        except Exception:
+            registro.delete()
+            raise
+
+        if respuesta.status_code >= 500:
+            # los errores del servidor no se guardan: el cliente puede reintentar
+            registro.delete()
+            return respuesta
+
+        registro.estado = 'completada'
+        registro.status_code = respuesta.status_code
+        registro.respuesta = respuesta.data
+        registro.expira = timezone.now() + ttl()
+        registro.save(update_fields=['estado', 'status_code', 'respuesta', 'expira'])
+        return respuesta
+
+    return envoltura
@@ -0,0 +1,149 @@
+import codecs
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from .contabilidad import registrar_pagos
+from .facturadores import catalogo
+from .models import Cuenta, Servicios
+from .operaciones import acreditar_varias, bloquear_cuentas, con_reintentos, transaccion_exclusiva
+from .resumen import invalidar_resumen
+
+
+TAMANO_CHUNK = 1000
+MAXIMO_FILAS = 100000
+MONTO_MAXIMO = Decimal('9999999999.99')
+COLUMNAS_OBLIGATORIAS = {'servicio', 'monto'}
+
+
+class ArchivoInvalido(Exception):
+    pass
+
+
+def _lineas(archivo):
+    # el archivo subido se recorre línea por línea (Django lo deja en disco si es grande)
+    return codecs.iterdecode(archivo, 'utf-8-sig')
+
+
+def leer_csv(archivo):
+    lector = csv.DictReader(_lineas(archivo))
+    columnas = {(columna or '').strip().lower() for columna in lector.fieldnames or []}
+    if not COLUMNAS_OBLIGATORIAS <= columnas:
+        raise ArchivoInvalido("El CSV debe tener encabezado con las columnas servicio y monto (y opcionalmente cuenta).")
+    for fila in lector:
+        yield lector.line_num, {(clave or '').strip().lower(): valor for clave, valor in fila.items()}
+
+
+def leer_jsonl(archivo):
+    for linea, texto in enumerate(_lineas(archivo), start=1):
+        if not texto.strip():
+            continue
+        try:
+            yield linea, json.loads(texto)
+        except ValueError:
+            yield linea, None
+
+
+LECTORES = {
+    'csv': leer_csv,
+    'jsonl': leer_jsonl,
+}
+
+
+def validar_fila(fila, cuenta_defecto):
+    """
+    Devuelve (cuenta_id, facturador, monto) o lanza ValueError con el motivo del rechazo.
+    """
+    if not isinstance(fila, dict):
+        raise ValueError("La fila no tiene un formato válido")
+    servicio = str(fila.get('servicio') or '').strip()
+    if not servicio or fila.get('monto') in (None, ''):
+        raise ValueError("El servicio y el monto son obligatorios")
+    try:
+        monto = Decimal(str(fila['monto']).strip())
+        if not monto.is_finite() or monto <= 0 or monto > MONTO_MAXIMO or monto.as_tuple().exponent < -2:
+            raise InvalidOperation
+    except InvalidOperation:
+        raise ValueError("El monto no es válido")
+    try:
+        cuenta_id = int(fila.get('cuenta') or cuenta_defecto)
+    except (TypeError, ValueError):
+        raise ValueError("La cuenta no es válida")
+    facturador = catalogo.buscar(servicio)
+    if facturador is None:
+        raise ValueError("El servicio no está en el catálogo de facturadores.")
+    return cuenta_id, facturador, monto
+
+
+def _escribir(usuario_id, filas, totales):
+    rechazadas = set()
+    with transaccion_exclusiva():
+        # el saldo se vuelve a comprobar con las cuentas bloqueadas: pudo cambiar desde la validación
+        cuentas = bloquear_cuentas(totales)
+        for cuenta in cuentas:
+            if cuenta.balance_pesos < totales[cuenta.id]:
+                rechazadas.add(cuenta.id)
+        debitos = {cuenta.id: -totales[cuenta.id] for cuenta in cuentas if cuenta.id not in rechazadas}
+        acreditar_varias(debitos)
+
+        aceptadas = [fila for fila in filas if fila[1] in debitos]
+        for inicio in range(0, len(aceptadas), TAMANO_CHUNK):
+            pagos = Servicios.objects.bulk_create([
+                Servicios(
+                    cuenta_id=cuenta_id, facturador=facturador, servicio=facturador.nombre, monto=monto, estado='pagado',
+                )
+                for _, cuenta_id, facturador, monto in aceptadas[inicio:inicio + TAMANO_CHUNK]
+            ])
+            registrar_pagos(pagos)
+        if debitos:
+            invalidar_resumen([usuario_id])
+    return rechazadas
+
+
+def importar_pagos(usuario, filas, cuenta_defecto=None):
+    """
+    Valida y paga las filas de un archivo de pagos de servicios. `filas` es un iterable
+    de (linea, dict) como los que dan leer_csv y leer_jsonl.
+
+    Las cuentas del usuario se traen en una sola consulta. Cada cuenta paga todas sus
+    filas o ninguna: si el saldo no cubre la suma del archivo, se rechazan todas. Los
+    pagos aceptados se escriben en una transacción, en tandas de TAMANO_CHUNK.
+    Devuelve (realizados, monto_total, errores), con errores como [{'fila', 'error'}].
+    """
+    saldos = dict(Cuenta.objects.filter(usuario_id=usuario.id).values_list('id', 'balance_pesos'))
+
+    errores = []
+    validas = []
+    totales = {}
+    try:
+        for cantidad, (linea, fila) in enumerate(filas, start=1):
+            if cantidad > MAXIMO_FILAS:
+                raise ArchivoInvalido(f"El archivo no puede superar las {MAXIMO_FILAS} filas.")
+            try:
+                cuenta_id, facturador, monto = validar_fila(fila, cuenta_defecto)
+            except ValueError as e:
+                errores.append({'fila': linea, 'error': str(e)})
+                continue
+            if cuenta_id not in saldos:
+                errores.append({'fila': linea, 'error': "La cuenta no pertenece al usuario autenticado."})
+                continue
+            validas.append((linea, cuenta_id, facturador, monto))
+            totales[cuenta_id] = totales.get(cuenta_id, 0) + monto
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ArchivoInvalido(f"No se pudo leer el archivo: {e}")
+
+    sin_saldo = {cuenta_id for cuenta_id, total in totales.items() if total > saldos[cuenta_id]}
+    a_pagar = {cuenta_id: total for cuenta_id, total in totales.items() if cuenta_id not in sin_saldo}
+    if a_pagar:
+        sin_saldo |= con_reintentos(_escribir, usuario.id, [fila for fila in validas if fila[1] in a_pagar], a_pagar)
+
+    realizados = 0
+    monto_total = Decimal('0')
+    for linea, cuenta_id, _, monto in validas:
+        if cuenta_id in sin_saldo:
+            errores.append({'fila': linea, 'error': "El saldo de la cuenta no cubre el total de sus pagos en el archivo."})
+        else:
+            realizados += 1
+            monto_total += monto
+    errores.sort(key=lambda error: error['fila'])
+    return realizados, monto_total, errores
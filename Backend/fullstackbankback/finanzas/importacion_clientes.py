@@ -0,0 +1,311 @@
+import csv
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, connections, transaction
+
+from sucursales.models import Sucursal
+from usuarios.models import Usuario
+
+from .busqueda import CAMPOS_USUARIO, indice
+from .models import Cuenta, SaldoSnapshot, Tarjeta
+from .numeracion import numeros_cuenta, numeros_tarjeta
+from .operaciones import con_reintentos, transaccion_exclusiva
+
+
+TAMANO_LOTE = 1000
+MONTO_MAXIMO = Decimal('9999999999.99')
+CAMPOS_TEXTO = ('email', 'first_name', 'last_name', 'telefono', 'direccion')
+TIPOS_CUENTA = {tipo for tipo, _ in Cuenta.TIPO_CUENTA_CHOICES}
+TIPOS_TARJETA = {tipo for tipo, _ in Tarjeta.TIPO_TARJETA_CHOICES}
+PROVEEDORES = {proveedor for proveedor, _ in Tarjeta.PROVEEDOR_CHOICES}
+INTENTOS_ESCRITURA = 3
+# los espacios de una contraseña son parte de ella: no se recortan
+CAMPOS_LITERALES = ('password', 'password_hash')
+
+
+class ArchivoInvalido(Exception):
+    pass
+
+
+def leer_csv(archivo):
+    lector = csv.DictReader(archivo)
+    columnas = {(columna or '').strip().lower() for columna in lector.fieldnames or []}
+    if 'username' not in columnas or not columnas & {'password', 'password_hash'}:
+        raise ArchivoInvalido("El CSV debe tener encabezado con las columnas username y password (o password_hash).")
+    for fila in lector:
+        fila = {(clave or '').strip().lower(): valor or '' for clave, valor in fila.items()}
+        yield lector.line_num, {
+            clave: valor if clave in CAMPOS_LITERALES else valor.strip() for clave, valor in fila.items()
+        }
+
+
+def validar_cliente(fila, sucursales, sucursal_defecto):
+    """
+    Devuelve un dict con los datos del cliente o lanza ValueError con el motivo del rechazo.
+    La contraseña viene en claro (`password`) o ya hasheada en un formato de Django (`password_hash`).
+    """
+    username = fila.get('username', '')
+    if not username or len(username) > 150:
+        raise ValueError("El username es obligatorio y no puede superar los 150 caracteres")
+    try:
+        UnicodeUsernameValidator()(username)
+    except ValidationError:
+        raise ValueError("El username tiene caracteres no permitidos")
+
+    datos = {'username': username, 'password': fila.get('password', ''), 'password_hash': fila.get('password_hash', '')}
+    if datos['password_hash']:
+        try:
+            identify_hasher(datos['password_hash'])
+        except ValueError:
+            raise ValueError("El hash de la contraseña no tiene un formato conocido")
+    elif not datos['password']:
+        raise ValueError("La contraseña es obligatoria")
+
+    for campo in CAMPOS_TEXTO:
+        valor = fila.get(campo, '')
+        if len(valor) > Usuario._meta.get_field(campo).max_length:
+            raise ValueError(f"El campo {campo} es demasiado largo")
+        datos[campo] = valor
+    if datos['email']:
+        try:
+            validate_email(datos['email'])
+        except ValidationError:
+            raise ValueError("El email no es válido")
+
+    try:
+        datos['sucursal_id'] = int(fila.get('sucursal') or sucursal_defecto)
+    except ValueError:
+        raise ValueError("La sucursal no es válida")
+    if datos['sucursal_id'] not in sucursales:
+        raise ValueError("La sucursal no existe")
+
+    datos['tipo_cuenta'] = fila.get('tipo_cuenta') or 'ahorro'
+    if datos['tipo_cuenta'] not in TIPOS_CUENTA:
+        raise ValueError("El tipo de cuenta no es válido")
+    try:
+        datos['saldo'] = Decimal(fila.get('saldo') or '0')
+        if not datos['saldo'].is_finite() or not 0 <= datos['saldo'] <= MONTO_MAXIMO \
+                or datos['saldo'].as_tuple().exponent < -2:
+            raise InvalidOperation
+    except InvalidOperation:
+        raise ValueError("El saldo no es válido")
+
+    datos['tarjeta'] = fila.get('tarjeta', '')
+    datos['proveedor'] = fila.get('proveedor') or None
+    if datos['tarjeta'] and datos['tarjeta'] not in TIPOS_TARJETA:
+        raise ValueError("El tipo de tarjeta no es válido")
+    if datos['proveedor'] and datos['proveedor'] not in PROVEEDORES:
+        raise ValueError("El proveedor de la tarjeta no es válido")
+    return datos
+
+
+def _hashear(passwords):
+    return [make_password(password) for password in passwords]
+
+
+def _iniciar_proceso():
+    # los procesos solo hashean: necesitan la configuración, no la base
+    import django
+    django.setup()
+
+
+def _existentes(usernames):
+    return set(Usuario.objects.filter(username__in=usernames).values_list('username', flat=True))
+
+
+def _reservar_numeros(clientes):
+    # uno por fila aunque el username ya exista: los que sobran se pierden, el espacio alcanza
+    tarjetas = {}
+    for _, datos in clientes:
+        if datos['tarjeta']:
+            tarjetas[datos['proveedor']] = tarjetas.get(datos['proveedor'], 0) + 1
+    return numeros_cuenta(len(clientes)), {
+        proveedor: numeros_tarjeta(proveedor, cantidad) for proveedor, cantidad in tarjetas.items()
+    }
+
+
+def _escribir(clientes, numeros_cuentas, numeros_tarjetas):
+    with transaccion_exclusiva():
+        # los que se crearon desde que se armó el lote (otro proceso, o un repetido en el archivo) se saltean
+        existentes = _existentes([datos['username'] for _, datos in clientes])
+        nuevos = [datos for _, datos in clientes if datos['username'] not in existentes]
+        usuarios = Usuario.objects.bulk_create([
+            Usuario(
+                username=datos['username'], password=datos['password_hash'], sucursal_id=datos['sucursal_id'],
+                **{campo: datos[campo] or None for campo in ('telefono', 'direccion')},
+                **{campo: datos[campo] for campo in ('email', 'first_name', 'last_name')},
+            )
+            for datos in nuevos
+        ])
+        cuentas = Cuenta.objects.bulk_create([
+            Cuenta(usuario_id=usuario.id, tipo_cuenta=datos['tipo_cuenta'], balance_pesos=datos['saldo'],
+                   numero_cuenta=numero)
+            for usuario, datos, numero in zip(usuarios, nuevos, numeros_cuentas)
+        ])
+        # el saldo traído del otro banco es el punto de partida del libro mayor de la cuenta
+        SaldoSnapshot.objects.bulk_create([
+            SaldoSnapshot(cuenta_id=cuenta.id, balance_pesos=cuenta.balance_pesos)
+            for cuenta in cuentas if cuenta.balance_pesos
+        ])
+
+        por_proveedor = {}
+        for cuenta, datos in zip(cuentas, nuevos):
+            if datos['tarjeta']:
+                por_proveedor.setdefault(datos['proveedor'], []).append((cuenta, datos['tarjeta']))
+        tarjetas = []
+        for proveedor, pendientes in por_proveedor.items():
+            for (cuenta, tipo), numero in zip(pendientes, numeros_tarjetas[proveedor]):
+                tarjeta = Tarjeta(cuenta_id=cuenta.id, tipo_tarjeta=tipo, proveedor=proveedor, numero_tarjeta=numero)
+                tarjeta.completar_seguridad()
+                tarjetas.append(tarjeta)
+        Tarjeta.objects.bulk_create(tarjetas)
+
+        # bulk_create no dispara las señales que mantienen el índice de búsqueda de clientes
+        registros = [
+            (usuario.id, usuario.sucursal_id, False, tuple(getattr(usuario, campo) for campo in CAMPOS_USUARIO))
+            for usuario in usuarios
+        ]
+        numeros = [(cuenta.usuario_id, cuenta.numero_cuenta) for cuenta in cuentas]
+
+        def indexar():
+            indice.guardar_usuarios(registros)
+            indice.agregar_cuentas(numeros)
+        transaction.on_commit(indexar)
+    return len(usuarios), len(tarjetas), len(clientes) - len(nuevos)
+
+
+def escribir_lote(clientes):
+    """
+    Crea en una transacción los usuarios, sus cuentas y sus tarjetas. `clientes` es una
+    lista de (linea, datos) con la contraseña ya hasheada en datos['password_hash'].
+    Devuelve (usuarios_creados, tarjetas_creadas, ya_existentes).
+    """
+    for intento in range(INTENTOS_ESCRITURA):
+        # los números se reservan fuera de la transacción de escritura: si esta se revierte el
+        # contador no vuelve atrás, y el reintento recibe números nuevos y no el mismo bloque
+        numeros = _reservar_numeros(clientes)
+        try:
+            return con_reintentos(_escribir, clientes, *numeros)
+        except IntegrityError:
+            # un username creado en paralelo, o un número de cuenta o tarjeta que choca con uno
+            # generado al azar antes del asignador: el lote se reintenta entero
+            if intento == INTENTOS_ESCRITURA - 1:
+                raise
+
+
+def _medir(resultado, inicio):
+    duracion = time.perf_counter() - inicio
+    resultado['segundos'] = round(duracion, 2)
+    resultado['clientes_por_segundo'] = round(resultado['creados'] / duracion, 1) if duracion else None
+    return resultado
+
+
+class _Lote:
+    # filas válidas de un lote y los hashes que se están calculando para ellas
+    def __init__(self, clientes, pool, procesos):
+        self.clientes = clientes
+        pendientes = [datos['password'] for _, datos in clientes if not datos['password_hash']]
+        if pool is None:
+            listo = Future()
+            listo.set_result(_hashear(pendientes))
+            self.partes = [listo]
+        else:
+            tamano = -(-len(pendientes) // procesos) or 1
+            self.partes = [pool.submit(_hashear, pendientes[i:i + tamano]) for i in range(0, len(pendientes), tamano)]
+
+    def completar(self):
+        hashes = iter([password for parte in self.partes for password in parte.result()])
+        for _, datos in self.clientes:
+            if not datos['password_hash']:
+                datos['password_hash'] = next(hashes)
+            datos['password'] = ''
+        return self.clientes
+
+
+def importar_clientes(filas, sucursal_defecto=1, procesos=1, tamano_lote=TAMANO_LOTE, progreso=None, rechazo=None):
+    """
+    Da de alta clientes a partir de un iterable de (linea, dict) como el de leer_csv:
+    un Usuario, una Cuenta por defecto y, si la fila la pide, una Tarjeta.
+
+    Las filas se leen de a `tamano_lote`; las contraseñas se hashean en `procesos` procesos
+    mientras el proceso principal escribe el lote anterior con bulk_create en su propia
+    transacción. Los usernames que ya existen se saltean antes de hashear, así que volver
+    a correr la importación retoma donde quedó. `progreso(resultado)` se llama después de
+    cada lote y `rechazo(linea, motivo)` por cada fila inválida. Devuelve un dict con los
+    totales y la velocidad en clientes/seg.
+    """
+    inicio = time.perf_counter()
+    sucursales = set(Sucursal.objects.values_list('id', flat=True))
+    resultado = {'filas': 0, 'creados': 0, 'tarjetas': 0, 'existentes': 0, 'rechazados': 0}
+
+    def rechazar(linea, motivo):
+        resultado['rechazados'] += 1
+        if rechazo:
+            rechazo(linea, motivo)
+
+    def escribir(lote):
+        creados, tarjetas, existentes = escribir_lote(lote.completar())
+        resultado['creados'] += creados
+        resultado['tarjetas'] += tarjetas
+        resultado['existentes'] += existentes
+        _medir(resultado, inicio)
+        if progreso:
+            progreso(resultado)
+
+    def lotes():
+        lote = []
+        for linea, fila in filas:
+            resultado['filas'] += 1
+            try:
+                lote.append((linea, validar_cliente(fila, sucursales, sucursal_defecto)))
+            except ValueError as e:
+                rechazar(linea, str(e))
+            if len(lote) == tamano_lote:
+                yield lote
+                lote = []
+        if lote:
+            yield lote
+
+    pool = None
+    if procesos > 1:
+        # los hijos no usan la base: que no hereden conexiones abiertas
+        connections.close_all()
+        contexto = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+        pool = ProcessPoolExecutor(max_workers=procesos, mp_context=contexto, initializer=_iniciar_proceso)
+    try:
+        # dos lotes en vuelo: mientras se escribe uno, los procesos ya hashean el siguiente
+        en_vuelo = deque()
+        for clientes in lotes():
+            existentes = _existentes([datos['username'] for _, datos in clientes])
+            vistos = set()
+            nuevos = []
+            for linea, datos in clientes:
+                if datos['username'] in existentes:
+                    resultado['existentes'] += 1
+                elif datos['username'] in vistos:
+                    rechazar(linea, "El username está repetido en el archivo")
+                else:
+                    vistos.add(datos['username'])
+                    nuevos.append((linea, datos))
+            if not nuevos:
+                continue
+            en_vuelo.append(_Lote(nuevos, pool, procesos))
+            if len(en_vuelo) > 1:
+                escribir(en_vuelo.popleft())
+        while en_vuelo:
+            escribir(en_vuelo.popleft())
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ArchivoInvalido(f"No se pudo leer el archivo: {e}")
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    return _medir(resultado, inicio)
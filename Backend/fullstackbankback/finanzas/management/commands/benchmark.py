@@ -0,0 +1,78 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.utils import timezone
+
+from finanzas.benchmark import DriverHTTP, DriverLocal, commit_actual, ejecutar, sembrar
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide throughput, latencias p50/p95/p99 y consultas SQL por endpoint. Por defecto corre en una "
+        "base de prueba descartable con el test client; con --url maneja un servidor real por HTTP."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=200, help="Clientes a sembrar.")
+        parser.add_argument('--historial', type=int, default=20, help="Transferencias y pagos previos por cliente.")
+        parser.add_argument('--iteraciones', type=int, default=50, help="Solicitudes por endpoint.")
+        parser.add_argument('--concurrencia', type=int, default=1, help="Hilos concurrentes (solo con --url).")
+        parser.add_argument('--endpoints', nargs='*', help="Limita la corrida a estos escenarios.")
+        parser.add_argument('--url', help="URL de un servidor en marcha, por ejemplo http://localhost:8000.")
+        parser.add_argument('--sembrar', action='store_true',
+                            help="Con --url: siembra los datos en la base configurada (la que usa el servidor).")
+        parser.add_argument('--prefijo', default='bench', help="Prefijo de los usernames sembrados.")
+        parser.add_argument('--salida', help="Archivo JSON donde guardar los resultados.")
+
+    def handle(self, *args, **options):
+        if options['url']:
+            resultados = self.correr_http(options)
+        else:
+            if options['concurrencia'] > 1:
+                raise CommandError("La concurrencia solo está disponible con --url.")
+            resultados = self.correr_local(options)
+
+        informe = {
+            'fecha': timezone.now().isoformat(),
+            'commit': commit_actual(),
+            'modo': 'http' if options['url'] else 'local',
+            'parametros': {
+                clave: options[clave] for clave in ('clientes', 'historial', 'iteraciones', 'concurrencia', 'url')
+            },
+            'endpoints': resultados,
+        }
+        self.imprimir(resultados)
+        if options['salida']:
+            with open(options['salida'], 'w') as archivo:
+                json.dump(informe, archivo, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['salida']}"))
+
+    def correr_local(self, options):
+        setup_test_environment()
+        configuracion = setup_databases(verbosity=0, interactive=False)
+        try:
+            usernames = sembrar(options['clientes'], options['historial'], options['prefijo'])
+            return ejecutar(DriverLocal(), usernames, options['iteraciones'], 1, options['endpoints'])
+        finally:
+            teardown_databases(configuracion, verbosity=0)
+            teardown_test_environment()
+
+    def correr_http(self, options):
+        if options['sembrar']:
+            usernames = sembrar(options['clientes'], options['historial'], options['prefijo'])
+        else:
+            usernames = [f"{options['prefijo']}{i}" for i in range(options['clientes'])]
+        return ejecutar(DriverHTTP(options['url']), usernames, options['iteraciones'], options['concurrencia'],
+                        options['endpoints'])
+
+    def imprimir(self, resultados):
+        encabezado = f"{'endpoint':<24}{'n':>6}{'err':>5}{'rps':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'sql':>7}"
+        self.stdout.write(encabezado)
+        for nombre, metricas in resultados.items():
+            self.stdout.write(
+                f"{nombre:<24}{metricas['solicitudes']:>6}{metricas['errores']:>5}"
+                f"{metricas['throughput_rps'] or 0:>10.1f}{metricas['p50_ms'] or 0:>9.2f}"
+                f"{metricas['p95_ms'] or 0:>9.2f}{metricas['p99_ms'] or 0:>9.2f}"
+                f"{metricas.get('consultas_promedio', '-'):>7}"
+            )
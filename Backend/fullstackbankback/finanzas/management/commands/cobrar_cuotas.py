@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from finanzas.cobranza import TAMANO_LOTE, cobrar
+
+
+class Command(BaseCommand):
+    help = ("Cobra las cuotas de préstamos aprobados vencidas a una fecha. Si se interrumpe, "
+            "volver a correrlo con la misma fecha retoma los lotes que faltaban.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help="Fecha de corte AAAA-MM-DD (por defecto, hoy).")
+        parser.add_argument('--procesos', type=int, default=1, help="Procesos en paralelo.")
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Cuentas por lote.")
+
+    def handle(self, *args, **options):
+        try:
+            # parse_date devuelve None si el formato no coincide y lanza ValueError si la fecha no existe
+            fecha = parse_date(options['fecha']) if options['fecha'] else timezone.localdate()
+        except ValueError:
+            raise CommandError(f"La fecha {options['fecha']} no existe.")
+        if fecha is None:
+            raise CommandError("La fecha debe tener el formato AAAA-MM-DD.")
+
+        def progreso(hechos, total, cuotas):
+            self.stdout.write(f"lote {hechos}/{total} - {cuotas} cuotas revisadas")
+
+        resultado = cobrar(fecha, procesos=options['procesos'], tamano_lote=options['lote'], progreso=progreso)
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['cuotas_cobradas']} cuotas cobradas (${resultado['monto_cobrado']}), "
+            f"{resultado['cuotas_sin_saldo']} sin saldo, en {resultado['lotes']} lotes y {resultado['segundos']}s "
+            f"({resultado['cuotas_por_segundo']} cuotas/seg)."
+        ))
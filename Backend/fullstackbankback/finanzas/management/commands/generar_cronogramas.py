@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from finanzas.amortizacion import generar_cronogramas
+from finanzas.models import Prestamo
+
+
+class Command(BaseCommand):
+    help = "Genera el cronograma de cuotas de los préstamos que todavía no lo tienen."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=2000, help="Préstamos por lote.")
+
+    def handle(self, *args, **options):
+        tamano_lote = options['lote']
+        creadas = 0
+        ultimo_id = 0
+        while True:
+            lote = list(
+                Prestamo.objects.filter(id__gt=ultimo_id, cuotas__isnull=True).order_by('id')[:tamano_lote]
+            )
+            if not lote:
+                break
+            with transaction.atomic():
+                creadas += generar_cronogramas(lote, tamano_lote=tamano_lote)
+            ultimo_id = lote[-1].id
+        self.stdout.write(self.style.SUCCESS(f"{creadas} cuotas creadas."))
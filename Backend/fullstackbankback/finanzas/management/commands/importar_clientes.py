@@ -0,0 +1,42 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finanzas.importacion_clientes import TAMANO_LOTE, ArchivoInvalido, importar_clientes, leer_csv
+
+
+class Command(BaseCommand):
+    help = ("Da de alta clientes desde un CSV (username, password o password_hash, y opcionalmente email, "
+            "first_name, last_name, telefono, direccion, sucursal, tipo_cuenta, saldo, tarjeta y proveedor) "
+            "con su cuenta por defecto. Si se interrumpe, volver a correrlo saltea los que ya se crearon.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del CSV.")
+        parser.add_argument('--sucursal', type=int, default=1, help="Sucursal de las filas que no la indican.")
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1,
+                            help="Procesos que hashean contraseñas (por defecto, uno por CPU).")
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Clientes por transacción.")
+
+    def handle(self, *args, **options):
+        def progreso(resultado):
+            self.stdout.write(
+                f"{resultado['filas']} filas - {resultado['creados']} creados, {resultado['existentes']} existentes, "
+                f"{resultado['rechazados']} rechazados ({resultado['clientes_por_segundo']} clientes/seg)"
+            )
+
+        def rechazo(linea, motivo):
+            self.stderr.write(f"fila {linea}: {motivo}")
+
+        try:
+            with open(options['archivo'], encoding='utf-8-sig', newline='') as archivo:
+                resultado = importar_clientes(
+                    leer_csv(archivo), sucursal_defecto=options['sucursal'], procesos=options['procesos'],
+                    tamano_lote=options['lote'], progreso=progreso, rechazo=rechazo,
+                )
+        except (OSError, ArchivoInvalido) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['creados']} clientes creados con {resultado['tarjetas']} tarjetas, "
+            f"{resultado['existentes']} ya existían y {resultado['rechazados']} rechazados, en {resultado['segundos']}s "
+            f"({resultado['clientes_por_segundo']} clientes/seg)."
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from finanzas.debitos import TAMANO_LOTE, procesar_vencidos
+
+
+class Command(BaseCommand):
+    help = "Cobra los débitos automáticos vencidos a una fecha."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help="Fecha de corte AAAA-MM-DD (por defecto, hoy).")
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Débitos por transacción.")
+
+    def handle(self, *args, **options):
+        try:
+            # parse_date devuelve None si el formato no coincide y lanza ValueError si la fecha no existe
+            fecha = parse_date(options['fecha']) if options['fecha'] else timezone.localdate()
+        except ValueError:
+            raise CommandError(f"La fecha {options['fecha']} no existe.")
+        if fecha is None:
+            raise CommandError("La fecha debe tener el formato AAAA-MM-DD.")
+
+        resultado = procesar_vencidos(fecha, tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['pagados']} débitos pagados, {resultado['fallidos']} sin saldo, en {resultado['segundos']}s "
+            f"({resultado['pagos_por_minuto']} pagos/minuto)."
+        ))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from finanzas.tareas import nombre_trabajador, procesar
+
+
+class Command(BaseCommand):
+    help = "Procesa la cola de tareas. Se pueden correr varios procesos a la vez."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=10, help="Tareas que se toman por vuelta.")
+        parser.add_argument('--intervalo', type=float, default=1.0,
+                            help="Segundos de espera cuando la cola está vacía.")
+        parser.add_argument('--una-vez', action='store_true', help="Vacía la cola y termina.")
+
+    def handle(self, *args, **options):
+        trabajador = nombre_trabajador()
+        self.stdout.write(f"Trabajador {trabajador} procesando tareas.")
+        procesadas = 0
+        try:
+            while True:
+                cantidad = procesar(trabajador, options['lote'])
+                procesadas += cantidad
+                if cantidad:
+                    continue
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"{procesadas} tareas procesadas."))
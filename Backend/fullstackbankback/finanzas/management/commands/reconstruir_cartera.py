@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from finanzas.cartera import reconstruir
+
+
+class Command(BaseCommand):
+    help = "Recalcula el resumen de cartera por sucursal, estado y mes desde la tabla de préstamos."
+
+    def handle(self, *args, **options):
+        filas = reconstruir()
+        self.stdout.write(self.style.SUCCESS(f"{filas} filas de resumen creadas."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from finanzas.contabilidad import crear_snapshots
+
+
+class Command(BaseCommand):
+    help = "Toma un checkpoint del saldo de cada cuenta a partir del libro mayor."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help="Cuentas por consulta.")
+
+    def handle(self, *args, **options):
+        creados = crear_snapshots(tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"{creados} snapshots creados."))
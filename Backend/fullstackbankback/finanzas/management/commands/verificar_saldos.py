@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from finanzas.contabilidad import verificar_saldos
+
+
+class Command(BaseCommand):
+    help = "Reconstruye los saldos repitiendo el libro mayor y los compara con los de cada cuenta."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help="Cuentas por consulta.")
+
+    def handle(self, *args, **options):
+        diferencias = verificar_saldos(tamano_lote=options['lote'])
+        for cuenta_id, actual, reconstruido in diferencias:
+            self.stdout.write(
+                f"Cuenta {cuenta_id}: pesos {actual['pesos']} (libro mayor {reconstruido['pesos']}), "
+                f"dolares {actual['dolares']} (libro mayor {reconstruido['dolares']})"
+            )
+        if diferencias:
+            raise CommandError(f"{len(diferencias)} cuentas no coinciden con el libro mayor.")
+        self.stdout.write(self.style.SUCCESS("Todos los saldos coinciden con el libro mayor."))
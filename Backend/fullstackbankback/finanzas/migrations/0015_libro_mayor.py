@@ -0,0 +1,69 @@
+# Generated by Django 5.1.3 on 2026-10-18 07:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def crear_snapshots_iniciales(apps, schema_editor):
+    # los saldos existentes no tienen movimientos: quedan como punto de partida del libro mayor
+    Cuenta = apps.get_model('finanzas', 'Cuenta')
+    SaldoSnapshot = apps.get_model('finanzas', 'SaldoSnapshot')
+    SaldoSnapshot.objects.bulk_create([
+        SaldoSnapshot(cuenta_id=cuenta_id, balance_pesos=pesos, balance_dolares=dolares, ultimo_movimiento_id=0)
+        for cuenta_id, pesos, dolares in Cuenta.objects.values_list('id', 'balance_pesos', 'balance_dolares')
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0014_transferencia_username_emisor_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='prestamo',
+            name='estado',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('aprobado', 'Aprobado'), ('rechazado', 'Rechazado'), ('anulado', 'Anulado')], default='pendiente', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='Asiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('transferencia', 'Transferencia'), ('pago', 'Pago de servicio'), ('prestamo', 'Préstamo'), ('apertura', 'Apertura')], max_length=20)),
+                ('fecha', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('pago', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='asientos', to='finanzas.servicios')),
+                ('prestamo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='asientos', to='finanzas.prestamo')),
+                ('transferencia', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='asientos', to='finanzas.transferencia')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Movimiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('contrapartida', models.CharField(blank=True, max_length=20)),
+                ('moneda', models.CharField(choices=[('pesos', 'Pesos'), ('dolares', 'Dólares')], default='pesos', max_length=10)),
+                ('monto', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('asiento', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='movimientos', to='finanzas.asiento')),
+                ('cuenta', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='movimientos', to='finanzas.cuenta')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['cuenta', 'id'], name='finanzas_mo_cuenta__6d1c1d_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SaldoSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance_pesos', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('balance_dolares', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('ultimo_movimiento_id', models.BigIntegerField(default=0)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('cuenta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='finanzas.cuenta')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['cuenta', '-ultimo_movimiento_id'], name='finanzas_sa_cuenta__9cd0dd_idx')],
+            },
+        ),
+        migrations.RunPython(crear_snapshots_iniciales, migrations.RunPython.noop),
+    ]
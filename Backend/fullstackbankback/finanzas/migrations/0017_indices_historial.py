@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-18 07:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0016_clave_idempotencia'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='servicios',
+            index=models.Index(fields=['cuenta', 'fecha_pago'], name='finanzas_se_cuenta__fb8aec_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transferencia',
+            index=models.Index(fields=['cuenta_origen', 'fecha'], name='finanzas_tr_cuenta__203210_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transferencia',
+            index=models.Index(fields=['cuenta_destino', 'fecha'], name='finanzas_tr_cuenta__59780a_idx'),
+        ),
+    ]
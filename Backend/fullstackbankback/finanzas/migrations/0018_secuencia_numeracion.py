@@ -0,0 +1,20 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0017_indices_historial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaNumeracion',
+            fields=[
+                ('nombre', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('siguiente', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0018_secuencia_numeracion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prestamo',
+            name='sistema',
+            field=models.CharField(choices=[('directo', 'Interés directo'), ('frances', 'Francés'), ('aleman', 'Alemán')], default='directo', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='CuotaPrestamo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.PositiveSmallIntegerField()),
+                ('fecha_vencimiento', models.DateField()),
+                ('capital', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('interes', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('cuota', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('saldo_restante', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('pagada', 'Pagada')], default='pendiente', max_length=10)),
+                ('fecha_pago', models.DateTimeField(blank=True, null=True)),
+                ('prestamo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cuotas', to='finanzas.prestamo')),
+            ],
+            options={
+                'ordering': ['prestamo', 'numero'],
+                'indexes': [models.Index(fields=['fecha_vencimiento', 'estado'], name='finanzas_cu_fecha_v_705295_idx')],
+                'constraints': [models.UniqueConstraint(fields=('prestamo', 'numero'), name='cuota_unica_por_prestamo')],
+            },
+        ),
+    ]
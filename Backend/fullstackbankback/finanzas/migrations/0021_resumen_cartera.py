@@ -0,0 +1,52 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def cargar_cartera(apps, schema_editor):
+    Prestamo = apps.get_model('finanzas', 'Prestamo')
+    ResumenCartera = apps.get_model('finanzas', 'ResumenCartera')
+    filas = Prestamo.objects.annotate(mes=TruncMonth('fecha_inicio')).values(
+        'cuenta__usuario__sucursal_id', 'estado', 'mes'
+    ).annotate(
+        cantidad=Count('id'), capital=Sum('monto_prestado'), total=Sum('pago_total'), cuota=Sum('cuota_mensual'),
+    ).order_by()
+    ResumenCartera.objects.bulk_create([
+        ResumenCartera(
+            sucursal_id=fila['cuenta__usuario__sucursal_id'], estado=fila['estado'], mes=fila['mes'],
+            cantidad=fila['cantidad'], capital=fila['capital'], pago_total=fila['total'], cuota_mensual=fila['cuota'],
+        )
+        for fila in filas
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0020_cola_tareas'),
+        ('sucursales', '0001_initial'),
+        ('usuarios', '0003_alter_usuario_sucursal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenCartera',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(max_length=10)),
+                ('mes', models.DateField()),
+                ('cantidad', models.IntegerField(default=0)),
+                ('capital', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('pago_total', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('cuota_mensual', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('sucursal', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_cartera', to='sucursales.sucursal')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('sucursal', 'estado', 'mes'), name='resumen_cartera_unico')],
+            },
+        ),
+        migrations.RunPython(cargar_cartera, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0021_resumen_cartera'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='asiento',
+            name='tipo',
+            field=models.CharField(choices=[('transferencia', 'Transferencia'), ('pago', 'Pago de servicio'), ('prestamo', 'Préstamo'), ('cuota', 'Cuota de préstamo'), ('apertura', 'Apertura')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='LoteCobro',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('cuenta_desde', models.BigIntegerField()),
+                ('cuenta_hasta', models.BigIntegerField()),
+                ('completado', models.BooleanField(default=False)),
+                ('cuotas_cobradas', models.IntegerField(default=0)),
+                ('cuotas_sin_saldo', models.IntegerField(default=0)),
+                ('monto_cobrado', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'cuenta_desde'), name='lote_cobro_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0022_cobranza_cuotas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DebitoAutomatico',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('servicio', models.CharField(max_length=30)),
+                ('monto', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('frecuencia', models.CharField(choices=[('semanal', 'Semanal'), ('quincenal', 'Quincenal'), ('mensual', 'Mensual'), ('anual', 'Anual')], default='mensual', max_length=10)),
+                ('proximo_vencimiento', models.DateField()),
+                ('activo', models.BooleanField(default=True)),
+                ('ultimo_estado', models.CharField(blank=True, max_length=20)),
+                ('intentos_fallidos', models.PositiveSmallIntegerField(default=0)),
+                ('ultimo_cobro', models.DateField(blank=True, null=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('cuenta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='debitos_automaticos', to='finanzas.cuenta')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['activo', 'proximo_vencimiento'], name='finanzas_de_activo_9bdcd3_idx')],
+            },
+        ),
+    ]
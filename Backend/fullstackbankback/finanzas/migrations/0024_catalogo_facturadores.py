@@ -0,0 +1,79 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+FACTURADORES = [
+    ('ESCOLAR', 'Escolar', 'educacion'),
+    ('VARIOS', 'Varios', 'varios'),
+    ('INTERNET', 'Internet', 'telecomunicaciones'),
+    ('LUZ', 'Luz', 'energia'),
+    ('COMIDA', 'Comida', 'alimentos'),
+    ('VIAJE', 'Viaje', 'turismo'),
+    ('NEGOCIOS', 'Negocios', 'comercios'),
+]
+
+
+def cargar_facturadores(apps, schema_editor):
+    Facturador = apps.get_model('finanzas', 'Facturador')
+    Servicios = apps.get_model('finanzas', 'Servicios')
+    DebitoAutomatico = apps.get_model('finanzas', 'DebitoAutomatico')
+
+    Facturador.objects.bulk_create([
+        Facturador(codigo=codigo, nombre=nombre, categoria=categoria) for codigo, nombre, categoria in FACTURADORES
+    ])
+    por_nombre = {f.nombre.lower(): f for f in Facturador.objects.all()}
+    codigos = {f.codigo for f in por_nombre.values()}
+
+    # los textos que no están en el catálogo quedan como facturadores inactivos: conservan
+    # el historial, pero no se aceptan en pagos nuevos
+    textos = set(Servicios.objects.values_list('servicio', flat=True).distinct())
+    textos |= set(DebitoAutomatico.objects.values_list('servicio', flat=True).distinct())
+    for texto in sorted(textos):
+        nombre = texto.strip()
+        if nombre.lower() in por_nombre:
+            continue
+        base = (slugify(nombre).upper().replace('-', '_') or 'SERVICIO')[:16]
+        codigo, n = base, 1
+        while codigo in codigos:
+            n += 1
+            codigo = f"{base}_{n}"
+        codigos.add(codigo)
+        por_nombre[nombre.lower()] = Facturador.objects.create(codigo=codigo, nombre=nombre, activo=False)
+
+    # un UPDATE por texto distinto, no por pago
+    for texto in textos:
+        facturador = por_nombre[texto.strip().lower()]
+        Servicios.objects.filter(servicio=texto).update(facturador=facturador)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0023_debitos_automaticos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Facturador',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(max_length=20, unique=True)),
+                ('nombre', models.CharField(max_length=30, unique=True)),
+                ('categoria', models.CharField(choices=[('educacion', 'Educación'), ('energia', 'Energía'), ('telecomunicaciones', 'Telecomunicaciones'), ('alimentos', 'Alimentos'), ('turismo', 'Turismo'), ('comercios', 'Comercios'), ('varios', 'Varios')], default='varios', max_length=20)),
+                ('activo', models.BooleanField(default=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='servicios',
+            name='facturador',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='pagos', to='finanzas.facturador'),
+        ),
+        migrations.AddIndex(
+            model_name='servicios',
+            index=models.Index(fields=['facturador', 'fecha_pago'], name='finanzas_se_factura_d7d708_idx'),
+        ),
+        migrations.RunPython(cargar_facturadores, migrations.RunPython.noop),
+    ]
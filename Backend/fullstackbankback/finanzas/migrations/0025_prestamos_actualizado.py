@@ -0,0 +1,26 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0024_catalogo_facturadores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prestamo',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='prestamo',
+            index=models.Index(fields=['estado', 'cuenta'], name='finanzas_pr_estado_7c13a0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prestamo',
+            index=models.Index(fields=['actualizado'], name='finanzas_pr_actuali_1d6fcc_idx'),
+        ),
+    ]
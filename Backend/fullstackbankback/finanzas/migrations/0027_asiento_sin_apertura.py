@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 09:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0026_cache_compartida'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='asiento',
+            name='tipo',
+            field=models.CharField(choices=[('transferencia', 'Transferencia'), ('pago', 'Pago de servicio'), ('prestamo', 'Préstamo'), ('cuota', 'Cuota de préstamo')], max_length=20),
+        ),
+    ]
@@ -1,8 +1,24 @@
 import datetime
 from random import randint
-import random
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+
+def guardar_con_numero_nuevo(instancia, campo, generar, guardar, *args, **kwargs):
+    # los números asignados nunca se repiten entre sí, pero pueden chocar con alguno
+    # de los generados al azar antes del asignador: en ese caso se pide otro
+    for intento in range(3):
+        setattr(instancia, campo, generar())
+        try:
+            with transaction.atomic():
+                return guardar(*args, **kwargs)
+        except IntegrityError:
+            duplicado = type(instancia).objects.filter(**{campo: getattr(instancia, campo)}).exists()
+            setattr(instancia, campo, None)
+            if not duplicado or intento == 2:
+                raise
 
 
 class Cuenta(models.Model):
@@ -18,12 +34,13 @@ class Cuenta(models.Model):
     numero_cuenta = models.CharField(max_length=10, unique=True, null=True, blank=True)
 
     def save(self, *args, **kwargs):
-        if not self.numero_cuenta:
-            self.numero_cuenta = self.generar_numero_cuenta()
-        super().save(*args, **kwargs)
+        if self.numero_cuenta:
+            return super().save(*args, **kwargs)
+        guardar_con_numero_nuevo(self, 'numero_cuenta', self.generar_numero_cuenta, super().save, *args, **kwargs)
 
     def generar_numero_cuenta(self):
-        return f"{random.randint(100, 999)}-{random.randint(10000, 99999)}"
+        from .numeracion import numeros_cuenta
+        return numeros_cuenta(1)[0]
 
     def __str__(self):
         return f"{self.tipo_cuenta} - {self.usuario.username} - {self.numero_cuenta}"
@@ -52,21 +69,24 @@ class Tarjeta(models.Model):
         blank=True
     )
 
-    def save(self, *args, **kwargs):
-        if not self.numero_tarjeta:
-            self.numero_tarjeta = self.generar_numero_tarjeta()
+    def completar_seguridad(self):
         if not self.cvv:
             self.cvv = str(randint(100, 999))
         if not self.expiracion:
             self.expiracion = datetime.date.today() + datetime.timedelta(days=3 * 365)
-        super().save(*args, **kwargs)
+
+    def save(self, *args, **kwargs):
+        self.completar_seguridad()
+        if self.numero_tarjeta:
+            return super().save(*args, **kwargs)
+        guardar_con_numero_nuevo(
+            self, 'numero_tarjeta', lambda: self.generar_numero_tarjeta(self.proveedor), super().save, *args, **kwargs
+        )
 
     @staticmethod
-    def generar_numero_tarjeta():
-        while True:
-            numero = ''.join([str(randint(0, 9)) for _ in range(16)])
-            if not Tarjeta.objects.filter(numero_tarjeta=numero).exists():
-                return numero
+    def generar_numero_tarjeta(proveedor=None):
+        from .numeracion import numeros_tarjeta
+        return numeros_tarjeta(proveedor, 1)[0]
 
     def __str__(self):
         return f"{self.numero_tarjeta} - {self.tipo_tarjeta}"
@@ -81,11 +101,25 @@ class Transferencia(models.Model):
     username_emisor = models.CharField(max_length=255)
     username_receptor = models.CharField(max_length=255)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['cuenta_origen', 'fecha']),
+            models.Index(fields=['cuenta_destino', 'fecha']),
+        ]
+
     def __str__(self):
         return f"Transferencia de {self.username_emisor} a {self.username_receptor} - Monto: {self.monto}"
 
 
 class Prestamo(models.Model):
+    SISTEMA_CHOICES = [
+        ('directo', 'Interés directo'),
+        ('frances', 'Francés'),
+        ('aleman', 'Alemán'),
+    ]
+    # de estos salen pago_total, cuota_mensual y el cronograma
+    CAMPOS_CONDICIONES = ('cuenta', 'monto_prestado', 'interes', 'meses_duracion', 'sistema')
+
     cuenta = models.ForeignKey(Cuenta, on_delete=models.CASCADE, related_name='prestamos')
     monto_prestado = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     interes = models.DecimalField(max_digits=5, decimal_places=2, default=0)
@@ -103,53 +137,357 @@ class Prestamo(models.Model):
         ],
         default='pendiente'
     )
+    # en el sistema directo `interes` es el recargo total; en francés y alemán, la tasa nominal anual
+    sistema = models.CharField(max_length=10, choices=SISTEMA_CHOICES, default='directo')
+    # último cambio: lo usan las consultas incrementales de las colas de empleados
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'cuenta']),
+            models.Index(fields=['actualizado']),
+        ]
 
     def calcular_cuotas(self):
-        self.pago_total = self.monto_prestado + (self.monto_prestado * (self.interes / 100))
-        self.cuota_mensual = self.pago_total / self.meses_duracion
+        from .amortizacion import resumen_prestamo
+        self.pago_total, self.cuota_mensual = resumen_prestamo(
+            self.monto_prestado, self.interes, self.meses_duracion, self.sistema
+        )
+
+    def recalcular_cronograma(self):
+        # solo para préstamos pendientes: todavía no se cobró ninguna cuota
+        from .amortizacion import generar_cronogramas
+
+        self.calcular_cuotas()
+        with transaction.atomic():
+            self.save(update_fields=['pago_total', 'cuota_mensual'])
+            self.cuotas.all().delete()
+            generar_cronogramas([self])
 
     def aprobar(self):
+        from . import cartera
+        from .contabilidad import registrar_prestamos
+        from .operaciones import acreditar, transaccion_exclusiva
+        from .resumen import invalidar_resumen
+
         if self.estado != 'pendiente':
             raise ValueError("Solo se pueden aprobar préstamos pendientes.")
 
-        self.cuenta.balance_pesos += self.monto_prestado
-        self.cuenta.save()
-
-        self.estado = 'aprobado'
-        self.save()
+        with transaccion_exclusiva():
+            # el cambio de estado condicionado evita acreditar dos veces el mismo préstamo
+            ahora = timezone.now()
+            if not Prestamo.objects.filter(id=self.id, estado='pendiente').update(estado='aprobado', actualizado=ahora):
+                raise ValueError("Solo se pueden aprobar préstamos pendientes.")
+            self.estado, self.actualizado = 'aprobado', ahora
+            cartera.mover([self], 'pendiente', 'aprobado')
+            acreditar(self.cuenta_id, self.monto_prestado)
+            registrar_prestamos([(self, self.monto_prestado)])
+            invalidar_resumen([self.cuenta.usuario_id])
 
     def rechazar(self):
+        from . import cartera
+
         if self.estado != 'pendiente':
             raise ValueError("Solo se pueden rechazar préstamos pendientes.")
-        self.estado = 'rechazado'
-        self.save()
+        with transaction.atomic():
+            ahora = timezone.now()
+            if not Prestamo.objects.filter(id=self.id, estado='pendiente').update(estado='rechazado', actualizado=ahora):
+                raise ValueError("Solo se pueden rechazar préstamos pendientes.")
+            self.estado, self.actualizado = 'rechazado', ahora
+            cartera.mover([self], 'pendiente', 'rechazado')
 
     def anular(self):
+        from . import cartera
+        from .contabilidad import registrar_prestamos
+        from .operaciones import transaccion_exclusiva
+        from .resumen import invalidar_resumen
+
         if self.estado != 'aprobado':
             raise ValueError("Solo se pueden anular préstamos aprobados.")
 
-        self.cuenta.balance_pesos -= self.monto_prestado
-        self.cuenta.save()
-
-        self.estado = 'anulado'
-        self.save()
+        with transaccion_exclusiva():
+            ahora = timezone.now()
+            if not Prestamo.objects.filter(id=self.id, estado='aprobado').update(estado='anulado', actualizado=ahora):
+                raise ValueError("Solo se pueden anular préstamos aprobados.")
+            self.estado, self.actualizado = 'anulado', ahora
+            cartera.mover([self], 'aprobado', 'anulado')
+            Cuenta.objects.filter(id=self.cuenta_id).update(balance_pesos=models.F('balance_pesos') - self.monto_prestado)
+            registrar_prestamos([(self, -self.monto_prestado)])
+            invalidar_resumen([self.cuenta.usuario_id])
 
     def save(self, *args, **kwargs):
+        from . import cartera
+        from .amortizacion import generar_cronogramas
 
-        if not self.pk:
-            self.calcular_cuotas()
-        super().save(*args, **kwargs)
+        if self.pk:
+            return super().save(*args, **kwargs)
+        self.calcular_cuotas()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            generar_cronogramas([self])
+            cartera.mover([self], None, self.estado)
 
     def __str__(self):
         return f"Préstamo de {self.monto_prestado} - {self.estado}"
 
 
+class CuotaPrestamo(models.Model):
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('pagada', 'Pagada'),
+    ]
+
+    prestamo = models.ForeignKey(Prestamo, on_delete=models.CASCADE, related_name='cuotas')
+    numero = models.PositiveSmallIntegerField()
+    fecha_vencimiento = models.DateField()
+    capital = models.DecimalField(max_digits=12, decimal_places=2)
+    interes = models.DecimalField(max_digits=12, decimal_places=2)
+    cuota = models.DecimalField(max_digits=12, decimal_places=2)
+    saldo_restante = models.DecimalField(max_digits=12, decimal_places=2)
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default='pendiente')
+    fecha_pago = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['prestamo', 'numero']
+        constraints = [
+            models.UniqueConstraint(fields=['prestamo', 'numero'], name='cuota_unica_por_prestamo'),
+        ]
+        indexes = [
+            models.Index(fields=['fecha_vencimiento', 'estado']),
+        ]
+
+    def __str__(self):
+        return f"Cuota {self.numero} del préstamo {self.prestamo_id}"
+
+
+class Facturador(models.Model):
+    # catálogo de empresas a las que se les pueden pagar servicios
+    CATEGORIA_CHOICES = [
+        ('educacion', 'Educación'),
+        ('energia', 'Energía'),
+        ('telecomunicaciones', 'Telecomunicaciones'),
+        ('alimentos', 'Alimentos'),
+        ('turismo', 'Turismo'),
+        ('comercios', 'Comercios'),
+        ('varios', 'Varios'),
+    ]
+
+    codigo = models.CharField(max_length=20, unique=True)
+    nombre = models.CharField(max_length=30, unique=True)
+    categoria = models.CharField(max_length=20, choices=CATEGORIA_CHOICES, default='varios')
+    activo = models.BooleanField(default=True)
+
+    def __str__(self):
+        return f"{self.nombre} ({self.codigo})"
+
+
 class Servicios(models.Model):
     cuenta = models.ForeignKey(Cuenta, on_delete=models.CASCADE, related_name='pagos')
+    facturador = models.ForeignKey(Facturador, on_delete=models.PROTECT, null=True, blank=True, related_name='pagos')
     servicio = models.CharField(max_length=30)
     monto = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     estado = models.CharField(max_length=10, default='pendiente')
     fecha_pago = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['cuenta', 'fecha_pago']),
+            models.Index(fields=['facturador', 'fecha_pago']),
+        ]
+
+    def __str__(self):
+        return f"Pago de {self.monto} al servicio {self.servicio}"
+
+class Asiento(models.Model):
+    # libro mayor: solo se insertan filas, nunca se actualizan ni se borran
+    TIPO_CHOICES = [
+        ('transferencia', 'Transferencia'),
+        ('pago', 'Pago de servicio'),
+        ('prestamo', 'Préstamo'),
+        ('cuota', 'Cuota de préstamo'),
+    ]
+
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    transferencia = models.ForeignKey(Transferencia, on_delete=models.SET_NULL, null=True, blank=True, related_name='asientos')
+    pago = models.ForeignKey(Servicios, on_delete=models.SET_NULL, null=True, blank=True, related_name='asientos')
+    prestamo = models.ForeignKey(Prestamo, on_delete=models.SET_NULL, null=True, blank=True, related_name='asientos')
+    fecha = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Asiento {self.id} - {self.tipo}"
+
+
+class Movimiento(models.Model):
+    # cada asiento tiene al menos dos movimientos que suman cero; la contrapartida
+    # externa (servicios, préstamos) se registra con cuenta vacía
+    MONEDA_CHOICES = [
+        ('pesos', 'Pesos'),
+        ('dolares', 'Dólares'),
+    ]
+
+    asiento = models.ForeignKey(Asiento, on_delete=models.PROTECT, related_name='movimientos')
+    cuenta = models.ForeignKey(Cuenta, on_delete=models.PROTECT, null=True, blank=True, related_name='movimientos')
+    contrapartida = models.CharField(max_length=20, blank=True)
+    moneda = models.CharField(max_length=10, choices=MONEDA_CHOICES, default='pesos')
+    monto = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['cuenta', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.monto} {self.moneda} - cuenta {self.cuenta_id or self.contrapartida}"
+
+
+class SaldoSnapshot(models.Model):
+    # checkpoint periódico: saldo de la cuenta incluyendo todos los movimientos hasta ultimo_movimiento_id
+    cuenta = models.ForeignKey(Cuenta, on_delete=models.CASCADE, related_name='snapshots')
+    balance_pesos = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    balance_dolares = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    ultimo_movimiento_id = models.BigIntegerField(default=0)
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['cuenta', '-ultimo_movimiento_id']),
+        ]
+
+    def __str__(self):
+        return f"Snapshot cuenta {self.cuenta_id} hasta movimiento {self.ultimo_movimiento_id}"
+
+
+class ClaveIdempotencia(models.Model):
+    ESTADO_CHOICES = [
+        ('en_proceso', 'En proceso'),
+        ('completada', 'Completada'),
+    ]
+
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='claves_idempotencia')
+    clave = models.CharField(max_length=255)
+    ruta = models.CharField(max_length=255)
+    huella = models.CharField(max_length=64)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='en_proceso')
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    respuesta = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    creada = models.DateTimeField(auto_now_add=True)
+    expira = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'clave'], name='clave_idempotencia_unica_por_usuario'),
+        ]
+
+    def __str__(self):
+        return f"{self.clave} - {self.estado}"
+
+
+class SecuenciaNumeracion(models.Model):
+    # contador por tipo de número (cuentas, tarjetas por proveedor); se reserva de a bloques
+    nombre = models.CharField(max_length=50, primary_key=True)
+    siguiente = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.nombre}: {self.siguiente}"
+
+
+class Tarea(models.Model):
+    # cola de trabajos en la base: los procesa `manage.py procesar_tareas`
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('completada', 'Completada'),
+        ('fallida', 'Fallida'),
+    ]
+
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                related_name='tareas')
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    intentos = models.PositiveSmallIntegerField(default=0)
+    max_intentos = models.PositiveSmallIntegerField(default=5)
+    disponible_desde = models.DateTimeField(default=timezone.now)
+    tomada_por = models.CharField(max_length=100, blank=True)
+    tomada_en = models.DateTimeField(null=True, blank=True)
+    resultado = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+    creada = models.DateTimeField(auto_now_add=True)
+    actualizada = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'disponible_desde']),
+        ]
+
+    def __str__(self):
+        return f"Tarea {self.id} - {self.tipo} - {self.estado}"
+
+
+class ResumenCartera(models.Model):
+    # totales precalculados de préstamos por sucursal, estado y mes de inicio; los mantiene finanzas.cartera
+    sucursal = models.ForeignKey('sucursales.Sucursal', on_delete=models.CASCADE, null=True, blank=True,
+                                 related_name='resumenes_cartera')
+    estado = models.CharField(max_length=10)
+    mes = models.DateField()
+    cantidad = models.IntegerField(default=0)
+    capital = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    pago_total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    cuota_mensual = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sucursal', 'estado', 'mes'], name='resumen_cartera_unico'),
+        ]
+
+    def __str__(self):
+        return f"Cartera sucursal {self.sucursal_id} - {self.estado} - {self.mes:%Y-%m}"
+
+
+class LoteCobro(models.Model):
+    # checkpoint de la cobranza de cuotas: un rango de cuentas por fila; un lote completado no se vuelve a procesar
+    fecha = models.DateField()
+    cuenta_desde = models.BigIntegerField()
+    cuenta_hasta = models.BigIntegerField()
+    completado = models.BooleanField(default=False)
+    cuotas_cobradas = models.IntegerField(default=0)
+    cuotas_sin_saldo = models.IntegerField(default=0)
+    monto_cobrado = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'cuenta_desde'], name='lote_cobro_unico'),
+        ]
+
+    def __str__(self):
+        return f"Cobro {self.fecha} cuentas {self.cuenta_desde}-{self.cuenta_hasta}"
+
+
+class DebitoAutomatico(models.Model):
+    # adhesión a débito automático: paga `servicio` por `monto` cada `frecuencia` desde la cuenta
+    FRECUENCIA_CHOICES = [
+        ('semanal', 'Semanal'),
+        ('quincenal', 'Quincenal'),
+        ('mensual', 'Mensual'),
+        ('anual', 'Anual'),
+    ]
+
+    cuenta = models.ForeignKey(Cuenta, on_delete=models.CASCADE, related_name='debitos_automaticos')
+    servicio = models.CharField(max_length=30)
+    monto = models.DecimalField(max_digits=12, decimal_places=2)
+    frecuencia = models.CharField(max_length=10, choices=FRECUENCIA_CHOICES, default='mensual')
+    proximo_vencimiento = models.DateField()
+    activo = models.BooleanField(default=True)
+    ultimo_estado = models.CharField(max_length=20, blank=True)
+    intentos_fallidos = models.PositiveSmallIntegerField(default=0)
+    ultimo_cobro = models.DateField(null=True, blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['activo', 'proximo_vencimiento']),
+        ]
+
     def __str__(self):
-        return f"Pago de {self.monto} al servicio {self.servicio}"
\ No newline at end of file
+        return f"Débito de {self.monto} a {self.servicio} ({self.frecuencia})"
@@ -0,0 +1,140 @@
+import hashlib
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from .models import SecuenciaNumeracion
+
+
+TAMANO_BLOQUE = 100
+RONDAS = 6
+
+# número de cuenta: "ddd-ddddd" con el primer grupo entre 100 y 999 -> 900 * 90000 = 9000 * 9000 valores
+CUENTA_A, CUENTA_B = 9000, 9000
+
+# número de tarjeta: BIN (6) + 9 dígitos permutados + dígito verificador de Luhn
+TARJETA_A, TARJETA_B = 32000, 31250
+BINES = {
+    'visa': '476173',
+    'mastercard': '542418',
+}
+BIN_POR_DEFECTO = BINES['visa']
+
+
+class NumeracionAgotada(Exception):
+    pass
+
+
+def _clave(nombre):
+    return hashlib.sha256(f"{settings.NUMERACION_CLAVE}:numeracion:{nombre}".encode()).digest()
+
+
+def _funcion_ronda(clave, ronda, valor):
+    resumen = hashlib.blake2b(f"{ronda}:{valor}".encode(), key=clave, digest_size=8).digest()
+    return int.from_bytes(resumen, 'big')
+
+
+def permutar(valor, a, b, clave, rondas=RONDAS):
+    """
+    Permutación de Feistel sobre [0, a*b): lleva un contador a un número de aspecto
+    aleatorio sin repetir nunca, así que no hace falta consultar si ya existe.
+    """
+    izquierda, derecha = divmod(valor, b)
+    modulos = (a, b)
+    for ronda in range(rondas):
+        izquierda, derecha = derecha, (izquierda + _funcion_ronda(clave, ronda, derecha)) % modulos[ronda % 2]
+    return izquierda * b + derecha
+
+
+def digito_luhn(digitos):
+    total = 0
+    for i, digito in enumerate(reversed(digitos)):
+        valor = int(digito)
+        if i % 2 == 0:
+            valor *= 2
+            if valor > 9:
+                valor -= 9
+        total += valor
+    return str((10 - total % 10) % 10)
+
+
+def es_luhn_valido(numero):
+    return digito_luhn(numero[:-1]) == numero[-1]
+
+
+def reservar_bloque(nombre, cantidad):
+    """
+    Reserva `cantidad` valores consecutivos del contador `nombre`. Primero se incrementa
+    y después se lee, así dos procesos nunca pueden quedarse con el mismo bloque.
+    """
+    with transaction.atomic():
+        if not SecuenciaNumeracion.objects.filter(nombre=nombre).update(siguiente=F('siguiente') + cantidad):
+            try:
+                with transaction.atomic():
+                    SecuenciaNumeracion.objects.create(nombre=nombre, siguiente=cantidad)
+                return range(0, cantidad)
+            except IntegrityError:
+                # otro proceso creó el contador al mismo tiempo
+                SecuenciaNumeracion.objects.filter(nombre=nombre).update(siguiente=F('siguiente') + cantidad)
+        fin = SecuenciaNumeracion.objects.values_list('siguiente', flat=True).get(nombre=nombre)
+    return range(fin - cantidad, fin)
+
+
+class AsignadorBloques:
+    # cada proceso guarda el resto de su último bloque para no ir a la base en cada número
+    def __init__(self, tamano_bloque=TAMANO_BLOQUE):
+        self.tamano_bloque = tamano_bloque
+        self._disponibles = {}
+        self._lock = threading.Lock()
+
+    def _agregar(self, nombre, valores):
+        with self._lock:
+            self._disponibles.setdefault(nombre, []).extend(valores)
+
+    def tomar(self, nombre, cantidad):
+        with self._lock:
+            disponibles = self._disponibles.setdefault(nombre, [])
+            valores = disponibles[:cantidad]
+            del disponibles[:cantidad]
+
+        faltan = cantidad - len(valores)
+        if faltan:
+            bloque = list(reservar_bloque(nombre, max(self.tamano_bloque, faltan)))
+            valores += bloque[:faltan]
+            sobrantes = bloque[faltan:]
+            if connection.in_atomic_block:
+                # si la transacción externa se revierte, el contador vuelve atrás y otro proceso
+                # puede recibir el mismo bloque: el sobrante solo se guarda si hay commit
+                transaction.on_commit(lambda: self._agregar(nombre, sobrantes))
+            else:
+                self._agregar(nombre, sobrantes)
+        return valores
+
+
+asignador = AsignadorBloques()
+
+
+def numeros_cuenta(cantidad):
+    clave = _clave('cuenta')
+    numeros = []
+    for contador in asignador.tomar('cuenta', cantidad):
+        if contador >= CUENTA_A * CUENTA_B:
+            raise NumeracionAgotada("No quedan números de cuenta disponibles.")
+        valor = permutar(contador, CUENTA_A, CUENTA_B, clave)
+        numeros.append(f"{100 + valor // 90000}-{10000 + valor % 90000}")
+    return numeros
+
+
+def numeros_tarjeta(proveedor, cantidad):
+    bin_proveedor = BINES.get(proveedor, BIN_POR_DEFECTO)
+    nombre = f'tarjeta:{bin_proveedor}'
+    clave = _clave(nombre)
+    numeros = []
+    for contador in asignador.tomar(nombre, cantidad):
+        if contador >= TARJETA_A * TARJETA_B:
+            raise NumeracionAgotada("No quedan números de tarjeta disponibles.")
+        parcial = f"{bin_proveedor}{permutar(contador, TARJETA_A, TARJETA_B, clave):09d}"
+        numeros.append(parcial + digito_luhn(parcial))
+    return numeros
@@ -0,0 +1,295 @@
+import threading
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import OperationalError, connection, transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+
+from . import cartera
+from .contabilidad import registrar_pagos, registrar_prestamos, registrar_transferencias
+from .models import Cuenta, Prestamo, Servicios, Transferencia
+from .resumen import invalidar_resumen
+
+
+REINTENTOS_MAXIMOS = 5
+ESPERA_BASE = 0.01
+
+# accion -> (estado requerido, estado nuevo, signo del movimiento sobre la cuenta)
+ACCIONES_PRESTAMO = {
+    'aprobar': ('pendiente', 'aprobado', 1),
+    'rechazar': ('pendiente', 'rechazado', 0),
+    'anular': ('aprobado', 'anulado', -1),
+}
+
+# sqlite no soporta SELECT ... FOR UPDATE y admite un solo escritor a la vez:
+# serializamos las escrituras del proceso en vez de pelear por el lock de la base
+_escritura_sqlite = threading.RLock()
+
+
+class SaldoInsuficiente(Exception):
+    pass
+
+
+class CuentaInexistente(ValueError):
+    pass
+
+
+def es_error_reintentable(error):
+    # deadlock / serialization failure en postgres, tabla bloqueada en sqlite
+    codigo = getattr(getattr(error, '__cause__', None), 'pgcode', None)
+    if codigo in ('40001', '40P01'):
+        return True
+    mensaje = str(error).lower()
+    return 'deadlock' in mensaje or 'could not serialize' in mensaje or 'locked' in mensaje
+
+
+def con_reintentos(funcion, *args, **kwargs):
+    """
+    Ejecuta `funcion` reintentando ante deadlocks o fallas de serialización,
+    con espera exponencial entre intentos.
+    """
+    for intento in range(REINTENTOS_MAXIMOS):
+        try:
+            return funcion(*args, **kwargs)
+        except OperationalError as e:
+            if not es_error_reintentable(e) or intento == REINTENTOS_MAXIMOS - 1:
+                raise
+            time.sleep(ESPERA_BASE * (2 ** intento))
+
+
+@contextmanager
+def transaccion_exclusiva():
+    if connection.features.has_select_for_update:
+        with transaction.atomic():
+            yield
+    else:
+        with _escritura_sqlite, transaction.atomic():
+            yield
+
+
+def bloquear_cuentas(ids):
+    # siempre en el mismo orden (por id) para evitar deadlocks entre transferencias cruzadas
+    return list(Cuenta.objects.select_for_update().filter(id__in=sorted(set(ids))).order_by('id'))
+
+
+def debitar(cuenta_id, monto):
+    actualizadas = Cuenta.objects.filter(id=cuenta_id, balance_pesos__gte=monto).update(
+        balance_pesos=F('balance_pesos') - monto
+    )
+    if not actualizadas:
+        raise SaldoInsuficiente("Saldo insuficiente")
+
+
+def acreditar(cuenta_id, monto):
+    Cuenta.objects.filter(id=cuenta_id).update(balance_pesos=F('balance_pesos') + monto)
+
+
+def acreditar_varias(montos_por_cuenta):
+    # un solo UPDATE ... SET balance_pesos = balance_pesos + CASE id WHEN ... END
+    if not montos_por_cuenta:
+        return
+    Cuenta.objects.filter(id__in=montos_por_cuenta.keys()).update(
+        balance_pesos=F('balance_pesos') + Case(
+            *[When(id=cuenta_id, then=Value(monto)) for cuenta_id, monto in montos_por_cuenta.items()],
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+    )
+
+
+def _transferir(cuenta_origen_id, cuenta_destino_id, monto, descripcion, username_emisor, username_receptor):
+    with transaccion_exclusiva():
+        cuentas = bloquear_cuentas([cuenta_origen_id, cuenta_destino_id])
+        if len(cuentas) != 2:
+            raise CuentaInexistente("Destinatario no encontrado")
+        debitar(cuenta_origen_id, monto)
+        acreditar(cuenta_destino_id, monto)
+        transferencia = Transferencia.objects.create(
+            cuenta_origen_id=cuenta_origen_id,
+            cuenta_destino_id=cuenta_destino_id,
+            monto=monto,
+            descripcion=descripcion,
+            username_emisor=username_emisor,
+            username_receptor=username_receptor,
+        )
+        registrar_transferencias([transferencia])
+        invalidar_resumen([cuenta.usuario_id for cuenta in cuentas])
+        return transferencia
+
+
+def realizar_transferencia(cuenta_origen_id, cuenta_destino_id, monto, descripcion=None,
+                           username_emisor='', username_receptor=''):
+    """
+    Mueve `monto` pesos entre dos cuentas. El débito es un único UPDATE condicionado
+    al saldo, así que nunca deja una cuenta en negativo aunque haya concurrencia.
+    """
+    monto = Decimal(monto)
+    if monto <= 0:
+        raise ValueError("El monto debe ser mayor a 0")
+    if cuenta_origen_id == cuenta_destino_id:
+        raise ValueError("La cuenta origen y la cuenta destino no pueden ser la misma.")
+
+    return con_reintentos(
+        _transferir, cuenta_origen_id, cuenta_destino_id, monto, descripcion, username_emisor, username_receptor
+    )
+
+
+def _transferir_lote(cuenta_origen_id, username_emisor, filas):
+    resultados = {}
+    with transaccion_exclusiva():
+        cuentas = bloquear_cuentas([cuenta_origen_id] + [fila['cuenta_destino_id'] for fila in filas])
+        disponible = next(c.balance_pesos for c in cuentas if c.id == cuenta_origen_id)
+        existentes = {c.id for c in cuentas}
+
+        aceptadas = []
+        for fila in filas:
+            if fila['cuenta_destino_id'] not in existentes:
+                # el destino se resolvió desde la caché pero la cuenta ya no existe
+                resultados[fila['fila']] = {'fila': fila['fila'], 'error': "Destinatario no encontrado"}
+                continue
+            if fila['monto'] > disponible:
+                resultados[fila['fila']] = {'fila': fila['fila'], 'error': "Saldo insuficiente"}
+                continue
+            disponible -= fila['monto']
+            aceptadas.append(fila)
+
+        if not aceptadas:
+            return resultados
+
+        debitar(cuenta_origen_id, sum(fila['monto'] for fila in aceptadas))
+
+        creditos = {}
+        for fila in aceptadas:
+            creditos[fila['cuenta_destino_id']] = creditos.get(fila['cuenta_destino_id'], 0) + fila['monto']
+        acreditar_varias(creditos)
+
+        transferencias = Transferencia.objects.bulk_create([
+            Transferencia(
+                cuenta_origen_id=cuenta_origen_id,
+                cuenta_destino_id=fila['cuenta_destino_id'],
+                monto=fila['monto'],
+                descripcion=fila.get('descripcion'),
+                username_emisor=username_emisor,
+                username_receptor=fila['username_receptor'],
+            )
+            for fila in aceptadas
+        ])
+        registrar_transferencias(transferencias)
+        invalidar_resumen([cuenta.usuario_id for cuenta in cuentas])
+        for fila, transferencia in zip(aceptadas, transferencias):
+            resultados[fila['fila']] = {'fila': fila['fila'], 'id': transferencia.id, 'monto': fila['monto']}
+    return resultados
+
+
+def realizar_transferencias_lote(cuenta_origen_id, username_emisor, filas):
+    """
+    Ejecuta muchas transferencias desde una misma cuenta en una sola transacción:
+    un débito por el total aceptado, un UPDATE para todos los créditos y un
+    bulk_create de las transferencias. Las filas se aceptan en orden mientras
+    alcance el saldo; las que no entran se informan como rechazadas.
+
+    `filas` son dicts con fila, cuenta_destino_id, username_receptor, monto y descripcion.
+    Devuelve un dict fila -> resultado.
+    """
+    return con_reintentos(_transferir_lote, cuenta_origen_id, username_emisor, filas)
+
+
+def _pagar_lote(cuenta_id, filas):
+    resultados = {}
+    with transaccion_exclusiva():
+        cuentas = bloquear_cuentas([cuenta_id])
+        if not cuentas:
+            raise CuentaInexistente("Cuenta no encontrada")
+        disponible = cuentas[0].balance_pesos
+
+        aceptadas = []
+        for fila in filas:
+            if fila['monto'] > disponible:
+                resultados[fila['fila']] = {'fila': fila['fila'], 'error': "Saldo insuficiente"}
+                continue
+            disponible -= fila['monto']
+            aceptadas.append(fila)
+
+        if not aceptadas:
+            return resultados
+
+        debitar(cuenta_id, sum(fila['monto'] for fila in aceptadas))
+        pagos = Servicios.objects.bulk_create([
+            Servicios(cuenta_id=cuenta_id, facturador_id=fila.get('facturador'), servicio=fila['servicio'], monto=fila['monto'])
+            for fila in aceptadas
+        ])
+        registrar_pagos(pagos)
+        invalidar_resumen([cuentas[0].usuario_id])
+        for fila, pago in zip(aceptadas, pagos):
+            resultados[fila['fila']] = {'fila': fila['fila'], 'id': pago.id, 'monto': fila['monto']}
+    return resultados
+
+
+def realizar_pagos_lote(cuenta_id, filas):
+    """
+    Paga muchos servicios desde una cuenta en una sola transacción, con un único
+    débito por el total aceptado. Como en las transferencias en lote, las filas se
+    aceptan en orden mientras alcance el saldo.
+
+    `filas` son dicts con fila, servicio, facturador y monto. Devuelve un dict fila -> resultado.
+    """
+    return con_reintentos(_pagar_lote, cuenta_id, filas)
+
+
+def _procesar_prestamos_lote(accion, prestamo_ids):
+    estado_requerido, estado_nuevo, signo = ACCIONES_PRESTAMO[accion]
+    resultados = {}
+    with transaccion_exclusiva():
+        prestamos = list(Prestamo.objects.select_for_update().filter(id__in=sorted(set(prestamo_ids))).order_by('id'))
+        encontrados = {prestamo.id: prestamo for prestamo in prestamos}
+
+        aceptados = []
+        for prestamo_id in prestamo_ids:
+            prestamo = encontrados.get(prestamo_id)
+            if prestamo is None:
+                resultados[prestamo_id] = {'id': prestamo_id, 'error': "Préstamo no encontrado"}
+            elif prestamo.estado != estado_requerido:
+                resultados[prestamo_id] = {
+                    'id': prestamo_id, 'estado': prestamo.estado,
+                    'error': f"Solo se pueden {accion} préstamos {estado_requerido}s.",
+                }
+            else:
+                aceptados.append(prestamo)
+
+        if not aceptados:
+            return resultados
+
+        cuentas = bloquear_cuentas([prestamo.cuenta_id for prestamo in aceptados])
+        ahora = timezone.now()
+        Prestamo.objects.filter(id__in=[prestamo.id for prestamo in aceptados]).update(
+            estado=estado_nuevo, actualizado=ahora,
+        )
+        cartera.mover(aceptados, estado_requerido, estado_nuevo)
+
+        if signo:
+            montos = {}
+            for prestamo in aceptados:
+                montos[prestamo.cuenta_id] = montos.get(prestamo.cuenta_id, 0) + signo * prestamo.monto_prestado
+            acreditar_varias(montos)
+            registrar_prestamos([(prestamo, signo * prestamo.monto_prestado) for prestamo in aceptados])
+            invalidar_resumen([cuenta.usuario_id for cuenta in cuentas])
+
+        for prestamo in aceptados:
+            prestamo.estado, prestamo.actualizado = estado_nuevo, ahora
+            resultados[prestamo.id] = {'id': prestamo.id, 'estado': estado_nuevo, 'monto': prestamo.monto_prestado}
+    return resultados
+
+
+def procesar_prestamos_lote(accion, prestamo_ids):
+    """
+    Aprueba, rechaza o anula muchos préstamos en una sola transacción: bloquea los
+    préstamos y sus cuentas una vez, cambia el estado con un único UPDATE y mueve
+    los saldos con un UPDATE agrupado por cuenta.
+
+    Los préstamos que no existen o no están en el estado requerido se informan con
+    su error y no frenan al resto. Devuelve un dict id -> resultado.
+    """
+    if accion not in ACCIONES_PRESTAMO:
+        raise ValueError(f"Acción no válida: {accion}")
+    return con_reintentos(_procesar_prestamos_lote, accion, list(dict.fromkeys(prestamo_ids)))
@@ -0,0 +1,86 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class PaginacionKeyset(BasePagination):
+    """
+    Paginación por cursor sobre (campo_fecha, id), de lo más nuevo a lo más viejo.
+    Cada página filtra con WHERE (fecha, id) < (cursor) en lugar de usar OFFSET,
+    así que pedir la página N cuesta lo mismo que pedir la primera.
+    """
+    campo_fecha = 'fecha'
+    page_size = 50
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limite'
+
+    def codificar_cursor(self, objeto):
+        posicion = f"{getattr(objeto, self.campo_fecha).isoformat()}|{objeto.pk}"
+        return base64.urlsafe_b64encode(posicion.encode()).decode()
+
+    def decodificar_cursor(self, cursor):
+        try:
+            fecha, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            return datetime.fromisoformat(fecha), int(pk)
+        except (ValueError, UnicodeDecodeError):
+            raise ValidationError("Cursor inválido.")
+
+    def get_page_size(self, request):
+        try:
+            limite = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(limite, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        tamano = self.get_page_size(request)
+        queryset = queryset.order_by(f'-{self.campo_fecha}', '-pk')
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            fecha, pk = self.decodificar_cursor(cursor)
+            queryset = queryset.filter(
+                Q(**{f'{self.campo_fecha}__lt': fecha}) | Q(**{self.campo_fecha: fecha, 'pk__lt': pk})
+            )
+
+        # pedimos un elemento de más para saber si hay página siguiente sin hacer un COUNT
+        resultados = list(queryset[:tamano + 1])
+        self.siguiente = self.codificar_cursor(resultados[tamano - 1]) if len(resultados) > tamano else None
+        return resultados[:tamano]
+
+    def get_next_link(self):
+        if self.siguiente is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.siguiente)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class PaginacionTransferencias(PaginacionKeyset):
+    campo_fecha = 'fecha'
+
+
+class PaginacionPagos(PaginacionKeyset):
+    campo_fecha = 'fecha_pago'
@@ -0,0 +1,90 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import Cuenta, Prestamo, Transferencia, Servicios
+
+
+DURACION_CACHE = 300
+CENTAVOS = Decimal('0.01')
+
+
+def clave_resumen(usuario_id):
+    return f'resumen-financiero:{usuario_id}'
+
+
+def _total(valor):
+    # sqlite devuelve las sumas en punto flotante y None cuando no hay filas
+    return (valor or Decimal('0')).quantize(CENTAVOS)
+
+
+def calcular_resumen(usuario):
+    """
+    Arma el resumen financiero del usuario con cuatro consultas fijas:
+    saldos, préstamos activos, últimas transferencias y pagos del último mes.
+    """
+    saldos = Cuenta.objects.filter(usuario=usuario).aggregate(
+        pesos=Sum('balance_pesos'),
+        dolares=Sum('balance_dolares'),
+    )
+
+    prestamos = Prestamo.objects.filter(cuenta__usuario=usuario, estado='aprobado').aggregate(
+        total_pendiente=Sum('pago_total'),
+        proxima_cuota=Sum('cuota_mensual'),
+        cantidad_activos=Count('id'),
+    )
+
+    transferencias = Transferencia.objects.filter(cuenta_origen__usuario=usuario).order_by('-fecha').values_list(
+        'cuenta_origen_id', 'cuenta_destino_id', 'monto', 'fecha', 'descripcion'
+    )[:5]
+    transferencias_data = [
+        {
+            "cuenta_origen": cuenta_origen,
+            "cuenta_destino": cuenta_destino,
+            "monto": monto,
+            "fecha": fecha,
+            "descripcion": descripcion,
+        }
+        for cuenta_origen, cuenta_destino, monto, fecha, descripcion in transferencias
+    ]
+
+    ultimo_mes = timezone.now() - timedelta(days=30)
+    pagos_data = list(
+        Servicios.objects.filter(cuenta__usuario=usuario, fecha_pago__gte=ultimo_mes).values(
+            'servicio', 'monto', 'estado', 'fecha_pago'
+        )
+    )
+
+    return {
+        "balances_totales": {
+            "pesos": _total(saldos['pesos']),
+            "dolares": _total(saldos['dolares']),
+        },
+        "prestamos": {
+            "total_pendiente": _total(prestamos['total_pendiente']),
+            "proxima_cuota": _total(prestamos['proxima_cuota']),
+            "cantidad_activos": prestamos['cantidad_activos'],
+        },
+        "transferencias_recientes": transferencias_data,
+        "pagos_recientes": pagos_data,
+    }
+
+
+def obtener_resumen(usuario):
+    clave = clave_resumen(usuario.id)
+    resumen = cache.get(clave)
+    if resumen is None:
+        resumen = calcular_resumen(usuario)
+        cache.set(clave, resumen, DURACION_CACHE)
+    return resumen
+
+
+def invalidar_resumen(usuario_ids):
+    # se borra recién al confirmar la transacción, para no volver a cachear datos viejos
+    claves = [clave_resumen(usuario_id) for usuario_id in set(usuario_ids)]
+    if claves:
+        transaction.on_commit(lambda: cache.delete_many(claves))
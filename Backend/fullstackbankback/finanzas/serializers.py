@@ -1,5 +1,7 @@
 from django.db import transaction
-from .models import Cuenta, Tarjeta, Transferencia, Prestamo, Servicios
+from django.utils import timezone
+from .models import Cuenta, Tarjeta, Transferencia, Prestamo, CuotaPrestamo, Servicios, Tarea, DebitoAutomatico, Facturador
+from .facturadores import catalogo
 from rest_framework import serializers
 
 
@@ -7,7 +9,8 @@ class CuentaSerializer(serializers.ModelSerializer):
     class Meta:
         model = Cuenta
         fields = ['id', 'numero_cuenta', 'tipo_cuenta', 'balance_pesos', 'balance_dolares']
-        read_only_fields = ['id', 'numero_cuenta']
+        # los saldos solo cambian a través de operaciones registradas en el libro mayor
+        read_only_fields = ['id', 'numero_cuenta', 'balance_pesos', 'balance_dolares']
 
 
 class TarjetaSerializer(serializers.ModelSerializer):
@@ -56,45 +59,101 @@ class PrestamoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Prestamo
         fields = ['id', 'cuenta', 'monto_prestado', 'interes', 'pago_total', 'cuota_mensual', 'meses_duracion',
-                  'estado']
-        read_only_fields = ['id', 'pago_total', 'cuota_mensual', 'estado']
+                  'sistema', 'fecha_inicio', 'estado', 'actualizado']
+        read_only_fields = ['id', 'pago_total', 'cuota_mensual', 'fecha_inicio', 'estado', 'actualizado']
 
     def validate(self, data):
-        cuenta = data.get('cuenta')
+        # en un PATCH los campos que no vienen conservan su valor
+        def valor(campo):
+            return data[campo] if campo in data else getattr(self.instance, campo, None)
 
-        if data['monto_prestado'] <= 0:
+        if valor('monto_prestado') is None or valor('monto_prestado') <= 0:
             raise serializers.ValidationError("El monto debe ser mayor a $0.")
 
-        if data['meses_duracion'] <= 0 or data['meses_duracion'] > 60:
+        if valor('meses_duracion') is None or valor('meses_duracion') <= 0 or valor('meses_duracion') > 60:
             raise serializers.ValidationError("La duración debe estar entre 1 y 60 meses.")
 
+        # el cronograma de un préstamo aprobado ya se está cobrando: sus condiciones no cambian
+        if self.instance is not None and self.instance.estado != 'pendiente' and any(
+                campo in data and data[campo] != getattr(self.instance, campo) for campo in Prestamo.CAMPOS_CONDICIONES):
+            raise serializers.ValidationError("Solo se pueden cambiar las condiciones de préstamos pendientes.")
+
         return data
 
     def create(self, validated_data):
-        cuenta = validated_data['cuenta']
-        monto_prestado = validated_data['monto_prestado']
-        interes = validated_data['interes']
-        meses = validated_data['meses_duracion']
+        # pago_total, cuota_mensual y el cronograma los calcula el modelo al guardarse
+        return Prestamo.objects.create(estado='pendiente', **validated_data)
+
+
+class CuotaPrestamoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CuotaPrestamo
+        fields = ['numero', 'fecha_vencimiento', 'capital', 'interes', 'cuota', 'saldo_restante', 'estado',
+                  'fecha_pago']
+        read_only_fields = fields
 
-        pago_total = monto_prestado + (monto_prestado * (interes / 100))
-        cuota_mensual = pago_total / meses
 
-        return Prestamo.objects.create(
-            cuenta=cuenta,
-            monto_prestado=monto_prestado,
-            interes=interes,
-            pago_total=pago_total,
-            cuota_mensual=cuota_mensual,
-            meses_duracion=meses,
-            estado='pendiente'
-        )
+def validar_servicio(texto):
+    # contra el catálogo en memoria: no cuesta consultas
+    facturador = catalogo.buscar(texto)
+    if facturador is None:
+        raise serializers.ValidationError("El servicio no está en el catálogo de facturadores.")
+    return facturador
+
+
+class FacturadorSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Facturador
+        fields = ['id', 'codigo', 'nombre', 'categoria']
 
 
 class ServiciosSerializer(serializers.ModelSerializer):
     class Meta:
         model = Servicios
-        fields = ['id', 'cuenta', 'servicio', 'monto', 'estado', 'fecha_pago']
+        fields = ['id', 'cuenta', 'facturador', 'servicio', 'monto', 'estado', 'fecha_pago']
         extra_kwargs = {
             'estado': {'default': 'pendiente'},
-            'fecha_pago': {'read_only': True}
-        }
\ No newline at end of file
+            'fecha_pago': {'read_only': True},
+            'facturador': {'read_only': True},
+        }
+
+    def validate_servicio(self, servicio):
+        return validar_servicio(servicio).nombre
+
+    def validate(self, attrs):
+        if 'servicio' in attrs:
+            attrs['facturador'] = catalogo.buscar(attrs['servicio'])
+        return attrs
+
+
+class TareaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Tarea
+        fields = ['id', 'tipo', 'estado', 'intentos', 'max_intentos', 'resultado', 'error', 'creada', 'actualizada']
+        read_only_fields = fields
+
+
+class DebitoAutomaticoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DebitoAutomatico
+        fields = ['id', 'cuenta', 'servicio', 'monto', 'frecuencia', 'proximo_vencimiento', 'activo', 'ultimo_estado',
+                  'intentos_fallidos', 'ultimo_cobro', 'creado']
+        read_only_fields = ['id', 'ultimo_estado', 'intentos_fallidos', 'ultimo_cobro', 'creado']
+
+    def validate_cuenta(self, cuenta):
+        if cuenta.usuario_id != self.context['request'].user.id:
+            raise serializers.ValidationError("La cuenta no pertenece al usuario autenticado.")
+        return cuenta
+
+    def validate_servicio(self, servicio):
+        return validar_servicio(servicio).nombre
+
+    def validate_monto(self, monto):
+        if monto <= 0:
+            raise serializers.ValidationError("El monto debe ser mayor a 0")
+        return monto
+
+    def validate_proximo_vencimiento(self, fecha):
+        if fecha < timezone.localdate():
+            raise serializers.ValidationError("El próximo vencimiento no puede estar en el pasado.")
+        return fecha
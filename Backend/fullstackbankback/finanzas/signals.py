@@ -0,0 +1,88 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from usuarios.models import Usuario
+from usuarios.signals import perfiles_actualizados
+
+from . import cartera
+from .busqueda import CAMPOS_USUARIO, indice
+from .destinos import resolvedor
+from .facturadores import catalogo
+from .models import Cuenta, Facturador, Prestamo
+
+# los que cambian cómo se encuentra a un cliente en la búsqueda del personal
+CAMPOS_INDICE = {*CAMPOS_USUARIO, 'sucursal', 'sucursal_id', 'es_empleado'}
+
+
+def registro_indice(usuario):
+    return usuario.id, usuario.sucursal_id, usuario.es_empleado, tuple(getattr(usuario, campo) for campo in CAMPOS_USUARIO)
+
+
+@receiver(post_save, sender=Cuenta)
+def cuenta_guardada(sender, instance, created, **kwargs):
+    # una cuenta nueva no cambia ningún destino guardado: los alias que no existían no se guardan,
+    # y el username sigue resolviendo a la primera cuenta del usuario
+    if created:
+        numeros = [(instance.usuario_id, instance.numero_cuenta)]
+        transaction.on_commit(lambda: indice.agregar_cuentas(numeros))
+
+
+@receiver(post_delete, sender=Cuenta)
+def cuenta_eliminada(sender, instance, **kwargs):
+    # recién al confirmar: antes, otro proceso podría volver a guardar el destino viejo
+    transaction.on_commit(resolvedor.invalidar_todo)
+    numeros = [(instance.usuario_id, instance.numero_cuenta)]
+    transaction.on_commit(lambda: indice.quitar_cuentas(numeros))
+
+
+@receiver(post_save, sender=Usuario)
+def usuario_guardado(sender, instance, update_fields=None, **kwargs):
+    # los guardados que solo tocan otros campos (last_login en cada login) no pasan por el índice
+    if update_fields is not None and not CAMPOS_INDICE & set(update_fields):
+        return
+    registros = [registro_indice(instance)]
+    # recién al confirmar: un alta revertida no tiene que aparecer en la búsqueda
+    transaction.on_commit(lambda: indice.guardar_usuarios(registros))
+
+
+@receiver(post_save, sender=Usuario)
+def username_cambiado(sender, instance, created, **kwargs):
+    # el username viejo puede quedar libre para otro usuario: no tiene que seguir resolviendo a este
+    acceso = getattr(instance, '_acceso', {})
+    if not created and 'username' in acceso and acceso['username'] != instance.username:
+        transaction.on_commit(resolvedor.invalidar_todo)
+
+
+@receiver(post_save, sender=Usuario)
+def sucursal_cambiada(sender, instance, created, **kwargs):
+    # Usuario.save recién actualiza _acceso después de guardar: acá todavía tiene la sucursal anterior
+    acceso = getattr(instance, '_acceso', {})
+    if created or 'sucursal_id' not in acceso or 'sucursal_id' not in instance.__dict__:
+        return
+    if acceso['sucursal_id'] != instance.sucursal_id:
+        cartera.cambiar_sucursal(instance.id, acceso['sucursal_id'], instance.sucursal_id)
+
+
+@receiver(perfiles_actualizados)
+def perfiles_modificados(sender, usuarios, **kwargs):
+    registros = [registro_indice(usuario) for usuario in usuarios]
+    transaction.on_commit(lambda: indice.guardar_usuarios(registros))
+
+
+@receiver(post_delete, sender=Usuario)
+def usuario_eliminado(sender, instance, **kwargs):
+    ids = [instance.id]
+    transaction.on_commit(lambda: indice.quitar_usuarios(ids))
+
+
+@receiver(post_delete, sender=Prestamo)
+def prestamo_eliminado(sender, instance, **kwargs):
+    cartera.mover([instance], instance.estado, None)
+
+
+@receiver(post_save, sender=Facturador)
+@receiver(post_delete, sender=Facturador)
+def facturador_modificado(sender, **kwargs):
+    # recién al confirmar: antes, otro proceso podría recargar el catálogo viejo
+    transaction.on_commit(catalogo.invalidar)
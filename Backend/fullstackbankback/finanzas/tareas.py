@@ -0,0 +1,192 @@
+import logging
+import os
+import random
+import socket
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .exportacion import movimientos, como_csv, como_ndjson
+from .models import Prestamo, Tarea
+from .operaciones import CuentaInexistente, procesar_prestamos_lote, realizar_pagos_lote
+
+
+logger = logging.getLogger(__name__)
+
+MAX_INTENTOS = 5
+ESPERA_BASE = timedelta(seconds=5)
+ESPERA_MAXIMA = timedelta(minutes=10)
+# una tarea en proceso por más de esto se considera abandonada (el trabajador murió) y se vuelve a tomar
+BLOQUEO_MAXIMO = timedelta(minutes=10)
+
+MANEJADORES = {}
+
+
+class ErrorPermanente(Exception):
+    # la tarea falla sin reintentos: volver a ejecutarla daría el mismo resultado
+    pass
+
+
+class TareaReasignada(Exception):
+    # la tarea se dio por abandonada y la tomó otro trabajador mientras esta corría
+    pass
+
+
+def manejador(tipo):
+    def registrar(funcion):
+        MANEJADORES[tipo] = funcion
+        return funcion
+    return registrar
+
+
+def nombre_trabajador():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def encolar(tipo, parametros=None, usuario=None, max_intentos=MAX_INTENTOS):
+    if tipo not in MANEJADORES:
+        raise ValueError(f"Tipo de tarea desconocido: {tipo}")
+    return Tarea.objects.create(tipo=tipo, parametros=parametros or {}, usuario=usuario, max_intentos=max_intentos)
+
+
+def espera(intentos):
+    # backoff exponencial con jitter para que las tareas que fallaron juntas no reintenten juntas
+    segundos = min(ESPERA_MAXIMA.total_seconds(), ESPERA_BASE.total_seconds() * 2 ** max(intentos - 1, 0))
+    return timedelta(seconds=segundos * random.uniform(0.5, 1))
+
+
+def _disponibles(ahora):
+    return Tarea.objects.filter(
+        Q(estado='pendiente', disponible_desde__lte=ahora)
+        | Q(estado='en_proceso', tomada_en__lt=ahora - BLOQUEO_MAXIMO)
+    ).order_by('disponible_desde', 'id')
+
+
+def tomar_tareas(trabajador, cantidad=1):
+    """
+    Reserva hasta `cantidad` tareas para este trabajador. Varios procesos pueden llamarla
+    a la vez: nunca dos trabajadores toman la misma tarea.
+    """
+    ahora = timezone.now()
+    campos = {
+        'estado': 'en_proceso', 'tomada_por': trabajador, 'tomada_en': ahora,
+        'intentos': F('intentos') + 1, 'actualizada': ahora,
+    }
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(
+                _disponibles(ahora).select_for_update(skip_locked=True).values_list('id', flat=True)[:cantidad]
+            )
+            Tarea.objects.filter(id__in=ids).update(**campos)
+    else:
+        # sqlite no tiene SKIP LOCKED pero serializa las escrituras: cada tarea se toma con un
+        # UPDATE condicionado a que siga como la leímos, y si otro la tomó antes se pasa a la siguiente
+        ids = []
+        for tarea_id, estado, tomada_en in _disponibles(ahora).values_list('id', 'estado', 'tomada_en')[:cantidad * 4]:
+            if Tarea.objects.filter(id=tarea_id, estado=estado, tomada_en=tomada_en).update(**campos):
+                ids.append(tarea_id)
+                if len(ids) == cantidad:
+                    break
+    return list(Tarea.objects.filter(id__in=ids).order_by('id'))
+
+
+def ejecutar(tarea):
+    """
+    Corre la tarea y registra el resultado. El manejador y la marca de completada van en
+    la misma transacción: si el proceso muere en el medio, la tarea se reintenta sin
+    haber aplicado nada. Si mientras tanto otro trabajador la volvió a tomar, la marca no
+    encuentra la fila y la transacción se revierte entera, así que lo que hizo el
+    manejador no se aplica dos veces. Devuelve True si terminó bien.
+    """
+    propia = Tarea.objects.filter(id=tarea.id, tomada_por=tarea.tomada_por, tomada_en=tarea.tomada_en)
+    try:
+        funcion = MANEJADORES.get(tarea.tipo)
+        if funcion is None:
+            raise ErrorPermanente(f"Tipo de tarea desconocido: {tarea.tipo}")
+        with transaction.atomic():
+            resultado = funcion(tarea)
+            if not propia.update(estado='completada', resultado=resultado, error='', actualizada=timezone.now()):
+                raise TareaReasignada()
+        return True
+    except TareaReasignada:
+        # la tarea ya es del otro trabajador: no se toca su estado
+        logger.warning("Tarea %s (%s) descartada: la tomó otro trabajador", tarea.id, tarea.tipo)
+        return False
+    except Exception as e:
+        ahora = timezone.now()
+        campos = {'error': str(e) or type(e).__name__, 'actualizada': ahora}
+        if isinstance(e, ErrorPermanente) or tarea.intentos >= tarea.max_intentos:
+            campos['estado'] = 'fallida'
+            logger.warning("Tarea %s (%s) fallida: %s", tarea.id, tarea.tipo, e)
+        else:
+            campos.update(estado='pendiente', disponible_desde=ahora + espera(tarea.intentos))
+            logger.info("Tarea %s (%s) se reintentará: %s", tarea.id, tarea.tipo, e)
+        propia.update(**campos)
+        return False
+
+
+def procesar(trabajador, cantidad=10):
+    """
+    Toma y ejecuta un lote de tareas. Devuelve cuántas procesó.
+    """
+    tareas = tomar_tareas(trabajador, cantidad)
+    for tarea in tareas:
+        ejecutar(tarea)
+    return len(tareas)
+
+
+@manejador('aprobar_prestamo')
+def aprobar_prestamo(tarea):
+    prestamo = Prestamo.objects.filter(id=tarea.parametros['prestamo_id']).first()
+    if prestamo is None:
+        raise ErrorPermanente("Préstamo no encontrado")
+    try:
+        prestamo.aprobar()
+    except ValueError as e:
+        raise ErrorPermanente(str(e))
+    return {'prestamo': prestamo.id, 'estado': prestamo.estado}
+
+
+@manejador('prestamos_lote')
+def prestamos_lote(tarea):
+    ids = tarea.parametros['ids']
+    resultados = procesar_prestamos_lote(tarea.parametros['accion'], ids)
+    return [resultados.get(i, {'id': i, 'error': "Préstamo no encontrado"}) for i in dict.fromkeys(ids)]
+
+
+@manejador('pagos_lote')
+def pagos_lote(tarea):
+    filas = [dict(fila, monto=Decimal(fila['monto'])) for fila in tarea.parametros['filas']]
+    try:
+        resultados = realizar_pagos_lote(tarea.parametros['cuenta_id'], filas)
+    except CuentaInexistente as e:
+        raise ErrorPermanente(str(e))
+    # las filas que ya se rechazaron al validar la solicitud vuelven a sumarse al informe
+    resultados.update({error['fila']: error for error in tarea.parametros.get('errores', [])})
+    return [resultados[fila] for fila in sorted(resultados)]
+
+
+def ruta_extracto(tarea_id, formato):
+    return os.path.join(settings.EXTRACTOS_ROOT, f"extracto-{tarea_id}.{formato}")
+
+
+@manejador('generar_extracto')
+def generar_extracto(tarea):
+    parametros = tarea.parametros
+    desde = parse_datetime(parametros['desde']) if parametros.get('desde') else None
+    hasta = parse_datetime(parametros['hasta']) if parametros.get('hasta') else None
+    generador = como_ndjson if parametros['formato'] == 'ndjson' else como_csv
+
+    os.makedirs(settings.EXTRACTOS_ROOT, exist_ok=True)
+    ruta = ruta_extracto(tarea.id, parametros['formato'])
+    # se escribe a un temporal y se renombra: nunca queda un extracto a medias con el nombre final
+    with open(ruta + '.tmp', 'w', encoding='utf-8', newline='') as archivo:
+        for linea in generador(movimientos(parametros['usuario_id'], parametros['tipo'], desde, hasta)):
+            archivo.write(linea)
+    os.replace(ruta + '.tmp', ruta)
+    return {'archivo': os.path.basename(ruta), 'bytes': os.path.getsize(ruta)}
@@ -1,3 +1,1291 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+import random
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.cache.backends.db import DatabaseCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from sucursales.models import Sucursal
+from usuarios.models import Usuario
+from usuarios.perfiles import actualizar_perfiles
+from . import cartera
+from .amortizacion import SISTEMA_ALEMAN, SISTEMA_DIRECTO, SISTEMA_FRANCES, SISTEMAS, centavos, cronogramas, \
+    resumen_prestamo
+from .busqueda import IndiceClientes, indice
+from .cobranza import cobrar
+from .contabilidad import crear_snapshots, verificar_saldos
+from .debitos import MAXIMO_INTENTOS_FALLIDOS, procesar_vencidos
+from .destinos import ResolvedorDestinos, resolvedor
+from .facturadores import CatalogoFacturadores, catalogo
+from .importacion_clientes import importar_clientes, leer_csv
+from .models import Asiento, ClaveIdempotencia, Cuenta, DebitoAutomatico, Facturador, LoteCobro, Prestamo, ResumenCartera, SaldoSnapshot, \
+    Servicios, Tarea, Tarjeta, Transferencia
+from .numeracion import BINES, CUENTA_A, CUENTA_B, _clave, asignador, digito_luhn, es_luhn_valido, numeros_cuenta, \
+    numeros_tarjeta, permutar
+from .operaciones import realizar_pagos_lote, realizar_transferencia, realizar_transferencias_lote, \
+    SaldoInsuficiente
+from .paginacion import PaginacionTransferencias
+from .tareas import BLOQUEO_MAXIMO, ejecutar, encolar, tomar_tareas
+
+
+def crear_cuentas(cantidad, balance):
+    sucursal, _ = Sucursal.objects.get_or_create(id=1, defaults={'nombre': 'Central', 'direccion': 'Calle 1'})
+    cuentas = []
+    for i in range(cantidad):
+        usuario = Usuario.objects.create_user(username=f'cliente{i}', password='x', sucursal=sucursal)
+        cuentas.append(Cuenta.objects.create(usuario=usuario, tipo_cuenta='ahorro', balance_pesos=balance))
+    return cuentas
+
+
+def total_pesos():
+    # sumamos en Python: SUM() en sqlite opera en punto flotante
+    return sum(Cuenta.objects.values_list('balance_pesos', flat=True))
+
+
+class RealizarTransferenciaTests(TestCase):
+    def setUp(self):
+        self.origen, self.destino = crear_cuentas(2, Decimal('100.00'))
+
+    def test_mueve_el_monto_entre_cuentas(self):
+        transferencia = realizar_transferencia(self.origen.id, self.destino.id, '40.50', username_emisor='cliente0')
+
+        self.origen.refresh_from_db()
+        self.destino.refresh_from_db()
+        self.assertEqual(self.origen.balance_pesos, Decimal('59.50'))
+        self.assertEqual(self.destino.balance_pesos, Decimal('140.50'))
+        self.assertEqual(transferencia.monto, Decimal('40.50'))
+
+    def test_saldo_insuficiente_no_modifica_nada(self):
+        with self.assertRaises(SaldoInsuficiente):
+            realizar_transferencia(self.origen.id, self.destino.id, '100.01')
+
+        self.origen.refresh_from_db()
+        self.assertEqual(self.origen.balance_pesos, Decimal('100.00'))
+        self.assertFalse(Transferencia.objects.exists())
+
+    def test_rechaza_misma_cuenta(self):
+        with self.assertRaises(ValueError):
+            realizar_transferencia(self.origen.id, self.origen.id, '1')
+
+
+class TransferenciasLoteTests(TestCase):
+    def setUp(self):
+        self.origen, self.primero, self.segundo = crear_cuentas(3, Decimal('100.00'))
+
+    def fila(self, numero, destino, monto):
+        return {'fila': numero, 'cuenta_destino_id': destino.id, 'username_receptor': destino.usuario.username,
+                'monto': Decimal(monto), 'descripcion': None}
+
+    def test_acepta_en_orden_mientras_alcance_el_saldo(self):
+        resultados = realizar_transferencias_lote(self.origen.id, 'cliente0', [
+            self.fila(1, self.primero, '60'),
+            self.fila(2, self.segundo, '50'),
+            self.fila(3, self.segundo, '30'),
+            self.fila(4, self.primero, '10.01'),
+        ])
+
+        self.assertEqual(resultados[2], {'fila': 2, 'error': "Saldo insuficiente"})
+        self.assertEqual(resultados[4], {'fila': 4, 'error': "Saldo insuficiente"})
+        self.assertEqual(resultados[1]['monto'], Decimal('60'))
+        self.assertEqual(resultados[3]['monto'], Decimal('30'))
+        for cuenta, balance in ((self.origen, '10.00'), (self.primero, '160.00'), (self.segundo, '130.00')):
+            cuenta.refresh_from_db()
+            self.assertEqual(cuenta.balance_pesos, Decimal(balance))
+        self.assertEqual(
+            list(Transferencia.objects.order_by('id').values_list('id', 'monto')),
+            [(resultados[1]['id'], Decimal('60')), (resultados[3]['id'], Decimal('30'))],
+        )
+
+    def test_acumula_los_creditos_a_un_mismo_destino(self):
+        resultados = realizar_transferencias_lote(self.origen.id, 'cliente0', [
+            self.fila(1, self.primero, '20'), self.fila(2, self.primero, '25.50'),
+        ])
+
+        self.assertEqual({fila for fila, resultado in resultados.items() if 'id' in resultado}, {1, 2})
+        self.primero.refresh_from_db()
+        self.assertEqual(self.primero.balance_pesos, Decimal('145.50'))
+        self.assertEqual(total_pesos(), Decimal('300.00'))
+
+    def test_rechaza_destinos_que_ya_no_existen(self):
+        fila = self.fila(1, self.segundo, '10')
+        self.segundo.delete()
+
+        resultados = realizar_transferencias_lote(self.origen.id, 'cliente0', [fila, self.fila(2, self.primero, '10')])
+
+        self.assertEqual(resultados[1], {'fila': 1, 'error': "Destinatario no encontrado"})
+        self.assertIn('id', resultados[2])
+        self.origen.refresh_from_db()
+        self.assertEqual(self.origen.balance_pesos, Decimal('90.00'))
+
+    def test_sin_filas_aceptadas_no_escribe_nada(self):
+        resultados = realizar_transferencias_lote(self.origen.id, 'cliente0', [self.fila(1, self.primero, '100.01')])
+
+        self.assertEqual(resultados, {1: {'fila': 1, 'error': "Saldo insuficiente"}})
+        self.assertFalse(Transferencia.objects.exists())
+        self.assertEqual(total_pesos(), Decimal('300.00'))
+
+
+class TransferenciasConcurrentesTests(TransactionTestCase):
+    HILOS = 8
+    TRANSFERENCIAS_POR_HILO = 250
+    CUENTAS = 10
+
+    def test_el_total_se_conserva_bajo_concurrencia(self):
+        cuentas = [c.id for c in crear_cuentas(self.CUENTAS, Decimal('1000.00'))]
+        total_inicial = total_pesos()
+        errores = []
+        rechazadas = []
+
+        def trabajar(semilla):
+            azar = random.Random(semilla)
+            try:
+                for _ in range(self.TRANSFERENCIAS_POR_HILO):
+                    origen, destino = azar.sample(cuentas, 2)
+                    try:
+                        realizar_transferencia(origen, destino, Decimal(azar.randint(1, 30000)) / 100)
+                    except SaldoInsuficiente:
+                        rechazadas.append(origen)
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=trabajar, args=(i,)) for i in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        realizadas = Transferencia.objects.count()
+        self.assertEqual(realizadas + len(rechazadas), self.HILOS * self.TRANSFERENCIAS_POR_HILO)
+        self.assertEqual(total_pesos(), total_inicial)
+        self.assertFalse(Cuenta.objects.filter(balance_pesos__lt=0).exists())
+
+
+class ContabilidadTests(TestCase):
+    def setUp(self):
+        self.origen, self.destino = crear_cuentas(2, Decimal('100.00'))
+        # los saldos iniciales entran al libro mayor como snapshot, igual que en la importación de clientes
+        SaldoSnapshot.objects.bulk_create([
+            SaldoSnapshot(cuenta=cuenta, balance_pesos=cuenta.balance_pesos) for cuenta in (self.origen, self.destino)
+        ])
+
+    def test_registra_transferencias_pagos_y_prestamos(self):
+        realizar_transferencia(self.origen.id, self.destino.id, '30', username_emisor='cliente0')
+        realizar_pagos_lote(self.origen.id, [{'fila': 1, 'servicio': 'Luz', 'monto': Decimal('10')}])
+        prestamo = Prestamo.objects.create(cuenta=self.destino, monto_prestado=Decimal('50'), interes=Decimal('10'),
+                                           meses_duracion=2)
+        prestamo.aprobar()
+        prestamo.anular()
+
+        asientos = [
+            (asiento.tipo, sorted((m.cuenta_id or 0, m.contrapartida, m.monto) for m in asiento.movimientos.all()))
+            for asiento in Asiento.objects.order_by('id').prefetch_related('movimientos')
+        ]
+        self.assertEqual(asientos, [
+            ('transferencia', [(self.origen.id, '', Decimal('-30')), (self.destino.id, '', Decimal('30'))]),
+            ('pago', [(0, 'servicios', Decimal('10')), (self.origen.id, '', Decimal('-10'))]),
+            ('prestamo', [(0, 'prestamos', Decimal('-50')), (self.destino.id, '', Decimal('50'))]),
+            ('prestamo', [(0, 'prestamos', Decimal('50')), (self.destino.id, '', Decimal('-50'))]),
+        ])
+        self.assertEqual(verificar_saldos(), [])
+
+    def test_el_snapshot_incluye_el_ultimo_movimiento_y_no_deja_diferencias(self):
+        realizar_transferencia(self.origen.id, self.destino.id, '30')
+        self.assertEqual(crear_snapshots(), 2)
+        snapshot = SaldoSnapshot.objects.filter(cuenta=self.origen).latest('id')
+        # sin margen de tiempo: el movimiento recién confirmado ya entra en el snapshot
+        self.assertEqual(snapshot.ultimo_movimiento_id, self.destino.movimientos.get().id)
+        self.assertEqual(snapshot.balance_pesos, Decimal('70'))
+        realizar_transferencia(self.destino.id, self.origen.id, '5')
+        self.assertEqual(verificar_saldos(), [])
+        salida = io.StringIO()
+        call_command('verificar_saldos', stdout=salida)
+        self.assertIn('coinciden', salida.getvalue())
+
+    def test_informa_los_saldos_modificados_a_mano(self):
+        call_command('snapshot_saldos', stdout=io.StringIO())
+        Cuenta.objects.filter(id=self.origen.id).update(balance_pesos=F('balance_pesos') + 1)
+        self.assertEqual(verificar_saldos(), [
+            (self.origen.id, {'pesos': Decimal('101'), 'dolares': Decimal('0')},
+             {'pesos': Decimal('100'), 'dolares': Decimal('0')}),
+        ])
+        with self.assertRaises(CommandError):
+            call_command('verificar_saldos', stdout=io.StringIO())
+
+
+class NumeracionTests(TestCase):
+    def test_digito_luhn(self):
+        self.assertEqual(digito_luhn('7992739871'), '3')
+        self.assertEqual(digito_luhn('411111111111111'), '1')
+        self.assertTrue(es_luhn_valido('4111111111111111'))
+        self.assertFalse(es_luhn_valido('4111111111111112'))
+
+    def test_la_permutacion_no_repite_valores(self):
+        clave = _clave('prueba')
+        for a, b in ((37, 41), (100, 7), (CUENTA_A // 100, CUENTA_B // 100)):
+            with self.subTest(a=a, b=b):
+                self.assertEqual(sorted(permutar(valor, a, b, clave) for valor in range(a * b)), list(range(a * b)))
+
+    def test_numeros_emitidos_unicos_y_validos(self):
+        cuentas = numeros_cuenta(2000)
+        tarjetas = numeros_tarjeta('mastercard', 2000)
+
+        self.assertEqual(len(set(cuentas)), 2000)
+        self.assertEqual(len(set(tarjetas)), 2000)
+        self.assertTrue(all(len(numero) == 9 and numero[3] == '-' for numero in cuentas))
+        self.assertTrue(all(numero.startswith(BINES['mastercard']) and len(numero) == 16 and es_luhn_valido(numero)
+                            for numero in tarjetas))
+
+    def test_rotar_secret_key_no_cambia_la_secuencia(self):
+        clave = _clave('cuenta')
+        with override_settings(SECRET_KEY='otra-clave'):
+            self.assertEqual(_clave('cuenta'), clave)
+        with override_settings(NUMERACION_CLAVE='otra-clave'):
+            self.assertNotEqual(_clave('cuenta'), clave)
+
+
+class AmortizacionTests(TestCase):
+    def cronograma(self, monto, tasa, meses, sistema):
+        resultado = cronogramas([monto], [tasa], [meses], [sistema])
+        return {concepto: [centavos(valor) for valor in resultado[concepto][0, :meses]]
+                for concepto in ('capital', 'interes', 'cuota', 'saldo')}
+
+    def test_el_capital_suma_el_monto_y_el_saldo_cierra_en_cero(self):
+        for sistema in SISTEMAS:
+            for monto, tasa, meses in ((100000, 60, 12), (1000.01, 37.5, 7), (99.99, 0, 3), (5000, 12, 1)):
+                with self.subTest(sistema=sistema, monto=monto, tasa=tasa, meses=meses):
+                    cronograma = self.cronograma(monto, tasa, meses, sistema)
+                    self.assertEqual(sum(cronograma['capital']), centavos(monto))
+                    self.assertEqual(cronograma['saldo'][-1], Decimal('0.00'))
+                    self.assertEqual([c + i for c, i in zip(cronograma['capital'], cronograma['interes'])],
+                                     cronograma['cuota'])
+
+    def test_frances_cuota_constante(self):
+        cronograma = self.cronograma(100000, 60, 12, SISTEMA_FRANCES)
+
+        # 5 % mensual sobre todo el capital en la primera cuota
+        self.assertEqual(cronograma['interes'][0], Decimal('5000.00'))
+        # capital e interés se redondean por separado: la cuota puede moverse un centavo
+        for cuota in cronograma['cuota']:
+            self.assertLessEqual(abs(cuota - Decimal('11282.54')), Decimal('0.01'))
+        self.assertEqual(cronograma['capital'], sorted(cronograma['capital']))
+
+    def test_frances_sin_interes(self):
+        cronograma = self.cronograma(99.99, 0, 3, SISTEMA_FRANCES)
+        self.assertEqual(cronograma['cuota'], [Decimal('33.33')] * 3)
+        self.assertEqual(set(cronograma['interes']), {Decimal('0.00')})
+
+    def test_aleman_capital_constante(self):
+        cronograma = self.cronograma(1000, 12, 3, SISTEMA_ALEMAN)
+
+        self.assertEqual(cronograma['capital'], [Decimal('333.33'), Decimal('333.33'), Decimal('333.34')])
+        self.assertEqual(cronograma['interes'], [Decimal('10.00'), Decimal('6.67'), Decimal('3.33')])
+        self.assertEqual(cronograma['saldo'], [Decimal('666.67'), Decimal('333.34'), Decimal('0.00')])
+
+    def test_directo_reparte_el_recargo_en_partes_iguales(self):
+        cronograma = self.cronograma(100, 10, 3, SISTEMA_DIRECTO)
+
+        self.assertEqual(cronograma['capital'], [Decimal('33.33'), Decimal('33.33'), Decimal('33.34')])
+        self.assertEqual(cronograma['interes'], [Decimal('3.33'), Decimal('3.33'), Decimal('3.34')])
+        self.assertEqual(sum(cronograma['cuota']), Decimal('110.00'))
+        self.assertEqual(resumen_prestamo(Decimal('100'), Decimal('10'), 3, SISTEMA_DIRECTO),
+                         (Decimal('110.00'), Decimal('36.66')))
+
+    def test_plazos_distintos_en_un_mismo_calculo(self):
+        resultado = cronogramas([1200, 600], [24, 24], [12, 3], [SISTEMA_FRANCES, SISTEMA_ALEMAN])
+
+        self.assertEqual(resultado['cuota'].shape, (2, 12))
+        self.assertEqual(resultado['activa'][1].sum(), 3)
+        self.assertFalse(resultado['cuota'][1, 3:].any())
+        self.assertEqual(centavos(resultado['capital'][1].sum()), Decimal('600.00'))
+        self.assertEqual(centavos(resultado['cuota'][0, 0]), self.cronograma(1200, 24, 12, SISTEMA_FRANCES)['cuota'][0])
+
+
+class ModificarPrestamoTests(TestCase):
+    def setUp(self):
+        self.cuenta, = crear_cuentas(1, Decimal('0'))
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.cuenta.usuario)
+        respuesta = self.cliente.post('/api/finanzas/prestamos/', {
+            'cuenta': self.cuenta.id, 'monto_prestado': '1000', 'interes': '12', 'meses_duracion': 6,
+            'sistema': 'frances',
+        }, format='json')
+        self.prestamo = Prestamo.objects.get(id=respuesta.data['id'])
+        # solo el personal modifica préstamos
+        self.empleado = APIClient()
+        self.empleado.force_authenticate(
+            Usuario.objects.create_user(username='empleado', password='x', es_empleado=True, sucursal_id=1)
+        )
+
+    def modificar(self, **datos):
+        return self.empleado.patch(f'/api/finanzas/prestamos/{self.prestamo.id}/', datos, format='json')
+
+    def test_un_pendiente_rearma_el_cronograma(self):
+        self.assertEqual(self.modificar(monto_prestado='2400', meses_duracion=12).status_code, 200)
+        self.prestamo.refresh_from_db()
+        self.assertEqual((self.prestamo.pago_total, self.prestamo.cuota_mensual),
+                         resumen_prestamo(Decimal('2400'), Decimal('12'), 12, 'frances'))
+        cuotas = list(self.prestamo.cuotas.order_by('numero'))
+        self.assertEqual([cuota.numero for cuota in cuotas], list(range(1, 13)))
+        self.assertEqual(sum(cuota.capital for cuota in cuotas), Decimal('2400'))
+        self.assertEqual(self.prestamo.cuotas.filter(cuota=self.prestamo.cuota_mensual).count(), 11)
+
+    def test_un_aprobado_no_cambia_sus_condiciones(self):
+        self.prestamo.aprobar()
+        antes = list(self.prestamo.cuotas.values_list('cuota', flat=True))
+        self.assertEqual(self.modificar(interes='50').status_code, 400)
+        self.prestamo.refresh_from_db()
+        self.assertEqual(self.prestamo.interes, Decimal('12'))
+        self.assertEqual(list(self.prestamo.cuotas.values_list('cuota', flat=True)), antes)
+
+
+class IdempotenciaTests(TestCase):
+    RUTA = '/api/finanzas/transferencias/'
+
+    def setUp(self):
+        self.origen, self.destino = crear_cuentas(2, Decimal('100.00'))
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.origen.usuario)
+
+    def transferir(self, monto='10', clave='clave-1'):
+        return self.cliente.post(self.RUTA, {'destinatario': 'cliente1', 'monto': monto}, format='json',
+                                 HTTP_IDEMPOTENCY_KEY=clave)
+
+    def test_el_reintento_recibe_la_respuesta_guardada(self):
+        primera = self.transferir()
+        segunda = self.transferir()
+
+        self.assertEqual(primera.status_code, 201)
+        self.assertEqual(segunda.status_code, 201)
+        self.assertEqual(segunda.json(), primera.json())
+        self.assertEqual(segunda['Idempotent-Replayed'], 'true')
+        self.assertFalse(primera.has_header('Idempotent-Replayed'))
+        self.assertEqual(Transferencia.objects.count(), 1)
+        self.origen.refresh_from_db()
+        self.assertEqual(self.origen.balance_pesos, Decimal('90.00'))
+
+    def test_la_misma_clave_con_otro_cuerpo_da_422(self):
+        self.transferir('10')
+        respuesta = self.transferir('20')
+
+        self.assertEqual(respuesta.status_code, 422)
+        self.assertEqual(Transferencia.objects.count(), 1)
+
+    def test_un_error_del_servidor_libera_la_clave(self):
+        with mock.patch('finanzas.views.realizar_transferencia', side_effect=RuntimeError("caída")):
+            self.assertEqual(self.transferir().status_code, 500)
+        self.assertFalse(ClaveIdempotencia.objects.exists())
+
+        respuesta = self.transferir()
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertFalse(respuesta.has_header('Idempotent-Replayed'))
+        self.assertEqual(Transferencia.objects.count(), 1)
+
+
+class IdempotenciaConcurrenteTests(TransactionTestCase):
+    def test_el_reintento_concurrente_espera_a_la_primera_solicitud(self):
+        origen, _ = crear_cuentas(2, Decimal('100.00'))
+        en_curso = threading.Event()
+        seguir = threading.Event()
+        respuestas = {}
+
+        def transferir_lento(*args, **kwargs):
+            en_curso.set()
+            seguir.wait(5)
+            return realizar_transferencia(*args, **kwargs)
+
+        def solicitar(nombre):
+            cliente = APIClient()
+            cliente.force_authenticate(origen.usuario)
+            try:
+                respuestas[nombre] = cliente.post(IdempotenciaTests.RUTA, {'destinatario': 'cliente1', 'monto': '10'},
+                                                  format='json', HTTP_IDEMPOTENCY_KEY='clave-1')
+            finally:
+                connection.close()
+
+        with mock.patch('finanzas.views.realizar_transferencia', side_effect=transferir_lento):
+            primera = threading.Thread(target=solicitar, args=('primera',))
+            primera.start()
+            self.assertTrue(en_curso.wait(5))
+            reintento = threading.Thread(target=solicitar, args=('reintento',))
+            reintento.start()
+            # el reintento queda esperando mientras la primera sigue en curso
+            reintento.join(0.3)
+            self.assertTrue(reintento.is_alive())
+            seguir.set()
+            primera.join()
+            reintento.join()
+
+        self.assertEqual(respuestas['primera'].status_code, 201)
+        self.assertEqual(respuestas['reintento'].status_code, 201)
+        self.assertEqual(respuestas['reintento']['Idempotent-Replayed'], 'true')
+        self.assertEqual(respuestas['reintento'].json(), respuestas['primera'].json())
+        self.assertEqual(Transferencia.objects.count(), 1)
+
+
+class PaginacionKeysetTests(TestCase):
+    def setUp(self):
+        self.origen, self.destino, ajena = crear_cuentas(3, Decimal('100.00'))
+        for i in range(7):
+            realizar_transferencia(self.origen.id, self.destino.id, i + 1)
+        realizar_transferencia(ajena.id, self.destino.id, 1)
+        # varias con la misma fecha: el id desempata
+        ids = list(Transferencia.objects.order_by('id').values_list('id', flat=True))
+        Transferencia.objects.filter(id__in=ids[2:6]).update(fecha=timezone.now())
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.origen.usuario)
+
+    def test_recorre_todas_las_paginas_sin_repetir_ni_saltear(self):
+        vistos = []
+        url = '/api/finanzas/transferencias/?limite=3'
+        while url:
+            respuesta = self.cliente.get(url)
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertLessEqual(len(respuesta.data['results']), 3)
+            vistos += [transferencia['id'] for transferencia in respuesta.data['results']]
+            url = respuesta.data['next']
+        esperados = Transferencia.objects.filter(cuenta_origen=self.origen).order_by('-fecha', '-id')
+        self.assertEqual(vistos, list(esperados.values_list('id', flat=True)))
+
+    def test_cursor_invalido(self):
+        for cursor in ('no-es-un-cursor', 'bWFs'):
+            respuesta = self.cliente.get('/api/finanzas/transferencias/', {'cursor': cursor})
+            self.assertEqual(respuesta.status_code, 400)
+
+    def test_limita_el_tamano_de_pagina(self):
+        with mock.patch.object(PaginacionTransferencias, 'max_page_size', 2):
+            respuesta = self.cliente.get('/api/finanzas/transferencias/', {'limite': 100})
+        self.assertEqual(len(respuesta.data['results']), 2)
+        self.assertIsNotNone(respuesta.data['next'])
+        respuesta = self.cliente.get('/api/finanzas/transferencias/', {'limite': 'muchos'})
+        self.assertEqual(len(respuesta.data['results']), 7)
+        self.assertIsNone(respuesta.data['next'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+                                       'LOCATION': 'cache_compartida'}})
+class CacheCompartidaTests(TestCase):
+    def setUp(self):
+        call_command('createcachetable', verbosity=0)
+
+    def test_otro_proceso_ve_lo_que_se_invalida_en_este(self):
+        # la caché en base (CACHE_EN_BASE): cada instancia del backend hace de la caché de un worker
+        este, otro_proceso = DatabaseCache('cache_compartida', {}), DatabaseCache('cache_compartida', {})
+        este.set('resumen:1', {'saldo': 1})
+        self.assertEqual(otro_proceso.get('resumen:1'), {'saldo': 1})
+
+        otro_proceso.delete('resumen:1')
+        self.assertIsNone(este.get('resumen:1'))
+
+
+class ResumenFinancieroTests(TestCase):
+    def setUp(self):
+        self.cuenta, self.otra = crear_cuentas(2, Decimal('100.00'))
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.cuenta.usuario)
+        cache.clear()
+
+    def resumen(self):
+        return self.cliente.get('/api/finanzas/resumen/').data
+
+    def test_se_invalida_con_transferencias_pagos_y_prestamos(self):
+        self.assertEqual(self.resumen()['balances_totales']['pesos'], Decimal('100'))
+        # un cambio que no pasa por las operaciones no se ve: el resumen sale de la caché
+        Cuenta.objects.filter(id=self.cuenta.id).update(balance_pesos=F('balance_pesos') + 1)
+        self.assertEqual(self.resumen()['balances_totales']['pesos'], Decimal('100'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            realizar_transferencia(self.cuenta.id, self.otra.id, '11')
+        resumen = self.resumen()
+        self.assertEqual(resumen['balances_totales']['pesos'], Decimal('90'))
+        self.assertEqual(len(resumen['transferencias_recientes']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            realizar_pagos_lote(self.cuenta.id, [{'fila': 1, 'servicio': 'Luz', 'monto': Decimal('10')}])
+        resumen = self.resumen()
+        self.assertEqual(resumen['balances_totales']['pesos'], Decimal('80'))
+        self.assertEqual(len(resumen['pagos_recientes']), 1)
+
+        prestamo = Prestamo.objects.create(cuenta=self.cuenta, monto_prestado=Decimal('50'), interes=Decimal('10'),
+                                           meses_duracion=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            prestamo.aprobar()
+        resumen = self.resumen()
+        self.assertEqual(resumen['balances_totales']['pesos'], Decimal('130'))
+        self.assertEqual(resumen['prestamos']['cantidad_activos'], 1)
+
+
+class ConsultasConstantesTests(TestCase):
+    """
+    Fija la cantidad de consultas SQL de cada endpoint de finanzas. Cada endpoint se
+    mide con pocos datos y de nuevo con diez veces más: las dos mediciones tienen que
+    dar exactamente el número esperado, así un N+1 nuevo rompe el test. Se mide con la
+    caché configurada (en memoria, o Redis), que no suma consultas.
+    """
+
+    # (nombre, cliente, metodo, ruta, cuerpo, consultas)
+    ENDPOINTS = [
+        ('cuentas', 'cliente', 'get', '/api/finanzas/cuentas/', None, 1),
+        ('cuenta', 'cliente', 'get', '/api/finanzas/cuentas/{cuenta}/', None, 1),
+        ('tarjetas', 'cliente', 'get', '/api/finanzas/tarjetas/', None, 1),
+        ('tarjeta', 'cliente', 'get', '/api/finanzas/tarjetas/{tarjeta}/', None, 1),
+        ('tarjetas_por_usuario', 'empleado', 'get', '/api/finanzas/tarjetas/buscar_por_usuario/?usuario_id={usuario}',
+         None, 1),
+        ('transferencias', 'cliente', 'get', '/api/finanzas/transferencias/', None, 1),
+        ('transferir', 'cliente', 'post', '/api/finanzas/transferencias/', {'destinatario': 'otro', 'monto': '1'}, 10),
+        ('pagos', 'cliente', 'get', '/api/finanzas/pagos/', None, 1),
+        ('pagar', 'cliente', 'post', '/api/finanzas/pagos/', {'cuenta': '{cuenta}', 'servicio': 'Luz', 'monto': '1'}, 8),
+        ('prestamos_cliente', 'cliente', 'get', '/api/finanzas/prestamos/', None, 1),
+        ('prestamo_cliente', 'cliente', 'get', '/api/finanzas/prestamos/{pendiente}/', None, 1),
+        ('cronograma', 'cliente', 'get', '/api/finanzas/prestamos/{pendiente}/cronograma/', None, 2),
+        ('solicitar_prestamo', 'cliente', 'post', '/api/finanzas/prestamos/',
+         {'cuenta': '{cuenta}', 'monto_prestado': '100', 'interes': '10', 'meses_duracion': '3'}, 7),
+        ('prestamos_empleado', 'empleado', 'get', '/api/finanzas/prestamos/', None, 1),
+        ('prestamo_empleado', 'empleado', 'get', '/api/finanzas/prestamos/{pendiente}/', None, 1),
+        ('activos', 'empleado', 'get', '/api/finanzas/prestamos/activos/', None, 1),
+        ('pendientes', 'empleado', 'get', '/api/finanzas/prestamos/pendientes/', None, 1),
+        ('pendientes_cantidad', 'empleado', 'get', '/api/finanzas/prestamos/pendientes/?count_only=1', None, 1),
+        ('pendientes_resumen', 'empleado', 'get', '/api/finanzas/prestamos/pendientes/?summary=1', None, 2),
+        ('pendientes_nuevos', 'empleado', 'get', '/api/finanzas/prestamos/pendientes/?since={pendiente}', None, 1),
+        ('activos_cambios', 'empleado', 'get', '/api/finanzas/prestamos/activos/?since=2000-01-01T00:00:00', None, 1),
+        ('cartera', 'empleado', 'get', '/api/finanzas/prestamos/cartera/', None, 1),
+        ('aprobar', 'empleado', 'post', '/api/finanzas/prestamos/{pendiente}/aprobar/', None, 10),
+        ('rechazar', 'empleado', 'post', '/api/finanzas/prestamos/{otro_pendiente}/rechazar/', None, 7),
+        ('anular', 'empleado', 'post', '/api/finanzas/prestamos/{aprobado}/anular/', None, 10),
+        ('resumen', 'cliente', 'get', '/api/finanzas/resumen/', None, 4),
+        ('exportar', 'cliente', 'get', '/api/finanzas/movimientos/exportar/', None, 3),
+        ('tareas', 'cliente', 'get', '/api/finanzas/tareas/', None, 1),
+        ('debitos', 'cliente', 'get', '/api/finanzas/debitos/', None, 1),
+        ('facturadores', 'cliente', 'get', '/api/finanzas/facturadores/', None, 0),
+        ('buscar_clientes', 'empleado', 'get', '/api/finanzas/clientes/buscar/?q=cliente', None, 1),
+        ('detalle_usuario', 'cliente', 'get', '/api/usuarios/detalle/', None, 1),
+        ('usuario', 'cliente', 'get', '/api/usuarios/usuario/', None, 1),
+    ]
+
+    def setUp(self):
+        self.cuenta, self.otra = crear_cuentas(2, Decimal('1000000'))
+        Usuario.objects.filter(id=self.otra.usuario_id).update(username='otro')
+        empleado = Usuario.objects.create_user(username='empleado', password='x', es_empleado=True)
+        self.clientes = {'cliente': APIClient(), 'empleado': APIClient()}
+        self.clientes['cliente'].force_authenticate(self.cuenta.usuario)
+        self.clientes['empleado'].force_authenticate(empleado)
+
+    def poblar(self, cantidad):
+        for _ in range(cantidad):
+            Transferencia.objects.create(cuenta_origen=self.cuenta, cuenta_destino=self.otra, monto=1)
+            Transferencia.objects.create(cuenta_origen=self.otra, cuenta_destino=self.cuenta, monto=1)
+            Servicios.objects.create(cuenta=self.cuenta, servicio='Luz', monto=1)
+            Tarjeta.objects.create(cuenta=self.cuenta, tipo_tarjeta='debito', proveedor='visa')
+            Tarea.objects.create(tipo='aprobar_prestamo', usuario=self.cuenta.usuario)
+            DebitoAutomatico.objects.create(
+                cuenta=self.cuenta, servicio='Luz', monto=1, proximo_vencimiento=datetime.date.today(),
+            )
+            # préstamos en todos los estados, para que el resumen de cartera ya tenga sus filas
+            for estado in ('pendiente', 'pendiente', 'aprobado', 'rechazado', 'anulado'):
+                prestamo = Prestamo.objects.create(
+                    cuenta=self.cuenta, monto_prestado=Decimal('100'), interes=Decimal('10'), meses_duracion=3,
+                )
+                if estado in ('aprobado', 'anulado'):
+                    prestamo.aprobar()
+                if estado == 'anulado':
+                    prestamo.anular()
+                if estado == 'rechazado':
+                    prestamo.rechazar()
+
+    def valores(self):
+        pendientes = Prestamo.objects.filter(cuenta=self.cuenta, estado='pendiente').values_list('id', flat=True)
+        return {
+            'cuenta': self.cuenta.id,
+            'usuario': self.cuenta.usuario_id,
+            'tarjeta': Tarjeta.objects.filter(cuenta=self.cuenta).values_list('id', flat=True).first(),
+            'pendiente': pendientes[0],
+            'otro_pendiente': pendientes[1],
+            'aprobado': Prestamo.objects.filter(cuenta=self.cuenta, estado='aprobado').values_list('id', flat=True).first(),
+        }
+
+    def medir(self, valores):
+        for nombre, cliente, metodo, ruta, cuerpo, consultas in self.ENDPOINTS:
+            # sin cachés calientes: se mide el peor caso de cada solicitud
+            cache.clear()
+            resolvedor.limpiar()
+            # el catálogo de facturadores es del proceso y se carga una sola vez, no por solicitud
+            catalogo.cargar()
+            # lo mismo el índice de búsqueda de clientes: se rearma con los datos de esta medición
+            indice.limpiar()
+            indice.cargar()
+            ruta = ruta.format(**valores)
+            if cuerpo is not None:
+                cuerpo = {clave: valor.format(**valores) for clave, valor in cuerpo.items()}
+            with self.subTest(endpoint=nombre), self.assertNumQueries(consultas):
+                respuesta = getattr(self.clientes[cliente], metodo)(ruta, cuerpo, format='json')
+                if respuesta.streaming:
+                    b''.join(respuesta.streaming_content)
+                self.assertLess(respuesta.status_code, 300, getattr(respuesta, 'data', None))
+
+    def test_consultas_no_dependen_de_la_cantidad_de_datos(self):
+        self.poblar(1)
+        self.medir(self.valores())
+        self.poblar(9)
+        self.medir(self.valores())
+
+
+class TareasTests(TestCase):
+    def test_una_tarea_retomada_no_debita_dos_veces(self):
+        cuenta, = crear_cuentas(1, Decimal('100'))
+        encolar('pagos_lote', {'cuenta_id': cuenta.id, 'filas': [{'fila': 0, 'servicio': 'Luz', 'monto': '30'}]})
+
+        # el primer trabajador la tomó hace más que BLOQUEO_MAXIMO y se colgó
+        colgada, = tomar_tareas('trabajador-a')
+        colgada.tomada_en -= BLOQUEO_MAXIMO + datetime.timedelta(minutes=1)
+        Tarea.objects.filter(id=colgada.id).update(tomada_en=colgada.tomada_en)
+        retomada, = tomar_tareas('trabajador-b')
+
+        self.assertTrue(ejecutar(retomada))
+        # el primero se despierta y termina: su pago se revierte
+        self.assertFalse(ejecutar(colgada))
+
+        cuenta.refresh_from_db()
+        self.assertEqual(cuenta.balance_pesos, Decimal('70'))
+        self.assertEqual(Servicios.objects.count(), 1)
+        tarea = Tarea.objects.get()
+        self.assertEqual((tarea.estado, tarea.tomada_por), ('completada', 'trabajador-b'))
+
+
+class CobranzaTests(TestCase):
+    def setUp(self):
+        self.cuenta, self.otra = crear_cuentas(2, Decimal('0'))
+        # sistema directo sin interés: tres cuotas de 100
+        self.prestamo = Prestamo.objects.create(cuenta=self.cuenta, monto_prestado=Decimal('300'), interes=Decimal('0'),
+                                                meses_duracion=3, sistema=SISTEMA_DIRECTO)
+        self.prestamo.aprobar()
+        # el cliente gastó parte de lo acreditado: alcanza para una cuota y media
+        Cuenta.objects.filter(id=self.cuenta.id).update(balance_pesos=Decimal('150'))
+        Prestamo.objects.create(cuenta=self.otra, monto_prestado=Decimal('300'), interes=Decimal('0'), meses_duracion=3,
+                                sistema=SISTEMA_DIRECTO)
+        Cuenta.objects.filter(id=self.otra.id).update(balance_pesos=Decimal('1000'))
+        self.segunda_cuota = self.prestamo.cuotas.get(numero=2).fecha_vencimiento
+
+    def test_cobra_las_mas_viejas_mientras_alcance_el_saldo(self):
+        resultado = cobrar(self.segunda_cuota)
+
+        self.assertEqual((resultado['cuotas_cobradas'], resultado['cuotas_sin_saldo']), (1, 1))
+        self.assertEqual(resultado['monto_cobrado'], Decimal('100.00'))
+        self.assertEqual(list(self.prestamo.cuotas.values_list('numero', 'estado')),
+                         [(1, 'pagada'), (2, 'pendiente'), (3, 'pendiente')])
+        self.cuenta.refresh_from_db()
+        self.otra.refresh_from_db()
+        self.assertEqual(self.cuenta.balance_pesos, Decimal('50'))
+        # el préstamo de la otra cuenta no está aprobado: no se le cobra nada
+        self.assertEqual(self.otra.balance_pesos, Decimal('1000'))
+
+    def test_volver_a_correr_la_misma_fecha_no_cobra_dos_veces(self):
+        cobrar(self.segunda_cuota)
+        Cuenta.objects.filter(id=self.cuenta.id).update(balance_pesos=Decimal('500'))
+
+        resultado = cobrar(self.segunda_cuota)
+
+        self.assertEqual(resultado['lotes'], 0)
+        self.cuenta.refresh_from_db()
+        self.assertEqual(self.cuenta.balance_pesos, Decimal('500'))
+        # al día siguiente se reintenta la que quedó sin saldo
+        cobrar(self.segunda_cuota + datetime.timedelta(days=1))
+        self.assertEqual(self.prestamo.cuotas.filter(estado='pagada').count(), 2)
+
+    def test_reparte_las_cuentas_en_lotes(self):
+        otro = Prestamo.objects.create(cuenta=self.otra, monto_prestado=Decimal('300'), interes=Decimal('0'),
+                                       meses_duracion=3, sistema=SISTEMA_DIRECTO)
+        otro.aprobar()
+
+        resultado = cobrar(self.segunda_cuota, tamano_lote=1)
+
+        self.assertEqual(resultado['lotes'], 2)
+        self.assertEqual(resultado['cuotas_cobradas'], 3)
+        self.assertEqual(LoteCobro.objects.filter(completado=True).count(), 2)
+
+    def test_el_comando_rechaza_fechas_invalidas(self):
+        for fecha in ('2024-02-30', '30/01/2024'):
+            with self.subTest(fecha=fecha), self.assertRaises(CommandError):
+                call_command('cobrar_cuotas', '--fecha', fecha, stdout=io.StringIO())
+        self.assertFalse(LoteCobro.objects.exists())
+
+
+class DebitosAutomaticosTests(TestCase):
+    def setUp(self):
+        self.cuenta, = crear_cuentas(1, Decimal('150'))
+        self.hoy = datetime.date(2024, 5, 10)
+
+    def debito(self, monto, vencimiento, **campos):
+        return DebitoAutomatico.objects.create(cuenta=self.cuenta, servicio='Luz', monto=Decimal(monto),
+                                               proximo_vencimiento=vencimiento, **campos)
+
+    def test_cobra_en_orden_mientras_alcance_el_saldo(self):
+        primero = self.debito('100', self.hoy)
+        segundo = self.debito('80', self.hoy - datetime.timedelta(days=3))
+        futuro = self.debito('10', self.hoy + datetime.timedelta(days=1))
+
+        resultado = procesar_vencidos(self.hoy)
+
+        self.assertEqual((resultado['pagados'], resultado['fallidos']), (1, 1))
+        for debito in (primero, segundo, futuro):
+            debito.refresh_from_db()
+        self.assertEqual((primero.ultimo_estado, primero.ultimo_cobro, primero.proximo_vencimiento),
+                         ('pagado', self.hoy, datetime.date(2024, 6, 10)))
+        self.assertEqual((segundo.ultimo_estado, segundo.intentos_fallidos), ('saldo_insuficiente', 1))
+        self.assertEqual(segundo.proximo_vencimiento, self.hoy - datetime.timedelta(days=3))
+        self.assertEqual(futuro.ultimo_estado, '')
+        self.cuenta.refresh_from_db()
+        self.assertEqual(self.cuenta.balance_pesos, Decimal('50'))
+        self.assertEqual(list(Servicios.objects.values_list('monto', 'estado')), [(Decimal('100'), 'pagado')])
+
+    def test_volver_a_correr_no_cobra_dos_veces(self):
+        debito = self.debito('100', self.hoy)
+        procesar_vencidos(self.hoy)
+        resultado = procesar_vencidos(self.hoy)
+
+        self.assertEqual((resultado['pagados'], resultado['fallidos']), (0, 0))
+        debito.refresh_from_db()
+        self.assertEqual(debito.proximo_vencimiento, datetime.date(2024, 6, 10))
+        self.assertEqual(Servicios.objects.count(), 1)
+
+    def test_periodos_atrasados_se_cobran_una_sola_vez(self):
+        debito = self.debito('10', datetime.date(2024, 1, 31))
+
+        procesar_vencidos(self.hoy)
+
+        debito.refresh_from_db()
+        self.assertEqual(debito.proximo_vencimiento, datetime.date(2024, 5, 29))
+        self.assertEqual(Servicios.objects.count(), 1)
+
+    def test_despues_de_los_intentos_fallidos_pasa_al_proximo_periodo(self):
+        debito = self.debito('1000', self.hoy, frecuencia='semanal', intentos_fallidos=MAXIMO_INTENTOS_FALLIDOS - 1)
+
+        procesar_vencidos(self.hoy)
+
+        debito.refresh_from_db()
+        self.assertEqual((debito.ultimo_estado, debito.intentos_fallidos), ('impago', 0))
+        self.assertEqual(debito.proximo_vencimiento, self.hoy + datetime.timedelta(weeks=1))
+        self.cuenta.refresh_from_db()
+        self.assertEqual(self.cuenta.balance_pesos, Decimal('150'))
+
+    def test_el_comando_rechaza_fechas_invalidas(self):
+        self.debito('100', self.hoy)
+        for fecha in ('2024-02-30', '30/01/2024'):
+            with self.subTest(fecha=fecha), self.assertRaises(CommandError):
+                call_command('procesar_debitos', '--fecha', fecha, stdout=io.StringIO())
+        self.assertFalse(Servicios.objects.exists())
+
+
+class CatalogoFacturadoresTests(TestCase):
+    def test_modificar_un_facturador_recarga_el_catalogo_en_todos_los_procesos(self):
+        otro_proceso = CatalogoFacturadores()
+        self.assertIsNone(catalogo.buscar('Gimnasio'))
+        self.assertIsNone(otro_proceso.buscar('Gimnasio'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            gimnasio = Facturador.objects.create(codigo='GIMNASIO', nombre='Gimnasio')
+        self.assertEqual(catalogo.buscar('gimnasio'), gimnasio)
+        # el otro proceso se entera por la versión publicada en la caché compartida
+        with mock.patch('finanzas.facturadores.INTERVALO_VERSION', 0):
+            self.assertEqual(otro_proceso.buscar('GIMNASIO'), gimnasio)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            gimnasio.activo = False
+            gimnasio.save()
+        with mock.patch('finanzas.facturadores.INTERVALO_VERSION', 0):
+            self.assertIsNone(otro_proceso.buscar('Gimnasio'))
+            self.assertEqual(otro_proceso.buscar('Gimnasio', incluir_inactivos=True), gimnasio)
+
+
+class MigracionFacturadoresTests(TransactionTestCase):
+    anterior = [('finanzas', '0023_debitos_automaticos')]
+    posterior = [('finanzas', '0024_catalogo_facturadores')]
+
+    def tearDown(self):
+        ejecutor = MigrationExecutor(connection)
+        ejecutor.migrate(ejecutor.loader.graph.leaf_nodes())
+
+    def test_carga_el_catalogo_y_completa_los_pagos(self):
+        ejecutor = MigrationExecutor(connection)
+        ejecutor.migrate(self.anterior)
+        # las demás apps quedan en su última migración
+        otras = [nodo for nodo in ejecutor.loader.graph.leaf_nodes() if nodo[0] != 'finanzas']
+        apps = ejecutor.loader.project_state(self.anterior + otras).apps
+        Sucursal = apps.get_model('sucursales', 'Sucursal')
+        sucursal = Sucursal.objects.create(id=1, nombre='Central', direccion='Calle 1')
+        usuario = apps.get_model('usuarios', 'Usuario').objects.create(username='cliente', sucursal=sucursal)
+        cuenta = apps.get_model('finanzas', 'Cuenta').objects.create(usuario=usuario, tipo_cuenta='ahorro')
+        Servicios = apps.get_model('finanzas', 'Servicios')
+        for texto in ('Luz', 'luz ', 'Gimnasio', 'Gimnasio'):
+            Servicios.objects.create(cuenta=cuenta, servicio=texto, monto=1)
+        apps.get_model('finanzas', 'DebitoAutomatico').objects.create(
+            cuenta=cuenta, servicio='Club', monto=1, proximo_vencimiento=datetime.date(2024, 1, 1),
+        )
+
+        ejecutor = MigrationExecutor(connection)
+        ejecutor.migrate(self.posterior)
+        apps = ejecutor.loader.project_state(self.posterior + otras).apps
+        Facturador = apps.get_model('finanzas', 'Facturador')
+        Servicios = apps.get_model('finanzas', 'Servicios')
+
+        luz = Facturador.objects.get(codigo='LUZ')
+        self.assertTrue(luz.activo)
+        # los textos fuera del catálogo quedan como facturadores inactivos, también los de débitos
+        self.assertEqual(
+            set(Facturador.objects.filter(activo=False).values_list('codigo', 'nombre')),
+            {('GIMNASIO', 'Gimnasio'), ('CLUB', 'Club')},
+        )
+        self.assertFalse(Servicios.objects.filter(facturador__isnull=True).exists())
+        self.assertEqual(Servicios.objects.filter(facturador=luz).count(), 2)
+        self.assertEqual(Servicios.objects.filter(facturador__codigo='GIMNASIO').count(), 2)
+
+
+class ColasPrestamosTests(TestCase):
+    RUTA = '/api/finanzas/prestamos/pendientes/'
+
+    def setUp(self):
+        self.cuenta, = crear_cuentas(1, Decimal('0'))
+        self.prestamos = [
+            Prestamo.objects.create(cuenta=self.cuenta, monto_prestado=Decimal(monto), interes=Decimal('10'),
+                                    meses_duracion=3)
+            for monto in ('100', '200', '300')
+        ]
+        self.empleado = APIClient()
+        self.empleado.force_authenticate(
+            Usuario.objects.create_user(username='empleado', password='x', es_empleado=True, sucursal_id=1)
+        )
+
+    def consultar(self, **parametros):
+        respuesta = self.empleado.get(self.RUTA, parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.data
+
+    def test_cantidad_y_resumen(self):
+        self.prestamos[0].rechazar()
+
+        self.assertEqual(self.consultar(count_only=1), {'cantidad': 2})
+        resumen = self.consultar(summary=1)
+        self.assertEqual((resumen['cantidad'], resumen['capital']), (2, Decimal('500')))
+        self.assertEqual([p['id'] for p in resumen['recientes']], [self.prestamos[2].id, self.prestamos[1].id])
+
+    def test_since_por_id_trae_solo_los_nuevos(self):
+        datos = self.consultar(since=self.prestamos[0].id)
+        self.assertEqual([p['id'] for p in datos['prestamos']], [self.prestamos[1].id, self.prestamos[2].id])
+        self.assertEqual(datos['ultimo_id'], self.prestamos[2].id)
+        self.assertEqual(self.consultar(since=datos['ultimo_id']), {'prestamos': [], 'ultimo_id': self.prestamos[2].id})
+
+    def test_since_por_fecha_informa_cambios_y_salidas(self):
+        hace_un_rato = (timezone.now() - datetime.timedelta(minutes=5)).isoformat()
+        Prestamo.objects.update(actualizado=timezone.now() - datetime.timedelta(hours=1))
+        self.prestamos[0].aprobar()
+
+        datos = self.consultar(since=hace_un_rato)
+
+        self.assertEqual(datos['prestamos'], [])
+        self.assertEqual(datos['salidas'], [self.prestamos[0].id])
+
+        # un pendiente nuevo nunca estuvo entre los activos: no es una salida de esa cola
+        Prestamo.objects.create(cuenta=self.cuenta, monto_prestado=Decimal('50'), interes=Decimal('10'), meses_duracion=3)
+        datos = self.empleado.get('/api/finanzas/prestamos/activos/', {'since': hace_un_rato}).data
+        self.assertEqual(([p['id'] for p in datos['prestamos']], datos['salidas']), ([self.prestamos[0].id], []))
+
+    def test_el_proximo_sondeo_ve_lo_que_confirmo_tarde(self):
+        Prestamo.objects.update(actualizado=timezone.now() - datetime.timedelta(hours=1))
+        hasta = self.consultar(since=(timezone.now() - datetime.timedelta(minutes=5)).isoformat())['hasta']
+
+        # una transacción que fijó 'actualizado' antes del sondeo anterior pero confirmó después
+        Prestamo.objects.filter(id=self.prestamos[1].id).update(actualizado=timezone.now() - datetime.timedelta(seconds=5))
+
+        datos = self.consultar(since=hasta.isoformat())
+        self.assertEqual([p['id'] for p in datos['prestamos']], [self.prestamos[1].id])
+
+    def test_since_invalido_da_400(self):
+        for since in ('ayer', '2024-02-30T10:00:00', '²', '9' * 30):
+            with self.subTest(since=since):
+                self.assertEqual(self.empleado.get(self.RUTA, {'since': since}).status_code, 400)
+
+
+class PrestamosLoteTests(TestCase):
+    RUTA = '/api/finanzas/prestamos/lote/'
+
+    def setUp(self):
+        self.cuenta, = crear_cuentas(1, Decimal('0'))
+        self.empleado = APIClient()
+        self.empleado.force_authenticate(
+            Usuario.objects.create_user(username='empleado', password='x', es_empleado=True, sucursal_id=1)
+        )
+        for _ in range(3):
+            Prestamo.objects.create(cuenta=self.cuenta, monto_prestado=Decimal('100'), interes=Decimal('10'),
+                                    meses_duracion=3)
+
+    def test_fecha_inexistente_en_el_filtro_da_400(self):
+        respuesta = self.empleado.post(self.RUTA, {'accion': 'rechazar', 'filtro': {'desde': '2024-02-30'}},
+                                       format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(Prestamo.objects.filter(estado='pendiente').count(), 3)
+
+    def test_el_filtro_informa_cuando_se_trunca(self):
+        with mock.patch('finanzas.views.MAXIMO_PRESTAMOS_LOTE', 2):
+            primera = self.empleado.post(self.RUTA, {'accion': 'rechazar', 'filtro': {}}, format='json')
+            segunda = self.empleado.post(self.RUTA, {'accion': 'rechazar', 'filtro': {}}, format='json')
+
+        self.assertEqual((primera.data['procesados'], primera.data['truncado']), (2, True))
+        self.assertEqual((segunda.data['procesados'], segunda.data['truncado']), (1, False))
+        self.assertFalse(Prestamo.objects.filter(estado='pendiente').exists())
+
+
+class CarteraTests(TestCase):
+    def setUp(self):
+        self.cuenta, = crear_cuentas(1, Decimal('0'))
+        self.norte = Sucursal.objects.create(nombre='Norte', direccion='Calle 2')
+        for _ in range(2):
+            Prestamo.objects.create(cuenta=self.cuenta, monto_prestado=Decimal('100'), interes=Decimal('10'),
+                                    meses_duracion=3)
+        self.empleado = APIClient()
+        self.empleado.force_authenticate(
+            Usuario.objects.create_user(username='empleado', password='x', es_empleado=True, sucursal_id=1)
+        )
+
+    def test_el_cambio_de_sucursal_mueve_los_prestamos(self):
+        usuario = Usuario.objects.get(id=self.cuenta.usuario_id)
+        usuario.sucursal = self.norte
+        usuario.save()
+
+        self.assertEqual(cartera.cartera_de_sucursal(1)['totales'], {})
+        self.assertEqual(cartera.cartera_de_sucursal(self.norte.id)['totales']['pendiente']['cantidad'], 2)
+        resumen = {(f.sucursal_id, f.estado, f.mes, f.cantidad, f.capital) for f in ResumenCartera.objects.exclude(cantidad=0)}
+        cartera.reconstruir()
+        self.assertEqual(
+            {(f.sucursal_id, f.estado, f.mes, f.cantidad, f.capital) for f in ResumenCartera.objects.all()}, resumen,
+        )
+
+    def test_fecha_inexistente_da_400(self):
+        for desde in ('2024-13', '2024-02-30'):
+            with self.subTest(desde=desde):
+                respuesta = self.empleado.get('/api/finanzas/prestamos/cartera/', {'desde': desde})
+                self.assertEqual(respuesta.status_code, 400)
+
+
+class ExportarMovimientosTests(TestCase):
+    RUTA = '/api/finanzas/movimientos/exportar/'
+
+    def setUp(self):
+        self.cuenta, self.otra, ajena = crear_cuentas(3, Decimal('100'))
+        self.empleado = APIClient()
+        self.empleado.force_authenticate(
+            Usuario.objects.create_user(username='empleado', password='x', es_empleado=True, sucursal_id=1)
+        )
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.cuenta.usuario)
+
+        def en(dia):
+            return timezone.make_aware(datetime.datetime(2024, 1, dia, 12))
+        self.enviada = realizar_transferencia(self.cuenta.id, self.otra.id, '10', 'Alquiler', 'cliente0', 'cliente1')
+        self.recibida = realizar_transferencia(self.otra.id, self.cuenta.id, '5', None, 'cliente1', 'cliente0')
+        realizar_transferencia(ajena.id, self.otra.id, '7', None, 'cliente2', 'cliente1')
+        self.pago = Servicios.objects.create(cuenta=self.cuenta, servicio='Luz', monto=Decimal('3'))
+        Servicios.objects.create(cuenta=self.otra, servicio='Gas', monto=Decimal('4'))
+        Transferencia.objects.filter(id=self.enviada.id).update(fecha=en(10))
+        Transferencia.objects.filter(id=self.recibida.id).update(fecha=en(20))
+        Servicios.objects.filter(id=self.pago.id).update(fecha_pago=en(15))
+
+    def exportar(self, cliente, **parametros):
+        respuesta = cliente.get(self.RUTA, parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return b''.join(respuesta.streaming_content).decode()
+
+    def test_csv_con_los_movimientos_del_usuario_en_orden(self):
+        filas = list(csv.reader(io.StringIO(self.exportar(self.cliente))))
+        self.assertEqual(filas[0], ['tipo', 'id', 'fecha', 'cuenta', 'contraparte', 'monto', 'estado', 'descripcion'])
+        self.assertEqual([fila[:2] + fila[3:] for fila in filas[1:]], [
+            ['transferencia_enviada', str(self.enviada.id), str(self.cuenta.id), 'cliente1', '-10.00', '', 'Alquiler'],
+            ['pago', str(self.pago.id), str(self.cuenta.id), 'Luz', '-3.00', 'pendiente', ''],
+            ['transferencia_recibida', str(self.recibida.id), str(self.cuenta.id), 'cliente1', '5.00', '', ''],
+        ])
+        self.assertEqual(filas[1][2], '2024-01-10T12:00:00+00:00')
+        # el empleado exporta lo mismo pidiendo el usuario
+        self.assertEqual(self.exportar(self.empleado, usuario_id=self.cuenta.usuario_id),
+                         self.exportar(self.cliente))
+
+    def test_ndjson_filtrado_por_fechas_y_tipo(self):
+        lineas = self.exportar(self.cliente, formato='ndjson', desde='2024-01-12', hasta='2024-01-20')
+        movimientos = [json.loads(linea) for linea in lineas.splitlines()]
+        # 'hasta' con una fecha incluye ese día entero
+        self.assertEqual([(m['tipo'], m['id'], m['monto']) for m in movimientos],
+                         [('pago', self.pago.id, '-3.00'), ('transferencia_recibida', self.recibida.id, '5.00')])
+        lineas = self.exportar(self.cliente, formato='ndjson', tipo='pagos')
+        self.assertEqual([json.loads(linea)['id'] for linea in lineas.splitlines()], [self.pago.id])
+        self.assertEqual(self.exportar(self.cliente, formato='ndjson', hasta='2024-01-09'), '')
+
+    def test_fechas_inexistentes_dan_400(self):
+        for datos in ({'desde': '2024-02-30'}, {'hasta': '2024-13-01T10:00:00'}):
+            with self.subTest(datos=datos):
+                self.assertEqual(self.empleado.get(self.RUTA, datos).status_code, 400)
+                self.assertEqual(self.empleado.post(self.RUTA, datos, format='json').status_code, 400)
+        self.assertEqual(self.empleado.post(self.RUTA, {'desde': 20240101}, format='json').status_code, 400)
+        self.assertFalse(Tarea.objects.exists())
+
+    def test_usuario_id_no_numerico_da_400(self):
+        for usuario_id in ('abc', '1.5', '9' * 30):
+            with self.subTest(usuario_id=usuario_id):
+                self.assertEqual(self.empleado.get(self.RUTA, {'usuario_id': usuario_id}).status_code, 400)
+                respuesta = self.empleado.post(self.RUTA, {'usuario_id': usuario_id}, format='json')
+                self.assertEqual(respuesta.status_code, 400)
+
+    def test_usuario_id_de_la_sucursal(self):
+        respuesta = self.empleado.get(self.RUTA, {'usuario_id': str(self.cuenta.usuario_id)})
+        self.assertEqual(respuesta.status_code, 200)
+
+
+class ResolvedorDestinosTests(TestCase):
+    def setUp(self):
+        self.primera, self.segunda, self.tercera = crear_cuentas(3, Decimal('100'))
+        self.resolvedor = ResolvedorDestinos(capacidad=2)
+        cache.clear()
+
+    def test_resuelve_varios_con_una_consulta_y_no_guarda_los_inexistentes(self):
+        with self.assertNumQueries(1):
+            destinos = self.resolvedor.resolver_varios(['cliente0', self.segunda.numero_cuenta, 'nadie'])
+        self.assertEqual(destinos, {
+            'cliente0': (self.primera.id, 'cliente0'),
+            self.segunda.numero_cuenta: (self.segunda.id, 'cliente1'),
+        })
+        with self.assertNumQueries(0):
+            self.resolvedor.resolver_varios(['cliente0', self.segunda.numero_cuenta])
+        with self.assertNumQueries(1):
+            self.assertIsNone(self.resolvedor.resolver('nadie'))
+
+    def test_descarta_el_menos_usado_y_los_vencidos(self):
+        self.resolvedor.resolver('cliente0')
+        self.resolvedor.resolver('cliente1')
+        self.resolvedor.resolver('cliente0')
+        self.resolvedor.resolver('cliente2')
+        with self.assertNumQueries(0):
+            self.resolvedor.resolver_varios(['cliente0', 'cliente2'])
+        with self.assertNumQueries(1):
+            self.resolvedor.resolver('cliente1')
+
+        vencido = time.monotonic() + self.resolvedor.duracion + 1
+        with mock.patch('finanzas.destinos.time.monotonic', return_value=vencido), self.assertNumQueries(1):
+            self.resolvedor.resolver('cliente1')
+
+    def test_otro_proceso_deja_de_resolver_cuentas_borradas_y_usernames_viejos(self):
+        otro_proceso = ResolvedorDestinos()
+        numero = self.primera.numero_cuenta
+        self.assertIsNotNone(otro_proceso.resolver(numero))
+        self.assertIsNotNone(otro_proceso.resolver('cliente1'))
+
+        with mock.patch('finanzas.destinos.INTERVALO_VERSION', 0):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.primera.delete()
+            self.assertIsNone(otro_proceso.resolver(numero))
+            self.assertIsNone(otro_proceso.resolver('cliente0'))
+
+            self.assertIsNotNone(otro_proceso.resolver('cliente1'))
+            usuario = self.segunda.usuario
+            usuario.username = 'renombrado'
+            with self.captureOnCommitCallbacks(execute=True):
+                usuario.save()
+            self.assertIsNone(otro_proceso.resolver('cliente1'))
+            self.assertEqual(otro_proceso.resolver('renombrado'), (self.segunda.id, 'renombrado'))
+
+    def test_crear_o_borrar_cuentas_no_consulta_usuarios(self):
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True):
+            Cuenta.objects.create(usuario_id=self.primera.usuario_id, tipo_cuenta='corriente')
+            self.tercera.delete()
+        self.assertFalse([c for c in consultas if 'FROM "usuarios_usuario"' in c['sql']])
+
+
+class ImportarPagosTests(TestCase):
+    def setUp(self):
+        self.cuenta, self.ajena = crear_cuentas(2, Decimal('100'))
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.cuenta.usuario)
+
+    def importar(self, nombre, contenido, clave=None, **datos):
+        archivo = SimpleUploadedFile(nombre, contenido.encode())
+        encabezados = {'HTTP_IDEMPOTENCY_KEY': clave} if clave else {}
+        return self.cliente.post('/api/finanzas/pagos/importar/', {'archivo': archivo, **datos}, format='multipart',
+                                 **encabezados)
+
+    def test_informa_errores_por_fila_y_paga_el_resto(self):
+        respuesta = self.importar('pagos.csv', (
+            f"cuenta,servicio,monto\n{self.cuenta.id},Luz,10\n,Internet,5.50\n{self.ajena.id},Luz,1\n"
+            f"{self.cuenta.id},,3\n{self.cuenta.id},Agua,1.001\n"
+        ), cuenta=self.cuenta.id)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['realizados'], 2)
+        self.assertEqual([error['fila'] for error in respuesta.data['errores']], [4, 5, 6])
+        self.cuenta.refresh_from_db()
+        self.assertEqual(self.cuenta.balance_pesos, Decimal('84.50'))
+        self.assertEqual(Servicios.objects.filter(cuenta=self.cuenta, estado='pagado').count(), 2)
+
+    def test_rechaza_todas_las_filas_de_una_cuenta_sin_saldo_para_el_total(self):
+        respuesta = self.importar('pagos.jsonl', (
+            f'{{"cuenta": {self.cuenta.id}, "servicio": "Luz", "monto": 60}}\n'
+            f'{{"cuenta": {self.cuenta.id}, "servicio": "Internet", "monto": 60}}\n'
+        ))
+        self.assertEqual(respuesta.data['realizados'], 0)
+        self.assertEqual(len(respuesta.data['errores']), 2)
+        self.cuenta.refresh_from_db()
+        self.assertEqual(self.cuenta.balance_pesos, Decimal('100'))
+        self.assertFalse(Servicios.objects.exists())
+
+    def test_escribe_en_tandas_y_no_fila_por_fila(self):
+        # los INSERT masivos se parten según el límite de parámetros del motor, pero nunca una consulta por fila
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.importar('pagos.csv', "servicio,monto\n" + "Luz,0.01\n" * 900, cuenta=self.cuenta.id)
+        self.assertEqual(respuesta.data['realizados'], 900)
+        self.assertLess(len(consultas), 40)
+
+    def test_la_clave_de_idempotencia_distingue_el_contenido_del_archivo(self):
+        primero = self.importar('pagos.csv', "servicio,monto\nLuz,10\n", cuenta=self.cuenta.id,
+                                clave='importacion-1')
+        repetido = self.importar('pagos.csv', "servicio,monto\nLuz,10\n", cuenta=self.cuenta.id,
+                                 clave='importacion-1')
+        otro = self.importar('pagos.csv', "servicio,monto\nLuz,20\n", cuenta=self.cuenta.id,
+                             clave='importacion-1')
+
+        self.assertEqual(primero.data['realizados'], 1)
+        self.assertEqual(repetido['Idempotent-Replayed'], 'true')
+        # mismo nombre, otro contenido: no es un reintento
+        self.assertEqual(otro.status_code, 422)
+        self.cuenta.refresh_from_db()
+        self.assertEqual(self.cuenta.balance_pesos, Decimal('90'))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportarClientesTests(TestCase):
+    def setUp(self):
+        Sucursal.objects.get_or_create(id=1, defaults={'nombre': 'Central', 'direccion': 'Calle 1'})
+        Usuario.objects.create_user(username='existente', password='x')
+
+    def importar(self, contenido, **opciones):
+        rechazos = []
+        resultado = importar_clientes(leer_csv(io.StringIO(contenido)), rechazo=lambda *r: rechazos.append(r),
+                                      **opciones)
+        return resultado, rechazos
+
+    def test_crea_usuario_cuenta_y_tarjeta_en_tandas(self):
+        filas = "".join(f"cliente{i},clave{i},{'debito' if i % 2 else ''},{'100' if i == 0 else ''}\n" for i in range(300))
+        with CaptureQueriesContext(connection) as consultas:
+            resultado, rechazos = self.importar("username,password,tarjeta,saldo\n" + filas, tamano_lote=100)
+        self.assertEqual((resultado['creados'], resultado['tarjetas']), (300, 150))
+        self.assertEqual(rechazos, [])
+        # unas pocas consultas por lote, nunca por cliente
+        self.assertLess(len(consultas), 60)
+        usuario = Usuario.objects.get(username='cliente3')
+        self.assertTrue(usuario.check_password('clave3'))
+        self.assertEqual(usuario.cuentas.get().tarjetas.get().tipo_tarjeta, 'debito')
+        self.assertEqual(SaldoSnapshot.objects.get().balance_pesos, Decimal('100'))
+
+    def test_rechaza_filas_invalidas_y_saltea_los_existentes(self):
+        resultado, rechazos = self.importar(
+            "username,password,sucursal\nexistente,x,\nnuevo,x,\nnuevo,y,\nsin clave,,\notro,x,99\n"
+        )
+        self.assertEqual((resultado['creados'], resultado['existentes'], resultado['rechazados']), (1, 1, 3))
+        self.assertEqual(sorted(linea for linea, _ in rechazos), [4, 5, 6])
+        # volver a correrlo no crea nada
+        self.assertEqual(self.importar("username,password\nnuevo,x\n")[0]['existentes'], 1)
+
+    def test_hashea_en_varios_procesos_sin_recortar_las_contrasenas(self):
+        filas = "".join(f" cliente{i} , clave {i} ,{'credito' if i % 3 == 0 else ''}\n" for i in range(30))
+        resultado, rechazos = self.importar("username,password,tarjeta\n" + filas, procesos=2, tamano_lote=10)
+        self.assertEqual((resultado['creados'], resultado['tarjetas'], rechazos), (30, 10, []))
+        usuario = Usuario.objects.get(username='cliente7')
+        self.assertTrue(usuario.check_password(' clave 7 '))
+        self.assertFalse(usuario.check_password('clave 7'))
+
+    def test_esquiva_numeros_viejos_que_chocan_con_el_asignador(self):
+        # sin sobrantes en memoria, el próximo bloque sale del contador; se lo pide y se revierte
+        with mock.patch.object(asignador, '_disponibles', {}), transaction.atomic():
+            cuenta_vieja, tarjeta_vieja = numeros_cuenta(1)[0], numeros_tarjeta('visa', 1)[0]
+            transaction.set_rollback(True)
+        # números generados al azar antes del asignador que coinciden con los siguientes
+        cuenta = Cuenta.objects.create(usuario=Usuario.objects.get(username='existente'), numero_cuenta=cuenta_vieja)
+        Tarjeta.objects.create(cuenta=cuenta, tipo_tarjeta='debito', proveedor='visa', numero_tarjeta=tarjeta_vieja)
+
+        with mock.patch.object(asignador, '_disponibles', {}):
+            resultado, rechazos = self.importar("username,password,tarjeta,proveedor\nnuevo,x,debito,visa\n")
+        self.assertEqual((resultado['creados'], resultado['tarjetas'], rechazos), (1, 1, []))
+        nueva = Cuenta.objects.get(usuario__username='nuevo')
+        self.assertNotEqual(nueva.numero_cuenta, cuenta_vieja)
+        self.assertNotEqual(nueva.tarjetas.get().numero_tarjeta, tarjeta_vieja)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BuscarClientesTests(TestCase):
+    def setUp(self):
+        central, _ = Sucursal.objects.get_or_create(id=1, defaults={'nombre': 'Central', 'direccion': 'Calle 1'})
+        otra = Sucursal.objects.create(nombre='Norte', direccion='Calle 2')
+        self.gonzalez = Usuario.objects.create_user(username='mgonzalez', password='x', first_name='María',
+                                                    last_name='González', sucursal=central)
+        self.cuenta = Cuenta.objects.create(usuario=self.gonzalez, tipo_cuenta='ahorro')
+        Usuario.objects.create_user(username='gonzalo', password='x', first_name='Gonzalo', sucursal=central)
+        Usuario.objects.create_user(username='mgonzalez2', password='x', last_name='González', sucursal=otra)
+        empleado = Usuario.objects.create_user(username='empleado', password='x', es_empleado=True, sucursal=central)
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(empleado)
+        indice.limpiar()
+
+    def buscar(self, consulta, **parametros):
+        respuesta = self.cliente.get('/api/finanzas/clientes/buscar/', {'q': consulta, **parametros})
+        self.assertEqual(respuesta.status_code, 200)
+        return [cliente['username'] for cliente in respuesta.data['results']]
+
+    def test_prefijo_aproximada_y_numero_de_cuenta_dentro_de_la_sucursal(self):
+        self.assertEqual(self.buscar('gonz'), ['gonzalo', 'mgonzalez'])
+        self.assertEqual(self.buscar('maria gonzales'), ['mgonzalez'])
+        self.assertEqual(self.buscar(self.cuenta.numero_cuenta.replace('-', ' ')), ['mgonzalez'])
+        respuesta = self.cliente.get('/api/finanzas/clientes/buscar/', {'q': 'gonz', 'limite': 1})
+        self.assertEqual(respuesta.data['cantidad'], 2)
+        self.assertFalse(respuesta.data['limitado'])
+        self.assertIn('pagina=2', respuesta.data['next'])
+
+    def test_avisa_cuando_los_resultados_se_cortan(self):
+        with mock.patch('finanzas.busqueda.LIMITE_RESULTADOS', 1):
+            respuesta = self.cliente.get('/api/finanzas/clientes/buscar/', {'q': 'gonz'})
+        self.assertEqual([cliente['username'] for cliente in respuesta.data['results']], ['gonzalo'])
+        self.assertEqual(respuesta.data['cantidad'], 1)
+        self.assertTrue(respuesta.data['limitado'])
+
+    @override_settings(BUSQUEDA_CLIENTES={'MAXIMO_CLIENTES': 2})
+    def test_no_arma_el_indice_con_demasiados_clientes(self):
+        respuesta = self.cliente.get('/api/finanzas/clientes/buscar/', {'q': 'gonz'})
+        self.assertEqual(respuesta.status_code, 503)
+
+    def test_precarga_el_indice_en_un_hilo_al_arrancar(self):
+        with mock.patch.object(IndiceClientes, '_recargar') as recargar:
+            with override_settings(BUSQUEDA_CLIENTES={'PRECARGAR': False}):
+                self.assertIsNone(indice.precargar())
+            with override_settings(BUSQUEDA_CLIENTES={'PRECARGAR': True}):
+                indice.precargar().join()
+        recargar.assert_called_once_with(True)
+
+    def test_se_actualiza_con_las_altas_y_las_correcciones_en_lote(self):
+        self.buscar('gonz')
+        with self.captureOnCommitCallbacks(execute=True):
+            Usuario.objects.create_user(username='nuevo', password='x', last_name='Gonzaga')
+        with self.captureOnCommitCallbacks(execute=True):
+            actualizar_perfiles(1, [{'username_or_id': 'gonzalo', 'last_name': 'Pereyra'}])
+        with mock.patch.object(IndiceClientes, '_construir') as construir:
+            self.assertEqual(self.buscar('gonzaga'), ['nuevo'])
+            self.assertEqual(self.buscar('pereira'), ['gonzalo'])
+        construir.assert_not_called()
 
-# Create your tests here.
@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CuentaViewSet, TarjetaViewSet, TransferenciaViewSet, PrestamoViewSet, PagoViewSet, ResumenFinancieroView
+from .views import CuentaViewSet, TarjetaViewSet, TransferenciaViewSet, PrestamoViewSet, PagoViewSet, ResumenFinancieroView, \
+    ExportarMovimientosView, TareaViewSet, DebitoAutomaticoViewSet, FacturadoresView, BuscarClientesView
 
 router = DefaultRouter()
 router.register(r'cuentas', CuentaViewSet, basename='cuentas')
@@ -8,8 +9,13 @@ router.register(r'tarjetas', TarjetaViewSet, basename='tarjetas')
 router.register(r'transferencias', TransferenciaViewSet, basename='transferencias')
 router.register(r'prestamos', PrestamoViewSet, basename='prestamos')
 router.register(r'pagos', PagoViewSet, basename='pagos')
+router.register(r'tareas', TareaViewSet, basename='tareas')
+router.register(r'debitos', DebitoAutomaticoViewSet, basename='debitos')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('resumen/', ResumenFinancieroView.as_view(), name='resumen-financiero'),
+    path('movimientos/exportar/', ExportarMovimientosView.as_view(), name='exportar-movimientos'),
+    path('facturadores/', FacturadoresView.as_view(), name='facturadores'),
+    path('clientes/buscar/', BuscarClientesView.as_view(), name='buscar-clientes'),
     ]
\ No newline at end of file
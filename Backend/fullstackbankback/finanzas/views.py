@@ -1,15 +1,66 @@
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
 from rest_framework.permissions import IsAuthenticated, BasePermission
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework import viewsets, permissions, serializers, status
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.reverse import reverse
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import APIView
-from .models import Cuenta, Tarjeta, Transferencia, Prestamo, Servicios
-from .serializers import CuentaSerializer, TarjetaSerializer, TransferenciaSerializer, PrestamoSerializer, ServiciosSerializer
+from .models import Cuenta, Tarjeta, Transferencia, Prestamo, Servicios, Tarea, DebitoAutomatico
+from .serializers import (
+    CuentaSerializer, TarjetaSerializer, TransferenciaSerializer, PrestamoSerializer, CuotaPrestamoSerializer,
+    ServiciosSerializer, TareaSerializer, DebitoAutomaticoSerializer, FacturadorSerializer,
+)
+from .operaciones import (
+    realizar_transferencia, realizar_transferencias_lote, realizar_pagos_lote, procesar_prestamos_lote, debitar,
+    transaccion_exclusiva, SaldoInsuficiente, CuentaInexistente, ACCIONES_PRESTAMO,
+)
+from .contabilidad import registrar_pagos
+from .idempotencia import idempotente
+from .paginacion import PaginacionTransferencias, PaginacionPagos
+from .resumen import obtener_resumen, invalidar_resumen
+from .exportacion import movimientos, como_csv, como_ndjson
+from .importacion import LECTORES, ArchivoInvalido, importar_pagos
+from .destinos import resolvedor
+from .facturadores import catalogo
+from .busqueda import IndiceExcedido, indice
+from .tareas import encolar, ruta_extracto
+from . import cartera
 from sucursales.permissions import EsEmpleado
 from usuarios.models import Usuario
 from django.db import transaction
+from django.db.models import Count, ProtectedError, Q, Sum
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+MAXIMO_TRANSFERENCIAS_LOTE = 10000
+MAXIMO_PRESTAMOS_LOTE = 5000
+MAXIMO_PAGOS_LOTE = 10000
+
+
+MAXIMO_RECIENTES_COLA = 5
+# 'actualizado' se fija antes del commit: una transacción que confirma tarde deja cambios con una
+# fecha anterior a la del último sondeo. El 'hasta' devuelto se atrasa este margen para que el
+# próximo sondeo los vuelva a leer; el panel descarta los repetidos por id.
+MARGEN_SONDEO = timedelta(seconds=30)
+
+
+def parametro_activo(request, nombre):
+    return request.query_params.get(nombre, '').lower() in ('1', 'true', 'si')
+
+
+def es_asincrono(request):
+    return parametro_activo(request, 'asincrono')
+
+
+def respuesta_encolada(request, tarea, **extra):
+    # 202 con la URL donde consultar el estado de la tarea
+    url = reverse('tareas-detail', args=[tarea.id], request=request)
+    return Response({"tarea": tarea.id, "estado": tarea.estado, "url": url, **extra},
+                    status=status.HTTP_202_ACCEPTED, headers={"Location": url})
 
 
 class CuentaViewSet(viewsets.ModelViewSet):
@@ -28,7 +79,10 @@ class CuentaViewSet(viewsets.ModelViewSet):
             raise ValidationError("No puedes eliminar una cuenta con saldo.")
         if cuenta.tarjetas.exists():
             raise ValidationError("No puedes eliminar una cuenta con una tarjeta asociada activa.")
-        return super().destroy(request, *args, **kwargs)
+        try:
+            return super().destroy(request, *args, **kwargs)
+        except ProtectedError:
+            raise ValidationError("No puedes eliminar una cuenta con movimientos registrados.")
 
 
 class TarjetaViewSet(viewsets.ModelViewSet):
@@ -57,10 +111,15 @@ class TarjetaViewSet(viewsets.ModelViewSet):
 
 
 class TransferenciaViewSet(viewsets.ModelViewSet):
-    queryset = Transferencia.objects.all()
     serializer_class = TransferenciaSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PaginacionTransferencias
+
+    def get_queryset(self):
+        cuentas = Cuenta.objects.filter(usuario=self.request.user).values('id')
+        return Transferencia.objects.filter(Q(cuenta_origen__in=cuentas) | Q(cuenta_destino__in=cuentas))
 
+    @idempotente
     def create(self, request, *args, **kwargs):
         destinatario = request.data.get("destinatario")
         monto = request.data.get("monto")
@@ -69,41 +128,36 @@ class TransferenciaViewSet(viewsets.ModelViewSet):
         if not destinatario or not monto:
             return Response({"error": "El destinatario y el monto son obligatorios"}, status=status.HTTP_400_BAD_REQUEST)
 
-        cuenta_destino = None
         try:
-            if '-' in destinatario:
-                cuenta_destino = Cuenta.objects.get(numero_cuenta=destinatario)
-            else:
-                usuario_destino = Usuario.objects.get(username=destinatario)
-                cuenta_destino = Cuenta.objects.get(usuario=usuario_destino)
-        except (Cuenta.DoesNotExist, Usuario.DoesNotExist):
+            monto = Decimal(str(monto))
+            if not monto.is_finite():
+                raise InvalidOperation
+        except InvalidOperation:
+            return Response({"error": "El monto no es válido"}, status=status.HTTP_400_BAD_REQUEST)
+
+        destino = resolvedor.resolver(str(destinatario))
+        if destino is None:
             return Response({"error": "Destinatario no encontrado"}, status=status.HTTP_400_BAD_REQUEST)
+        cuenta_destino_id, username_receptor = destino
 
         cuenta_origen = Cuenta.objects.get(usuario=request.user)
-        if cuenta_origen.balance_pesos < monto:
-            return Response({"error": "Saldo insuficiente"}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            with transaction.atomic():
-                transferencia = Transferencia.objects.create(
-                    cuenta_origen=cuenta_origen,
-                    cuenta_destino=cuenta_destino,
-                    monto=monto,
-                    descripcion=descripcion,
-                    username_emisor=request.user.username
-                )
-
-                cuenta_origen.balance_pesos -= monto
-                cuenta_origen.save()
-
-                cuenta_destino.balance_pesos += monto
-                cuenta_destino.save()
-
-                username_receptor = cuenta_destino.usuario.username
-
-                transferencia.username_receptor = username_receptor
-                transferencia.save()
-
+            transferencia = realizar_transferencia(
+                cuenta_origen.id,
+                cuenta_destino_id,
+                monto,
+                descripcion=descripcion,
+                username_emisor=request.user.username,
+                username_receptor=username_receptor,
+            )
+        except SaldoInsuficiente:
+            return Response({"error": "Saldo insuficiente"}, status=status.HTTP_400_BAD_REQUEST)
+        except CuentaInexistente as e:
+            resolvedor.invalidar(str(destinatario))
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         serializer = TransferenciaSerializer(transferencia)
@@ -113,16 +167,76 @@ class TransferenciaViewSet(viewsets.ModelViewSet):
 
         return Response(transferencia_data, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, methods=['post'], url_path='lote')
+    @idempotente
+    def lote(self, request):
+        filas = request.data.get("transferencias")
+        if not isinstance(filas, list) or not filas:
+            return Response({"error": "Se requiere una lista de 'transferencias'."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(filas) > MAXIMO_TRANSFERENCIAS_LOTE:
+            return Response({"error": f"El lote no puede superar las {MAXIMO_TRANSFERENCIAS_LOTE} transferencias."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        cuenta_origen = Cuenta.objects.get(usuario=request.user)
+
+        destinos = resolvedor.resolver_varios({
+            str(fila.get("destinatario")) for fila in filas if isinstance(fila, dict) and fila.get("destinatario")
+        })
+
+        resultados = {}
+        validas = []
+        for i, fila in enumerate(filas):
+            if not isinstance(fila, dict) or not fila.get("destinatario") or not fila.get("monto"):
+                resultados[i] = {"fila": i, "error": "El destinatario y el monto son obligatorios"}
+                continue
+            try:
+                monto = Decimal(str(fila["monto"]))
+                if not monto.is_finite() or monto <= 0:
+                    raise InvalidOperation
+            except InvalidOperation:
+                resultados[i] = {"fila": i, "error": "El monto no es válido"}
+                continue
+
+            destino = destinos.get(str(fila["destinatario"]))
+            if destino is None:
+                resultados[i] = {"fila": i, "error": "Destinatario no encontrado"}
+                continue
+            if destino[0] == cuenta_origen.id:
+                resultados[i] = {"fila": i, "error": "La cuenta origen y la cuenta destino no pueden ser la misma."}
+                continue
+
+            validas.append({
+                "fila": i,
+                "cuenta_destino_id": destino[0],
+                "username_receptor": destino[1],
+                "monto": monto,
+                "descripcion": fila.get("descripcion"),
+            })
+
+        if validas:
+            try:
+                resultados.update(realizar_transferencias_lote(cuenta_origen.id, request.user.username, validas))
+            except SaldoInsuficiente:
+                resultados.update({fila["fila"]: {"fila": fila["fila"], "error": "Saldo insuficiente"} for fila in validas})
+
+        resultados = [resultados[i] for i in range(len(filas))]
+        return Response({
+            "realizadas": sum(1 for r in resultados if "error" not in r),
+            "rechazadas": sum(1 for r in resultados if "error" in r),
+            "resultados": resultados,
+        }, status=status.HTTP_200_OK)
+
 
 class EsEmpleadoOUsuarioPropio(BasePermission):
     # acceso si es empleado o si es el usuario dueño del préstamo.
     def has_permission(self, request, view):
         if hasattr(request.user, 'es_empleado') and request.user.es_empleado:
             return True
-        return view.action in ['list', 'retrieve', 'create']
+        return view.action in ['list', 'retrieve', 'create', 'cronograma']
 
     def has_object_permission(self, request, view, obj):
-        return request.user == obj.cuenta.usuario or (request.user.es_empleado if hasattr(request.user, 'es_empleado') else False)
+        # compara ids: con la cuenta traída por select_related no hace falta cargar el usuario
+        return obj.cuenta.usuario_id == request.user.id or getattr(request.user, 'es_empleado', False)
 
 
 class PrestamoViewSet(viewsets.ModelViewSet):
@@ -132,19 +246,33 @@ class PrestamoViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.es_empleado:
-            return Prestamo.objects.select_related('cuenta', 'cuenta__usuario').filter(
-                cuenta__usuario__sucursal=user.sucursal
-            )
-        return Prestamo.objects.filter(cuenta__usuario=user)
+            return Prestamo.objects.select_related('cuenta').filter(cuenta__usuario__sucursal_id=user.sucursal_id)
+        return Prestamo.objects.select_related('cuenta').filter(cuenta__usuario_id=user.id)
+
+    @idempotente
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
 
     def perform_create(self, serializer):
         serializer.save()
 
+    def perform_update(self, serializer):
+        anterior = Prestamo.objects.get(pk=serializer.instance.pk)
+        with transaction.atomic():
+            prestamo = serializer.save()
+            # el serializer solo deja cambiar las condiciones de los pendientes
+            if any(getattr(prestamo, campo) != getattr(anterior, campo) for campo in Prestamo.CAMPOS_CONDICIONES):
+                prestamo.recalcular_cronograma()
+            cartera.mover([anterior], anterior.estado, None)
+            cartera.mover([prestamo], None, prestamo.estado)
+
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, EsEmpleado])
     def aprobar(self, request, pk=None):
         prestamo = self.get_object()
         if prestamo.estado != 'pendiente':
             return Response({"error": "Solo se pueden aprobar préstamos pendientes."}, status=status.HTTP_400_BAD_REQUEST)
+        if es_asincrono(request):
+            return respuesta_encolada(request, encolar('aprobar_prestamo', {"prestamo_id": prestamo.id}, request.user))
         try:
             prestamo.aprobar()
             serializer = self.get_serializer(prestamo)
@@ -176,25 +304,177 @@ class PrestamoViewSet(viewsets.ModelViewSet):
         except ValueError as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'], url_path='lote', permission_classes=[IsAuthenticated, EsEmpleado])
+    @idempotente
+    def lote(self, request):
+        """
+        Aprueba, rechaza o anula préstamos de la sucursal en bloque. Recibe la acción y
+        una lista de `ids` o un `filtro` (cuenta, monto_maximo, desde, hasta sobre fecha_inicio).
+        Un filtro procesa como mucho MAXIMO_PRESTAMOS_LOTE préstamos; si quedaron más, la
+        respuesta trae `truncado` y basta con repetir la solicitud para seguir.
+        """
+        accion = request.data.get("accion")
+        if accion not in ACCIONES_PRESTAMO:
+            return Response({"error": "La acción debe ser aprobar, rechazar o anular."}, status=status.HTTP_400_BAD_REQUEST)
+
+        ids = request.data.get("ids")
+        filtro = request.data.get("filtro")
+        truncado = False
+        if ids is not None:
+            if not isinstance(ids, list) or not ids or not all(isinstance(i, int) for i in ids):
+                return Response({"error": "'ids' debe ser una lista de ids de préstamos."}, status=status.HTTP_400_BAD_REQUEST)
+            if len(ids) > MAXIMO_PRESTAMOS_LOTE:
+                return Response({"error": f"El lote no puede superar los {MAXIMO_PRESTAMOS_LOTE} préstamos."},
+                                status=status.HTTP_400_BAD_REQUEST)
+            # los préstamos de otras sucursales se informan como no encontrados
+            visibles = set(self.get_queryset().filter(id__in=ids).values_list('id', flat=True))
+        elif isinstance(filtro, dict):
+            estado_requerido = ACCIONES_PRESTAMO[accion][0]
+            prestamos = self.get_queryset().filter(estado=estado_requerido)
+            try:
+                if filtro.get("cuenta"):
+                    prestamos = prestamos.filter(cuenta_id=int(filtro["cuenta"]))
+                if filtro.get("monto_maximo"):
+                    prestamos = prestamos.filter(monto_prestado__lte=Decimal(str(filtro["monto_maximo"])))
+            except (TypeError, ValueError, InvalidOperation):
+                return Response({"error": "El filtro no es válido."}, status=status.HTTP_400_BAD_REQUEST)
+            for clave, lookup in (("desde", "fecha_inicio__gte"), ("hasta", "fecha_inicio__lte")):
+                if filtro.get(clave):
+                    try:
+                        fecha = parse_date(str(filtro[clave]))
+                    except ValueError:
+                        # bien formada pero inexistente, como 2024-02-30
+                        fecha = None
+                    if fecha is None:
+                        return Response({"error": f"La fecha '{clave}' no es válida."}, status=status.HTTP_400_BAD_REQUEST)
+                    prestamos = prestamos.filter(**{lookup: fecha})
+            ids = list(prestamos.order_by('id').values_list('id', flat=True)[:MAXIMO_PRESTAMOS_LOTE + 1])
+            truncado = len(ids) > MAXIMO_PRESTAMOS_LOTE
+            del ids[MAXIMO_PRESTAMOS_LOTE:]
+            visibles = set(ids)
+        else:
+            return Response({"error": "Se requiere una lista de 'ids' o un 'filtro'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if es_asincrono(request):
+            tarea = encolar('prestamos_lote', {"accion": accion, "ids": [i for i in ids if i in visibles]}, request.user)
+            return respuesta_encolada(request, tarea, truncado=truncado)
+
+        resultados = procesar_prestamos_lote(accion, [i for i in ids if i in visibles])
+        resultados = [
+            resultados.get(i, {"id": i, "error": "Préstamo no encontrado"})
+            for i in dict.fromkeys(ids)
+        ]
+        return Response({
+            "procesados": sum(1 for r in resultados if "error" not in r),
+            "fallidos": sum(1 for r in resultados if "error" in r),
+            "truncado": truncado,
+            "resultados": resultados,
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'])
+    def cronograma(self, request, pk=None):
+        prestamo = self.get_object()
+        serializer = CuotaPrestamoSerializer(prestamo.cuotas.all(), many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, EsEmpleado])
+    def cartera(self, request):
+        """
+        Tablero de la sucursal: cantidad, capital, total a pagar y cuotas esperadas por
+        estado y mes, leídos del resumen precalculado sin recorrer los préstamos.
+        """
+        desde = request.query_params.get('desde')
+        hasta = request.query_params.get('hasta')
+        fechas = {}
+        for nombre, valor in (('desde', desde), ('hasta', hasta)):
+            if valor:
+                # se aceptan 'AAAA-MM' o una fecha completa
+                try:
+                    fecha = parse_date(valor if len(valor) > 7 else f"{valor}-01")
+                except ValueError:
+                    # bien formada pero inexistente, como 2024-13
+                    fecha = None
+                if fecha is None:
+                    return Response({"error": f"La fecha '{nombre}' no es válida."}, status=status.HTTP_400_BAD_REQUEST)
+                fechas[nombre] = fecha
+        return Response(cartera.cartera_de_sucursal(
+            request.user.sucursal_id, estado=request.query_params.get('estado'), **fechas
+        ))
+
+    def cola(self, request, estado):
+        """
+        Cola de préstamos de la sucursal en `estado`. Para los sondeos del panel admite:
+        ?count_only=1 (solo la cantidad), ?summary=1 (cantidad, capital y los más
+        recientes) y ?since=<id> o ?since=<fecha-hora> (solo lo nuevo o lo que cambió).
+        Con una fecha-hora, el 'hasta' de la respuesta es el 'since' del próximo sondeo:
+        las ventanas se solapan MARGEN_SONDEO, así que un préstamo puede llegar dos veces.
+        'salidas' son los que cambiaron a un estado al que solo se llega desde `estado`.
+        """
+        prestamos = self.get_queryset().filter(estado=estado)
+        if parametro_activo(request, 'count_only'):
+            return Response({"cantidad": prestamos.count()})
+
+        if parametro_activo(request, 'summary'):
+            totales = prestamos.aggregate(cantidad=Count('id'), capital=Sum('monto_prestado'))
+            recientes = prestamos.order_by('-id')[:MAXIMO_RECIENTES_COLA]
+            return Response({
+                "cantidad": totales['cantidad'],
+                "capital": totales['capital'] or Decimal('0'),
+                "recientes": self.get_serializer(recientes, many=True).data,
+            })
+
+        desde = request.query_params.get('since')
+        # isdecimal y no isdigit: '²' es un dígito pero int() no lo acepta; uno muy largo no entra en la columna
+        if desde and desde.isdecimal() and len(desde) <= 18:
+            # por id: solo los que entraron a la cola después del último que vio el panel
+            nuevos = self.get_serializer(prestamos.filter(id__gt=int(desde)).order_by('id'), many=True).data
+            return Response({"prestamos": nuevos, "ultimo_id": nuevos[-1]['id'] if nuevos else int(desde)})
+        if desde:
+            try:
+                fecha_hora = parse_datetime(desde)
+            except ValueError:
+                # bien formada pero inexistente, como 2024-02-30T10:00
+                fecha_hora = None
+            if fecha_hora is None:
+                return Response({"error": "'since' debe ser un id o una fecha-hora ISO."}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(fecha_hora):
+                fecha_hora = timezone.make_aware(fecha_hora)
+            # por fecha: los que cambiaron; los que salieron de la cola se informan en 'salidas'. Los que
+            # están en otro estado sin haber pasado por este (un pendiente nuevo, para los activos) no
+            salientes = [nuevo for requerido, nuevo, _ in ACCIONES_PRESTAMO.values() if requerido == estado]
+            hasta = timezone.now() - MARGEN_SONDEO
+            cambiados = list(self.get_queryset().filter(
+                actualizado__gt=fecha_hora, estado__in=[estado, *salientes],
+            ).order_by('actualizado', 'id'))
+            return Response({
+                "prestamos": self.get_serializer([p for p in cambiados if p.estado == estado], many=True).data,
+                "salidas": [p.id for p in cambiados if p.estado != estado],
+                "hasta": hasta,
+            })
+
+        return Response(self.get_serializer(prestamos, many=True).data)
+
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, EsEmpleado])
     def activos(self, request):
-        prestamos_activos = self.get_queryset().filter(estado='aprobado')
-        serializer = self.get_serializer(prestamos_activos, many=True)
-        return Response(serializer.data)
+        return self.cola(request, 'aprobado')
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, EsEmpleado])
     def pendientes(self, request):
-        prestamos_pendientes = self.get_queryset().filter(estado='pendiente')
-        serializer = self.get_serializer(prestamos_pendientes, many=True)
-        return Response(serializer.data)
+        return self.cola(request, 'pendiente')
 
 
 class PagoViewSet(viewsets.ModelViewSet):
     serializer_class = ServiciosSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PaginacionPagos
 
     def get_queryset(self):
-        return Servicios.objects.filter(cuenta__usuario=self.request.user).order_by('-fecha_pago')
+        cuentas = Cuenta.objects.filter(usuario=self.request.user).values('id')
+        return Servicios.objects.filter(cuenta__in=cuentas).order_by('-fecha_pago', '-id')
+
+    @idempotente
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
 
     def perform_create(self, serializer):
         cuenta = serializer.validated_data['cuenta']
@@ -203,64 +483,251 @@ class PagoViewSet(viewsets.ModelViewSet):
         if cuenta.usuario != self.request.user:
             raise serializers.ValidationError("La cuenta no pertenece al usuario autenticado.")
 
-        if cuenta.balance_pesos < monto:
+        if monto <= 0:
+            raise serializers.ValidationError("El monto debe ser mayor a 0")
+
+        try:
+            with transaccion_exclusiva():
+                debitar(cuenta.id, monto)
+                pago = serializer.save()
+                registrar_pagos([pago])
+                invalidar_resumen([cuenta.usuario_id])
+        except SaldoInsuficiente:
             raise serializers.ValidationError("El balance de la cuenta es insuficiente.")
 
-        cuenta.balance_pesos -= monto
-        cuenta.save()
+    @action(detail=False, methods=['post'], url_path='lote')
+    @idempotente
+    def lote(self, request):
+        cuenta = Cuenta.objects.filter(id=request.data.get("cuenta"), usuario=request.user).first()
+        if cuenta is None:
+            return Response({"error": "La cuenta no pertenece al usuario autenticado."}, status=status.HTTP_400_BAD_REQUEST)
+        filas = request.data.get("pagos")
+        if not isinstance(filas, list) or not filas:
+            return Response({"error": "Se requiere una lista de 'pagos'."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(filas) > MAXIMO_PAGOS_LOTE:
+            return Response({"error": f"El lote no puede superar los {MAXIMO_PAGOS_LOTE} pagos."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        errores = {}
+        validas = []
+        for i, fila in enumerate(filas):
+            if not isinstance(fila, dict) or not fila.get("servicio") or not fila.get("monto"):
+                errores[i] = {"fila": i, "error": "El servicio y el monto son obligatorios"}
+                continue
+            try:
+                monto = Decimal(str(fila["monto"]))
+                if not monto.is_finite() or monto <= 0:
+                    raise InvalidOperation
+            except InvalidOperation:
+                errores[i] = {"fila": i, "error": "El monto no es válido"}
+                continue
+            facturador = catalogo.buscar(fila["servicio"])
+            if facturador is None:
+                errores[i] = {"fila": i, "error": "El servicio no está en el catálogo de facturadores."}
+                continue
+            validas.append({"fila": i, "servicio": facturador.nombre, "facturador": facturador.id, "monto": monto})
+
+        if es_asincrono(request) and validas:
+            tarea = encolar('pagos_lote', {"cuenta_id": cuenta.id, "filas": validas, "errores": list(errores.values())},
+                            request.user)
+            return respuesta_encolada(request, tarea)
+
+        resultados = dict(errores)
+        if validas:
+            resultados.update(realizar_pagos_lote(cuenta.id, validas))
+        resultados = [resultados[i] for i in range(len(filas))]
+        return Response({
+            "realizados": sum(1 for r in resultados if "error" not in r),
+            "rechazados": sum(1 for r in resultados if "error" in r),
+            "resultados": resultados,
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='importar')
+    @idempotente
+    def importar(self, request):
+        # archivo CSV (encabezado cuenta,servicio,monto) o JSON Lines; 'cuenta' aplica a las filas que no la traen
+        archivo = request.FILES.get("archivo")
+        if archivo is None:
+            return Response({"error": "Se requiere un 'archivo'."}, status=status.HTTP_400_BAD_REQUEST)
+        formato = request.data.get("formato") or archivo.name.rsplit('.', 1)[-1].lower()
+        formato = {'ndjson': 'jsonl'}.get(formato, formato)
+        if formato not in LECTORES:
+            return Response({"error": "El formato debe ser 'csv' o 'jsonl'."}, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer.save()
+        try:
+            realizados, monto_total, errores = importar_pagos(
+                request.user, LECTORES[formato](archivo), request.data.get("cuenta"),
+            )
+        except ArchivoInvalido as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "realizados": realizados,
+            "rechazados": len(errores),
+            "monto_total": monto_total,
+            "errores": errores,
+        }, status=status.HTTP_200_OK)
+
+
+class DebitoAutomaticoViewSet(viewsets.ModelViewSet):
+    serializer_class = DebitoAutomaticoSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return DebitoAutomatico.objects.filter(cuenta__usuario_id=self.request.user.id).order_by('proximo_vencimiento', 'id')
+
+
+class FacturadoresView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        # se sirve desde el catálogo en memoria, sin consultas
+        return Response(FacturadorSerializer(catalogo.activos(), many=True).data)
+
+
+class BuscarClientesView(APIView):
+    """
+    Búsqueda de clientes de la sucursal del empleado por username, nombre, email,
+    teléfono o número de cuenta, sobre el índice en memoria. Los datos de la página
+    se leen de la base con una consulta, así que siempre están al día. `limitado`
+    indica que hay más coincidencias que las que el índice devuelve: hay que afinar
+    la búsqueda.
+    """
+    permission_classes = [IsAuthenticated, EsEmpleado]
+    limite_por_defecto = 20
+    limite_maximo = 100
+
+    def get(self, request):
+        consulta = request.query_params.get('q', '').strip()
+        if len(consulta) < 2:
+            return Response({"error": "La búsqueda debe tener al menos 2 caracteres."}, status=400)
+        try:
+            pagina = max(1, int(request.query_params.get('pagina', 1)))
+            limite = min(max(1, int(request.query_params.get('limite', self.limite_por_defecto))), self.limite_maximo)
+        except ValueError:
+            return Response({"error": "'pagina' y 'limite' deben ser números."}, status=400)
+
+        try:
+            ids, limitado = indice.buscar(request.user.sucursal_id, consulta)
+        except IndiceExcedido as e:
+            return Response({"error": str(e)}, status=503)
+        pagina_ids = ids[(pagina - 1) * limite:pagina * limite]
+        clientes = {}
+        # el filtro por sucursal se repite en la base: el índice de otro proceso puede estar atrasado
+        filas = Usuario.objects.filter(id__in=pagina_ids, sucursal_id=request.user.sucursal_id, es_empleado=False) \
+            .values_list('id', 'username', 'first_name', 'last_name', 'email', 'telefono', 'cuentas__numero_cuenta')
+        for usuario_id, username, first_name, last_name, email, telefono, numero_cuenta in filas:
+            cliente = clientes.setdefault(usuario_id, {
+                'id': usuario_id, 'username': username, 'first_name': first_name, 'last_name': last_name,
+                'email': email, 'telefono': telefono, 'cuentas': [],
+            })
+            if numero_cuenta:
+                cliente['cuentas'].append(numero_cuenta)
+
+        siguiente = None
+        if len(ids) > pagina * limite:
+            siguiente = replace_query_param(request.build_absolute_uri(), 'pagina', pagina + 1)
+        return Response({
+            'cantidad': len(ids),
+            'limitado': limitado,
+            'next': siguiente,
+            'results': [clientes[usuario_id] for usuario_id in pagina_ids if usuario_id in clientes],
+        })
 
 
 class ResumenFinancieroView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        usuario = self.request.user
+        return Response(obtener_resumen(request.user))
 
-        cuentas = Cuenta.objects.filter(usuario=usuario)
-        balance_pesos = sum(cuenta.balance_pesos for cuenta in cuentas)
-        balance_dolares = sum(cuenta.balance_dolares for cuenta in cuentas)
-
-        prestamos_activos = Prestamo.objects.filter(cuenta__usuario=usuario, estado='aprobado')
-        total_pendiente = sum(prestamo.pago_total for prestamo in prestamos_activos)
-        proxima_cuota = sum(prestamo.cuota_mensual for prestamo in prestamos_activos)
-
-        transferencias = Transferencia.objects.filter(cuenta_origen__usuario=usuario).order_by('-fecha')[:5]
-        transferencias_data = [
-            {
-                "cuenta_origen": transferencia.cuenta_origen.id,
-                "cuenta_destino": transferencia.cuenta_destino.id,
-                "monto": transferencia.monto,
-                "fecha": transferencia.fecha,
-                "descripcion": transferencia.descripcion,
-            }
-            for transferencia in transferencias
-        ]
 
-        ultimo_mes = datetime.now() - timedelta(days=30)
-        pagos = Servicios.objects.filter(cuenta__usuario=usuario, fecha_pago__gte=ultimo_mes)
-        pagos_data = [
-            {
-                "servicio": pago.servicio,
-                "monto": pago.monto,
-                "estado": pago.estado,
-                "fecha_pago": pago.fecha_pago,
-            }
-            for pago in pagos
-        ]
+class ExportarMovimientosView(APIView):
+    permission_classes = [IsAuthenticated]
 
-        resumen = {
-            "balances_totales": {
-                "pesos": balance_pesos,
-                "dolares": balance_dolares,
-            },
-            "prestamos": {
-                "total_pendiente": total_pendiente,
-                "proxima_cuota": proxima_cuota,
-                "cantidad_activos": prestamos_activos.count(),
-            },
-            "transferencias_recientes": transferencias_data,
-            "pagos_recientes": pagos_data,
-        }
-        return Response(resumen)
\ No newline at end of file
+    FORMATOS = {
+        'csv': (como_csv, 'text/csv; charset=utf-8'),
+        'ndjson': (como_ndjson, 'application/x-ndjson'),
+    }
+
+    def parsear_fecha(self, valor, fin_de_dia=False):
+        if not valor:
+            return None
+        if not isinstance(valor, str):
+            raise ValidationError(f"Fecha inválida: '{valor}'.")
+        try:
+            # parse_* devuelven None si el formato no coincide y lanzan ValueError si la fecha no existe.
+            # La fecha sola va primero: parse_datetime también la acepta, como medianoche
+            fecha = parse_date(valor)
+            if fecha is None:
+                fecha_hora = parse_datetime(valor)
+                if fecha_hora is not None:
+                    return fecha_hora if timezone.is_aware(fecha_hora) else timezone.make_aware(fecha_hora)
+        except ValueError:
+            fecha = None
+        if fecha is None:
+            raise ValidationError(f"Fecha inválida: '{valor}'.")
+        if fin_de_dia:
+            # 'hasta' con una fecha incluye todo ese día
+            fecha += timedelta(days=1)
+        return timezone.make_aware(datetime.combine(fecha, time.min))
+
+    def parametros(self, request, datos):
+        formato = datos.get('formato', 'csv')
+        tipo = datos.get('tipo', 'todos')
+        if formato not in self.FORMATOS:
+            raise ValidationError("El formato debe ser 'csv' o 'ndjson'.")
+        if tipo not in ('todos', 'transferencias', 'pagos'):
+            raise ValidationError("El tipo debe ser 'todos', 'transferencias' o 'pagos'.")
+
+        desde = self.parsear_fecha(datos.get('desde'))
+        hasta = self.parsear_fecha(datos.get('hasta'), fin_de_dia=True)
+
+        # los empleados pueden exportar los movimientos de clientes de su sucursal
+        usuario_id = request.user.id
+        if datos.get('usuario_id') and request.user.es_empleado:
+            valor = str(datos['usuario_id'])
+            if not valor.isdecimal() or len(valor) > 18:
+                raise ValidationError("El usuario_id debe ser un número entero.")
+            usuario_id = int(valor)
+            if not Usuario.objects.filter(id=usuario_id, sucursal_id=request.user.sucursal_id).exists():
+                raise NotFound("Usuario no encontrado.")
+        return formato, tipo, desde, hasta, usuario_id
+
+    def get(self, request):
+        formato, tipo, desde, hasta, usuario_id = self.parametros(request, request.query_params)
+        generador, content_type = self.FORMATOS[formato]
+        respuesta = StreamingHttpResponse(generador(movimientos(usuario_id, tipo, desde, hasta)), content_type=content_type)
+        respuesta['Content-Disposition'] = f'attachment; filename="movimientos.{formato}"'
+        return respuesta
+
+    def post(self, request):
+        # genera el extracto en segundo plano; se descarga desde tareas/<id>/descargar/
+        formato, tipo, desde, hasta, usuario_id = self.parametros(request, request.data)
+        tarea = encolar('generar_extracto', {
+            "formato": formato, "tipo": tipo, "desde": desde, "hasta": hasta, "usuario_id": usuario_id,
+        }, request.user)
+        return respuesta_encolada(request, tarea)
+
+
+class TareaViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = TareaSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Tarea.objects.filter(usuario=self.request.user).order_by('-id')
+
+    @action(detail=True, methods=['get'])
+    def descargar(self, request, pk=None):
+        tarea = self.get_object()
+        if tarea.tipo != 'generar_extracto':
+            return Response({"error": "La tarea no genera un archivo."}, status=status.HTTP_400_BAD_REQUEST)
+        if tarea.estado != 'completada':
+            return Response({"error": "El extracto todavía no está listo.", "estado": tarea.estado},
+                            status=status.HTTP_409_CONFLICT)
+        formato = tarea.parametros['formato']
+        try:
+            archivo = open(ruta_extracto(tarea.id, formato), 'rb')
+        except FileNotFoundError:
+            return Response({"error": "El extracto ya no está disponible."}, status=status.HTTP_410_GONE)
+        return FileResponse(archivo, as_attachment=True, filename=f"movimientos.{formato}",
+                            content_type=ExportarMovimientosView.FORMATOS[formato][1])
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -75,10 +77,12 @@ CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOW_HEADERS = [
     'content-type',
     'authorization',
+    'idempotency-key',
 ]
 
 CORS_EXPOSE_HEADERS = [
     'Authorization',
+    'Idempotent-Replayed',
 ]
 
 TEMPLATES = [
@@ -138,6 +142,9 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# extractos generados por la cola de tareas
+EXTRACTOS_ROOT = os.path.join(BASE_DIR, 'extractos')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -145,7 +152,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'usuarios.autenticacion.JWTClaimsAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -155,9 +162,38 @@ REST_FRAMEWORK = {
 AUTH_USER_MODEL = 'usuarios.Usuario'
 
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',
+    'usuarios.autenticacion.BackendUsuarios',
 ]
 
+# el primero es el que se usa para contraseñas nuevas; al iniciar sesión, las guardadas
+# con cualquiera de los otros se rehashean con el primero. MD5 queda al final solo para
+# verificar (y así rehashear) contraseñas heredadas: nunca puede ser el principal.
+HASHERS_PRINCIPALES = (
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+)
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'django.contrib.auth.hashers.PBKDF2PasswordHasher')
+if PASSWORD_HASHER not in HASHERS_PRINCIPALES:
+    raise ImproperlyConfigured(f"PASSWORD_HASHER debe ser uno de: {', '.join(HASHERS_PRINCIPALES)}.")
+PASSWORD_HASHERS = list(dict.fromkeys([
+    PASSWORD_HASHER,
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+]))
+
+# fallos de login permitidos por usuario y por IP en la ventana (segundos) antes de
+# rechazar sin verificar la contraseña; BACKEND: 'memoria', 'cache' o una ruta a una clase
+LIMITADOR_LOGIN = {
+    'BACKEND': os.environ.get('LIMITADOR_LOGIN_BACKEND', 'memoria'),
+    'VENTANA': 300,
+    'MAXIMO_POR_USUARIO': 5,
+    'MAXIMO_POR_IP': 20,
+}
+
 
 from datetime import timedelta
 
@@ -167,10 +203,59 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
 }
 
+# clave de la permutación que genera los números de cuenta y de tarjeta (finanzas.numeracion).
+# Es independiente de SECRET_KEY para que rotar esa no cambie la secuencia: con otra clave los
+# números nuevos podrían repetir los ya emitidos. No se cambia una vez emitidos números; el valor
+# por defecto es el SECRET_KEY con el que se emitieron hasta ahora.
+NUMERACION_CLAVE = os.environ.get('NUMERACION_CLAVE', 'django-insecure-uid&tij=l+vun!c4z(9h!7x57w_ud4c@=^bqmszz107b=0z6n!')
+
+# tiempo que se guarda la respuesta de un POST con Idempotency-Key
+IDEMPOTENCIA_TTL = timedelta(hours=24)
+
+# índice en memoria de la búsqueda de clientes (finanzas.busqueda). Cada worker tiene el suyo:
+# con 1M de clientes se arma en unos 30 s y ocupa unos 1,3 GB, y mientras se rearma (cada
+# DURACION segundos) conviven el viejo y el nuevo, así que el pico es el doble. Hay que
+# dimensionar la memoria como workers x 2,6 GB por millón de clientes, o usar menos workers
+# con más hilos. Con PRECARGAR se arma al arrancar cada worker (sin --preload de gunicorn)
+# en lugar de en la primera búsqueda; con más de MAXIMO_CLIENTES la búsqueda responde 503.
+BUSQUEDA_CLIENTES = {
+    'PRECARGAR': os.environ.get('BUSQUEDA_CLIENTES_PRECARGAR', '1') == '1',
+    'DURACION': 900,
+    'MAXIMO_CLIENTES': int(os.environ.get('BUSQUEDA_CLIENTES_MAXIMO', 2000000)),
+}
+
 import dj_database_url
 
 DATABASES = {
     'default': dj_database_url.config(default='sqlite:///db.sqlite3')
 }
 
+# el resumen financiero, la versión del catálogo de facturadores y el estado de acceso de los
+# tokens se invalidan en un proceso y se leen en otro, así que con más de un worker la caché
+# tiene que ser compartida: en producción, Redis (REDIS_URL). Sin REDIS_URL se usa la memoria
+# del proceso, que alcanza para desarrollo con un solo proceso. CACHE_EN_BASE=1 es el respaldo
+# compartido sin Redis: una tabla en la base (la crea la migración finanzas.0026 si la variable
+# ya estaba al migrar; si no, `manage.py createcachetable`), que cuesta una consulta por
+# lectura, es decir, una más en cada solicitud autenticada.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+elif os.environ.get('CACHE_EN_BASE') == '1':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'cache_compartida',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 
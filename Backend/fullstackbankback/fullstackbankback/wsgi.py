@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fullstackbankback.settings')
 
 application = get_wsgi_application()
+
+# el índice de búsqueda de clientes se arma en segundo plano al arrancar el worker
+from finanzas.busqueda import indice  # noqa: E402
+
+indice.precargar()
@@ -6,4 +6,4 @@ class EsEmpleado(BasePermission):
 
 class EsEmpleadoDeSucursal(BasePermission):
     def has_object_permission(self, request, view, obj):
-        return request.user.is_authenticated and request.user.es_empleado and obj == request.user.sucursal
\ No newline at end of file
+        return request.user.is_authenticated and request.user.es_empleado and obj.id == request.user.sucursal_id
\ No newline at end of file
@@ -0,0 +1,106 @@
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .limitador import limitador
+from .models import Usuario
+
+
+# cuánto puede tardar una revocación en verse en un proceso que no recibió la invalidación
+DURACION_ACCESO = 60
+CLAIMS_USUARIO = ('username', 'es_empleado', 'sucursal_id')
+
+
+def clave_acceso(usuario_id):
+    return f'acceso:{usuario_id}'
+
+
+def estado_acceso(usuario_id):
+    """
+    Devuelve (version_token, is_active) del usuario, o None si no existe. Se cachea
+    DURACION_ACCESO segundos: es la única consulta de la autenticación y casi nunca se hace.
+    """
+    clave = clave_acceso(usuario_id)
+    estado = cache.get(clave)
+    if estado is None:
+        estado = Usuario.objects.filter(id=usuario_id).values_list('version_token', 'is_active').first()
+        if estado is None:
+            return None
+        cache.set(clave, tuple(estado), DURACION_ACCESO)
+    return tuple(estado)
+
+
+def invalidar_acceso(usuario_id):
+    cache.delete(clave_acceso(usuario_id))
+
+
+def emitir_tokens(usuario):
+    """
+    Refresh y access con los datos que necesitan los permisos, firmados junto con la
+    versión vigente: cambiar el rol, la sucursal o la contraseña los revoca.
+    """
+    refresh = RefreshToken.for_user(usuario)
+    for claim in CLAIMS_USUARIO:
+        refresh[claim] = getattr(usuario, claim)
+    refresh['version'] = usuario.version_token
+    return refresh
+
+
+class JWTClaimsAuthentication(JWTAuthentication):
+    """
+    Autenticación JWT que arma el usuario a partir de los claims del token en lugar
+    de leerlo de la base. Los demás campos quedan diferidos y se cargan solo si una
+    vista los usa. Los tokens sin versión (emitidos antes) siguen la ruta original.
+    """
+
+    def get_user(self, validated_token):
+        if 'version' not in validated_token:
+            return super().get_user(validated_token)
+        try:
+            usuario_id = int(validated_token[api_settings.USER_ID_CLAIM])
+            claims = [validated_token[claim] for claim in CLAIMS_USUARIO]
+        except (KeyError, TypeError, ValueError):
+            raise AuthenticationFailed("El token no tiene los datos del usuario.", code='token_invalido')
+
+        estado = estado_acceso(usuario_id)
+        if estado is None:
+            raise AuthenticationFailed("Usuario no encontrado.", code='user_not_found')
+        version, activo = estado
+        if not activo:
+            raise AuthenticationFailed("El usuario está inactivo.", code='user_inactive')
+        if validated_token['version'] != version:
+            raise AuthenticationFailed("El token fue revocado.", code='token_revocado')
+
+        valores = dict(zip(CLAIMS_USUARIO, claims), id=usuario_id, is_active=True, version_token=version)
+        # from_db espera los valores en el orden de los campos del modelo; los que faltan quedan diferidos
+        campos = [campo.attname for campo in Usuario._meta.concrete_fields if campo.attname in valores]
+        return Usuario.from_db(DEFAULT_DB_ALIAS, campos, [valores[campo] for campo in campos])
+
+
+class BackendUsuarios(ModelBackend):
+    """
+    ModelBackend que cuenta cuántas contraseñas se rehashearon al primer hasher de
+    PASSWORD_HASHERS (check_password lo hace solo cuando el hash guardado es de otro).
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(Usuario.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            usuario = Usuario._default_manager.get_by_natural_key(username)
+        except Usuario.DoesNotExist:
+            # mismo costo que con un usuario existente, para no revelar cuáles existen
+            Usuario().set_password(password)
+            return None
+        anterior = usuario.password
+        if usuario.check_password(password) and self.user_can_authenticate(usuario):
+            if usuario.password != anterior:
+                limitador.rehash()
+            return usuario
+        return None
@@ -0,0 +1,211 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+
+CONFIGURACION = {
+    'BACKEND': 'memoria',
+    'VENTANA': 300,
+    'MAXIMO_POR_USUARIO': 5,
+    'MAXIMO_POR_IP': 20,
+    # tomar la IP de X-Forwarded-For solo si el servidor está detrás de un proxy propio
+    'CONFIAR_EN_PROXY': False,
+}
+CONTADORES = ('intentos', 'bloqueados', 'exitosos', 'fallidos', 'rehash', 'ms_hash')
+
+
+def configuracion():
+    return {**CONFIGURACION, **getattr(settings, 'LIMITADOR_LOGIN', {})}
+
+
+class BackendMemoria:
+    """
+    Ventana deslizante exacta en memoria del proceso: guarda la hora de los últimos
+    fallos de cada clave. Acota la cantidad de claves para que un ataque con usuarios
+    inventados no haga crecer el diccionario sin límite.
+    """
+
+    CAPACIDAD = 100000
+
+    def __init__(self):
+        self._fallos = OrderedDict()
+        self._contadores = dict.fromkeys(CONTADORES, 0)
+        self._lock = threading.Lock()
+
+    def contar(self, clave, ventana, ahora):
+        with self._lock:
+            fallos = self._fallos.get(clave)
+            if not fallos:
+                return 0
+            while fallos and fallos[0] <= ahora - ventana:
+                fallos.popleft()
+            return len(fallos)
+
+    def registrar(self, clave, ventana, ahora, maximo):
+        with self._lock:
+            # no hace falta recordar más fallos que el máximo: con eso la clave ya está bloqueada
+            fallos = self._fallos.setdefault(clave, deque(maxlen=maximo))
+            fallos.append(ahora)
+            self._fallos.move_to_end(clave)
+            while len(self._fallos) > self.CAPACIDAD:
+                self._fallos.popitem(last=False)
+
+    def limpiar(self, clave, ventana, ahora):
+        with self._lock:
+            self._fallos.pop(clave, None)
+
+    def sumar(self, contador, cantidad=1):
+        with self._lock:
+            self._contadores[contador] += cantidad
+
+    def contadores(self):
+        with self._lock:
+            return dict(self._contadores)
+
+
+class BackendCache:
+    """
+    Ventana deslizante aproximada sobre la caché de Django, compartida entre procesos:
+    dos contadores de ventana fija (la actual y la anterior, ponderada por lo que
+    queda de ella) que se incrementan con incr.
+    """
+
+    PREFIJO = 'limitador'
+
+    def _clave(self, clave, indice):
+        return f"{self.PREFIJO}:{clave}:{indice}"
+
+    def contar(self, clave, ventana, ahora):
+        indice = int(ahora // ventana)
+        valores = cache.get_many([self._clave(clave, indice), self._clave(clave, indice - 1)])
+        actual = valores.get(self._clave(clave, indice), 0)
+        anterior = valores.get(self._clave(clave, indice - 1), 0)
+        transcurrido = (ahora % ventana) / ventana
+        return actual + anterior * (1 - transcurrido)
+
+    def registrar(self, clave, ventana, ahora, maximo):
+        nombre = self._clave(clave, int(ahora // ventana))
+        cache.add(nombre, 0, ventana * 2)
+        try:
+            cache.incr(nombre)
+        except ValueError:
+            # venció entre el add y el incr
+            cache.set(nombre, 1, ventana * 2)
+
+    def limpiar(self, clave, ventana, ahora):
+        indice = int(ahora // ventana)
+        cache.delete_many([self._clave(clave, indice), self._clave(clave, indice - 1)])
+
+    def sumar(self, contador, cantidad=1):
+        nombre = f"{self.PREFIJO}:contador:{contador}"
+        cache.add(nombre, 0, None)
+        try:
+            cache.incr(nombre, cantidad)
+        except ValueError:
+            cache.set(nombre, cantidad, None)
+
+    def contadores(self):
+        valores = cache.get_many([f"{self.PREFIJO}:contador:{contador}" for contador in CONTADORES])
+        return {contador: valores.get(f"{self.PREFIJO}:contador:{contador}", 0) for contador in CONTADORES}
+
+
+BACKENDS = {
+    'memoria': BackendMemoria,
+    'cache': BackendCache,
+}
+
+
+def clave_usuario(username):
+    # las claves van hasheadas: los usernames pueden traer cualquier cosa y la caché no acepta todo
+    return 'u:' + hashlib.sha256(str(username or '').strip().lower().encode()).hexdigest()[:32]
+
+
+def clave_ip(ip):
+    return f'ip:{ip}'
+
+
+def ip_cliente(request):
+    if configuracion()['CONFIAR_EN_PROXY']:
+        reenviada = request.META.get('HTTP_X_FORWARDED_FOR', '')
+        if reenviada:
+            return reenviada.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+class LimitadorLogin:
+    """
+    Corta los intentos de login de un usuario o una IP que acumularon demasiados
+    fallos en la ventana, antes de verificar la contraseña (que es lo caro).
+    """
+
+    def __init__(self):
+        self._backend = None
+        self._nombre_backend = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        nombre = configuracion()['BACKEND']
+        if self._backend is None or nombre != self._nombre_backend:
+            with self._lock:
+                clase = BACKENDS[nombre] if nombre in BACKENDS else import_string(nombre)
+                self._backend, self._nombre_backend = clase(), nombre
+        return self._backend
+
+    def reiniciar(self):
+        # descarta el backend (y con el de memoria, sus fallos y contadores)
+        with self._lock:
+            self._backend = None
+
+    def permitido(self, username, ip):
+        """
+        Devuelve True si el intento puede seguir hasta el hash de la contraseña.
+        """
+        opciones = configuracion()
+        ahora = time.time()
+        self.backend.sumar('intentos')
+        bloqueado = (
+            self.backend.contar(clave_usuario(username), opciones['VENTANA'], ahora) >= opciones['MAXIMO_POR_USUARIO']
+            or self.backend.contar(clave_ip(ip), opciones['VENTANA'], ahora) >= opciones['MAXIMO_POR_IP']
+        )
+        if bloqueado:
+            self.backend.sumar('bloqueados')
+        return not bloqueado
+
+    def fallo(self, username, ip):
+        opciones = configuracion()
+        ahora = time.time()
+        self.backend.sumar('fallidos')
+        self.backend.registrar(clave_usuario(username), opciones['VENTANA'], ahora, opciones['MAXIMO_POR_USUARIO'])
+        self.backend.registrar(clave_ip(ip), opciones['VENTANA'], ahora, opciones['MAXIMO_POR_IP'])
+
+    def exito(self, username):
+        # un login correcto libera al usuario; la IP conserva sus fallos
+        self.backend.sumar('exitosos')
+        self.backend.limpiar(clave_usuario(username), configuracion()['VENTANA'], time.time())
+
+    def medir_hash(self, segundos):
+        self.backend.sumar('ms_hash', round(segundos * 1000))
+
+    def rehash(self):
+        self.backend.sumar('rehash')
+
+    def contadores(self):
+        """
+        Contadores acumulados y una estimación del tiempo de hash que se ahorró con
+        los intentos bloqueados (al promedio de los que sí se verificaron).
+        """
+        valores = self.backend.contadores()
+        verificados = valores['exitosos'] + valores['fallidos']
+        promedio = valores['ms_hash'] / verificados if verificados else 0
+        valores['ms_hash_promedio'] = round(promedio, 1)
+        valores['ms_hash_ahorrados'] = round(valores['bloqueados'] * promedio)
+        return valores
+
+
+limitador = LimitadorLogin()
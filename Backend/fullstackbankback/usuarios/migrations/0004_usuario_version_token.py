@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0003_alter_usuario_sucursal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='version_token',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,6 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 
+# cambiar alguno de estos campos revoca los tokens emitidos: van como claims en el JWT
+CAMPOS_ACCESO = ('username', 'password', 'es_empleado', 'sucursal_id', 'is_active')
+
+
 class Usuario(AbstractUser):
     telefono = models.CharField(max_length=15, blank=True, null=True)
     direccion = models.CharField(max_length=150, blank=True, null=True)
@@ -13,6 +17,36 @@ class Usuario(AbstractUser):
         blank=True,
         default=1,
     )
+    version_token = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._acceso = {campo: instancia.__dict__[campo] for campo in CAMPOS_ACCESO if campo in instancia.__dict__}
+        return instancia
+
+    def check_password(self, raw_password):
+        # si el hash es de un hasher viejo, check_password lo rehashea y guarda: la contraseña
+        # es la misma, así que eso no tiene que revocar los tokens
+        self._rehasheando = True
+        try:
+            return super().check_password(raw_password)
+        finally:
+            self._rehasheando = False
+
+    def save(self, *args, **kwargs):
+        from .autenticacion import invalidar_acceso
+
+        anterior = getattr(self, '_acceso', None)
+        if anterior and getattr(self, '_rehasheando', False):
+            anterior = {campo: valor for campo, valor in anterior.items() if campo != 'password'}
+        if anterior and any(self.__dict__.get(campo) != valor for campo, valor in anterior.items()):
+            self.version_token += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version_token'}
+            transaction.on_commit(lambda: invalidar_acceso(self.id))
+        super().save(*args, **kwargs)
+        self._acceso = {campo: self.__dict__[campo] for campo in CAMPOS_ACCESO if campo in self.__dict__}
 
     def __str__(self):
-        return f"{self.username} ({'Empleado' if self.es_empleado else 'Cliente'})"
\ No newline at end of file
+        return f"{self.username} ({'Empleado' if self.es_empleado else 'Cliente'})"
@@ -0,0 +1,125 @@
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Usuario
+from .signals import perfiles_actualizados
+
+
+# campos que el personal puede corregir en lote; ninguno revoca tokens (ver CAMPOS_ACCESO)
+CAMPOS_PERFIL = ('direccion', 'telefono', 'email', 'first_name', 'last_name')
+MAXIMO_FILAS = 10000
+TAMANO_SENTENCIA = 500
+
+
+class LoteInvalido(Exception):
+    pass
+
+
+def validar_cambios(fila):
+    """
+    Devuelve {campo: valor} con los campos de perfil de la fila, o lanza ValueError.
+    """
+    cambios = {}
+    for campo in CAMPOS_PERFIL:
+        if campo not in fila:
+            continue
+        valor = fila[campo]
+        if valor is not None and not isinstance(valor, str):
+            raise ValueError(f"El campo {campo} debe ser texto")
+        valor = (valor or '').strip()
+        modelo = Usuario._meta.get_field(campo)
+        if len(valor) > modelo.max_length:
+            raise ValueError(f"El campo {campo} no puede superar los {modelo.max_length} caracteres")
+        if campo == 'email' and valor:
+            try:
+                validate_email(valor)
+            except ValidationError:
+                raise ValueError("El email no es válido")
+        # los campos que aceptan nulo lo guardan en lugar del texto vacío, como el resto de la app
+        cambios[campo] = valor or (None if modelo.null else '')
+    if not cambios:
+        raise ValueError(f"La fila no tiene ningún campo para actualizar ({', '.join(CAMPOS_PERFIL)})")
+    return cambios
+
+
+def actualizar_perfiles(sucursal_id, filas, simular=False):
+    """
+    Aplica correcciones de perfil a los usuarios de una sucursal. Cada fila identifica al
+    usuario con 'username_or_id' (uno numérico se busca como id y como username, porque
+    "2024" es un username válido) y trae los campos a cambiar. Los usuarios se buscan con
+    una sola consulta y se escriben con bulk_update, agrupados por el conjunto de campos
+    que cambian, en una transacción. Con `simular` solo se arma el informe.
+
+    Devuelve (resumen, informe) con una entrada por fila: los cambios {campo: {antes, despues}}
+    o el error.
+    """
+    if not isinstance(filas, list):
+        raise LoteInvalido("'filas' debe ser una lista.")
+    if len(filas) > MAXIMO_FILAS:
+        raise LoteInvalido(f"El lote no puede superar las {MAXIMO_FILAS} filas.")
+
+    validas = []
+    informe = []
+    for numero, fila in enumerate(filas, start=1):
+        entrada = {'fila': numero}
+        informe.append(entrada)
+        identificador = str(fila.get('username_or_id') or '').strip() if isinstance(fila, dict) else ''
+        if not identificador:
+            entrada['error'] = "El 'username_or_id' es obligatorio"
+            continue
+        try:
+            validas.append((entrada, identificador, validar_cambios(fila)))
+        except ValueError as e:
+            entrada['error'] = str(e)
+
+    ids = {int(identificador) for _, identificador, _ in validas if identificador.isdecimal()}
+    usernames = {identificador for _, identificador, _ in validas}
+    usuarios = list(
+        Usuario.objects.filter(Q(id__in=ids) | Q(username__in=usernames), sucursal_id=sucursal_id)
+        .only('id', 'username', 'sucursal', 'es_empleado', *CAMPOS_PERFIL)
+    )
+    por_id = {usuario.id: usuario for usuario in usuarios}
+    por_username = {usuario.username: usuario for usuario in usuarios}
+
+    grupos = {}
+    vistos = set()
+    for entrada, identificador, cambios in validas:
+        usuario = por_username.get(identificador)
+        if identificador.isdecimal() and int(identificador) in por_id:
+            if usuario is not None and usuario.id != int(identificador):
+                entrada['error'] = "El identificador es el id de un usuario y el username de otro"
+                continue
+            usuario = por_id[int(identificador)]
+        if usuario is None:
+            # los de otra sucursal se informan igual que los inexistentes
+            entrada['error'] = "Usuario no encontrado en la sucursal"
+            continue
+        if usuario.id in vistos:
+            entrada['error'] = "El usuario ya fue actualizado en otra fila del lote"
+            continue
+        vistos.add(usuario.id)
+        entrada.update(usuario=usuario.id, username=usuario.username, cambios={})
+        for campo, valor in cambios.items():
+            if getattr(usuario, campo) != valor:
+                entrada['cambios'][campo] = {'antes': getattr(usuario, campo), 'despues': valor}
+                setattr(usuario, campo, valor)
+        if entrada['cambios']:
+            grupos.setdefault(tuple(sorted(entrada['cambios'])), []).append(usuario)
+
+    if grupos and not simular:
+        with transaction.atomic():
+            for campos, modificados in grupos.items():
+                Usuario.objects.bulk_update(modificados, campos, batch_size=TAMANO_SENTENCIA)
+            perfiles_actualizados.send(
+                sender=Usuario, usuarios=[usuario for modificados in grupos.values() for usuario in modificados],
+            )
+
+    resumen = {
+        'actualizados': sum(len(modificados) for modificados in grupos.values()),
+        'sin_cambios': sum(1 for entrada in informe if entrada.get('cambios') == {}),
+        'errores': sum(1 for entrada in informe if 'error' in entrada),
+        'simulado': simular,
+    }
+    return resumen, informe
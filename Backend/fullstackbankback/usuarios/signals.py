@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+
+# las correcciones en lote se escriben con bulk_update, que no dispara post_save;
+# `usuarios` son las instancias ya modificadas
+perfiles_actualizados = Signal()
@@ -1,3 +1,155 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from sucursales.models import Sucursal
+from usuarios.limitador import limitador
+from usuarios.models import Usuario
+
+
+class AutenticacionPorClaimsTests(TestCase):
+    def setUp(self):
+        Sucursal.objects.get_or_create(id=1, defaults={'nombre': 'Central', 'direccion': 'Calle 1'})
+        self.usuario = Usuario.objects.create_user(username='cliente', password='x')
+        self.cliente = APIClient()
+        respuesta = self.cliente.post('/api/usuarios/login/', {'username': 'cliente', 'password': 'x'}, format='json')
+        self.cliente.credentials(HTTP_AUTHORIZATION=f"Bearer {respuesta.data['access']}")
+        cache.clear()
+
+    def test_con_la_version_en_cache_no_consulta_usuarios(self):
+        self.cliente.get('/api/finanzas/cuentas/')
+        # solo la consulta de las cuentas
+        with self.assertNumQueries(1):
+            respuesta = self.cliente.get('/api/finanzas/cuentas/')
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_los_datos_del_usuario_se_leen_con_una_consulta(self):
+        self.cliente.get('/api/finanzas/cuentas/')
+        for ruta in ('/api/usuarios/detalle/', '/api/usuarios/usuario/'):
+            with self.subTest(ruta=ruta), self.assertNumQueries(1):
+                respuesta = self.cliente.get(ruta)
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertEqual(respuesta.data['id'], self.usuario.id)
+        self.assertEqual(self.cliente.get('/api/usuarios/detalle/').data['sucursal']['nombre'], 'Central')
+
+    def test_cambiar_el_rol_revoca_el_token(self):
+        self.cliente.get('/api/finanzas/cuentas/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.es_empleado = True
+            self.usuario.save()
+        self.assertEqual(self.cliente.get('/api/finanzas/cuentas/').status_code, 401)
+
+    def test_otros_cambios_no_revocan_el_token(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.direccion = 'Calle 2'
+            self.usuario.save()
+        self.assertEqual(self.cliente.get('/api/finanzas/cuentas/').status_code, 200)
+
+
+class PBKDF2Rapido(PBKDF2PasswordHasher):
+    # el mismo formato que el de producción, sin el costo en los tests
+    iterations = 1
+
+
+@override_settings(LIMITADOR_LOGIN={'BACKEND': 'memoria', 'MAXIMO_POR_USUARIO': 3, 'MAXIMO_POR_IP': 10},
+                   PASSWORD_HASHERS=['usuarios.tests.PBKDF2Rapido', 'django.contrib.auth.hashers.MD5PasswordHasher'])
+class LimitadorLoginTests(TestCase):
+    def setUp(self):
+        Sucursal.objects.get_or_create(id=1, defaults={'nombre': 'Central', 'direccion': 'Calle 1'})
+        self.usuario = Usuario.objects.create_user(username='cliente', password='x')
+        self.cliente = APIClient()
+        limitador.reiniciar()
+
+    def login(self, username, password):
+        return self.cliente.post('/api/usuarios/login/', {'username': username, 'password': password}, format='json')
+
+    def test_bloquea_al_usuario_sin_verificar_la_contrasena(self):
+        for _ in range(3):
+            self.assertEqual(self.login('cliente', 'mal').status_code, 401)
+        with mock.patch.object(Usuario, 'check_password') as verificar:
+            self.assertEqual(self.login('cliente', 'x').status_code, 429)
+        verificar.assert_not_called()
+        self.assertEqual(limitador.contadores()['bloqueados'], 1)
+
+    def test_bloquea_la_ip_que_prueba_muchos_usuarios(self):
+        for i in range(10):
+            self.login(f'inventado{i}', 'mal')
+        self.assertEqual(self.login('cliente', 'x').status_code, 429)
+
+    def test_rehashea_las_contrasenas_con_un_hasher_viejo(self):
+        Usuario.objects.filter(id=self.usuario.id).update(password=make_password('x', hasher='md5'))
+        self.assertEqual(self.login('cliente', 'x').status_code, 200)
+        self.usuario.refresh_from_db()
+        self.assertTrue(self.usuario.password.startswith('pbkdf2_sha256$'))
+        self.assertEqual(limitador.contadores()['rehash'], 1)
+
+    def test_rehashear_no_revoca_los_tokens(self):
+        acceso = self.login('cliente', 'x').data['access']
+        Usuario.objects.filter(id=self.usuario.id).update(password=make_password('x', hasher='md5'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.login('cliente', 'x').status_code, 200)
+        self.assertEqual(limitador.contadores()['rehash'], 1)
+        self.usuario.refresh_from_db()
+        self.assertEqual(self.usuario.version_token, 0)
+        self.cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {acceso}')
+        self.assertEqual(self.cliente.get('/api/finanzas/cuentas/').status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ActualizarPerfilesTests(TestCase):
+    def setUp(self):
+        central, _ = Sucursal.objects.get_or_create(id=1, defaults={'nombre': 'Central', 'direccion': 'Calle 1'})
+        otra = Sucursal.objects.create(nombre='Norte', direccion='Calle 2')
+        empleado = Usuario.objects.create_user(username='empleado', password='x', es_empleado=True, sucursal=central)
+        self.clientes = [
+            Usuario.objects.create_user(username=f'cliente{i}', password='x', direccion='Vieja', sucursal=central)
+            for i in range(30)
+        ]
+        self.ajeno = Usuario.objects.create_user(username='ajeno', password='x', sucursal=otra)
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(empleado)
+
+    def actualizar(self, filas, **datos):
+        return self.cliente.post('/api/usuarios/actualizar-perfiles/', {'filas': filas, **datos}, format='json')
+
+    def test_informa_el_diff_por_fila_y_escribe_en_pocas_consultas(self):
+        filas = [{'username_or_id': str(cliente.id), 'direccion': f'Nueva {cliente.id}'} for cliente in self.clientes]
+        filas += [
+            {'username_or_id': 'cliente0', 'telefono': '123'},
+            {'username_or_id': 'ajeno', 'direccion': 'Nueva'},
+            {'username_or_id': 'cliente1', 'email': 'no-es-email'},
+        ]
+        # la búsqueda de los usuarios, un UPDATE por grupo de campos y el savepoint de la transacción
+        with self.assertNumQueries(4):
+            respuesta = self.actualizar(filas)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual((respuesta.data['actualizados'], respuesta.data['errores']), (30, 3))
+        self.assertEqual(respuesta.data['filas'][0]['cambios'],
+                         {'direccion': {'antes': 'Vieja', 'despues': f'Nueva {self.clientes[0].id}'}})
+        self.assertEqual(Usuario.objects.filter(direccion__startswith='Nueva').count(), 30)
+        self.ajeno.refresh_from_db()
+        self.assertIsNone(self.ajeno.direccion)
+
+    def test_un_identificador_numerico_tambien_se_busca_como_username(self):
+        Usuario.objects.create_user(username='2024', password='x', sucursal_id=1)
+        ambiguo = Usuario.objects.create_user(username=str(self.clientes[0].id), password='x', sucursal_id=1)
+        respuesta = self.actualizar([
+            {'username_or_id': '2024', 'direccion': 'Nueva'},
+            {'username_or_id': ambiguo.username, 'direccion': 'Nueva'},
+            {'username_or_id': str(self.clientes[1].id), 'direccion': 'Nueva'},
+        ])
+        self.assertEqual((respuesta.data['actualizados'], respuesta.data['errores']), (2, 1))
+        self.assertEqual(respuesta.data['filas'][0]['username'], '2024')
+        self.assertIn('username de otro', respuesta.data['filas'][1]['error'])
+        self.assertEqual(respuesta.data['filas'][2]['username'], 'cliente1')
+        self.clientes[0].refresh_from_db()
+        self.assertEqual(self.clientes[0].direccion, 'Vieja')
+
+    def test_simular_no_escribe(self):
+        respuesta = self.actualizar([{'username_or_id': 'cliente0', 'direccion': 'Vieja'},
+                                     {'username_or_id': 'cliente1', 'direccion': 'Nueva'}], simular=True)
+        self.assertEqual((respuesta.data['actualizados'], respuesta.data['sin_cambios']), (1, 1))
+        self.assertFalse(Usuario.objects.filter(direccion='Nueva').exists())
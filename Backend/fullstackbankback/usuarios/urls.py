@@ -1,10 +1,12 @@
 from django.urls import path
-from .views import LoginView, RegistroUsuarioView, DetalleUsuarioView, obtener_usuario, actualizar_direccion_usuario
+from .views import LoginView, ContadoresLoginView, RegistroUsuarioView, DetalleUsuarioView, obtener_usuario, actualizar_direccion_usuario, ActualizarPerfilesView
 
 urlpatterns = [
     path('login/', LoginView.as_view(), name='login'),
+    path('login/contadores/', ContadoresLoginView.as_view(), name='contadores_login'),
     path('registro/', RegistroUsuarioView.as_view(), name='registro'),
     path('detalle/', DetalleUsuarioView.as_view(), name='detalle_usuario'),
     path('usuario/', obtener_usuario, name='obtener_usuario'),
     path('actualizar-direccion/', actualizar_direccion_usuario, name='actualizar_direccion_usuario'),
+    path('actualizar-perfiles/', ActualizarPerfilesView.as_view(), name='actualizar_perfiles'),
 ]
@@ -1,5 +1,6 @@
+import time
+
 from rest_framework.decorators import api_view
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -7,6 +8,10 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.contrib.auth import authenticate
 from usuarios.serializers import RegistroSerializer, DetalleUsuarioSerializer
 from usuarios.models import Usuario
+from usuarios.autenticacion import emitir_tokens
+from usuarios.limitador import configuracion, ip_cliente, limitador
+from usuarios.perfiles import LoteInvalido, actualizar_perfiles
+from sucursales.permissions import EsEmpleado
 
 class LoginView(APIView):
     permission_classes = [AllowAny]
@@ -15,18 +20,36 @@ class LoginView(APIView):
         username = request.data.get('username')
         password = request.data.get('password')
 
+        # los bloqueados se rechazan antes de authenticate(): nunca llegan a hashear la contraseña
+        ip = ip_cliente(request)
+        if not limitador.permitido(username, ip):
+            ventana = configuracion()['VENTANA']
+            return Response({"detail": "Demasiados intentos fallidos. Intente más tarde."},
+                            status=status.HTTP_429_TOO_MANY_REQUESTS, headers={"Retry-After": str(ventana)})
+
+        inicio = time.perf_counter()
         user = authenticate(request, username=username, password=password)
+        limitador.medir_hash(time.perf_counter() - inicio)
         if user is not None:
-            refresh = RefreshToken.for_user(user)
+            limitador.exito(username)
+            refresh = emitir_tokens(user)
             return Response({
                 'access': str(refresh.access_token),
                 'refresh': str(refresh),
                 'es_empleado': user.es_empleado,
             }, status=status.HTTP_200_OK)
         else:
+            limitador.fallo(username, ip)
             return Response({"detail": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
 
 
+class ContadoresLoginView(APIView):
+    permission_classes = [IsAuthenticated, EsEmpleado]
+
+    def get(self, request):
+        return Response(limitador.contadores())
+
+
 class RegistroUsuarioView(APIView):
     permission_classes = [AllowAny]
 
@@ -35,7 +58,7 @@ class RegistroUsuarioView(APIView):
         if serializer.is_valid():
             user = serializer.save()
 
-            refresh = RefreshToken.for_user(user)
+            refresh = emitir_tokens(user)
             return Response({
                 'mensaje': 'Usuario registrado exitosamente',
                 'access': str(refresh.access_token),
@@ -50,15 +73,19 @@ class DetalleUsuarioView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        usuario = request.user
+        # el usuario autenticado viene de los claims del token, con el resto de los campos diferidos:
+        # se lee una vez con la sucursal en lugar de cargar cada campo por separado
+        usuario = Usuario.objects.select_related('sucursal').get(id=request.user.id)
         serializer = DetalleUsuarioSerializer(usuario)
         return Response(serializer.data)
 
 @api_view(['GET'])
 def obtener_usuario(request):
-    user = request.user
-    if not user.is_authenticated:
+    if not request.user.is_authenticated:
         return Response({"error": "Usuario no autenticado."}, status=401)
+    user = Usuario.objects.only('id', 'first_name', 'last_name', 'email', 'es_empleado', 'direccion').get(
+        id=request.user.id
+    )
 
     data = {
         "id": user.id,
@@ -106,6 +133,22 @@ def actualizar_direccion_usuario(request):
 
     # Actualizamos la dirección del usuario
     usuario.direccion = nueva_direccion
-    usuario.save()
+    usuario.save(update_fields=['direccion'])
 
-    return Response({"mensaje": "Dirección actualizada con éxito."}, status=status.HTTP_200_OK)
\ No newline at end of file
+    return Response({"mensaje": "Dirección actualizada con éxito."}, status=status.HTTP_200_OK)
+
+
+class ActualizarPerfilesView(APIView):
+    """
+    Correcciones de perfil en lote (por ejemplo, direcciones de un padrón postal) sobre
+    los usuarios de la sucursal del empleado. Devuelve el antes y el después de cada fila.
+    """
+    permission_classes = [IsAuthenticated, EsEmpleado]
+
+    def post(self, request):
+        simular = str(request.data.get('simular', '')).lower() in ('1', 'true', 'si')
+        try:
+            resumen, informe = actualizar_perfiles(request.user.sucursal_id, request.data.get('filas'), simular)
+        except LoteInvalido as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({**resumen, 'filas': informe}, status=status.HTTP_200_OK)
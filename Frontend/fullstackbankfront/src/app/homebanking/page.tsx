@@ -75,7 +75,7 @@ function useUltimasTransferencias() {
                 })
                 .then((res) => {
                   // Filtramos las transferencias que involucren las cuentas del usuario
-                  const transferenciasFiltradas = res.data.filter((transferencia) => 
+                  const transferenciasFiltradas = res.data.results.filter((transferencia) => 
                     cuentas.some((cuenta) => 
                       cuenta.id === transferencia.cuenta_origen || cuenta.id === transferencia.cuenta_destino
                     )
@@ -23,6 +23,40 @@ export default function Pagos() {
     pesos: 0,
     dolares: 0,
   });
+  const [siguiente, setSiguiente] = useState<string | null>(null);
+  const [cargandoMas, setCargandoMas] = useState<boolean>(false);
+
+  // el historial viene paginado de lo más nuevo a lo más viejo: `next` es la página siguiente, o null
+  async function cargarPagos(url = "http://localhost:8000/api/finanzas/pagos/", agregar = false) {
+    const token = localStorage.getItem("authToken");
+    const res = await fetch(url, {
+      method: "GET",
+      headers: {
+        "Content-Type": "application/json",
+        Authorization: `Bearer ${token}`,
+      },
+    });
+
+    if (!res.ok) {
+      throw new Error("No se pudieron obtener los pagos realizados.");
+    }
+
+    const data = await res.json();
+    setPagos((prev) => (agregar ? [...prev, ...data.results] : data.results));
+    setSiguiente(data.next);
+  }
+
+  const handleCargarMas = async () => {
+    if (!siguiente) return;
+    setCargandoMas(true);
+    try {
+      await cargarPagos(siguiente, true);
+    } catch (err) {
+      setError("Ocurrió un error al cargar más pagos.");
+    } finally {
+      setCargandoMas(false);
+    }
+  };
 
   useEffect(() => {
     async function fetchUsuario() {
@@ -90,24 +124,7 @@ export default function Pagos() {
     if (usuarioId !== null) {
       async function fetchPagos() {
         try {
-          const token = localStorage.getItem("authToken");
-          const res = await fetch(`http://localhost:8000/api/finanzas/pagos/`, {
-            method: "GET",
-            headers: {
-              "Content-Type": "application/json",
-              Authorization: `Bearer ${token}`,
-            },
-          });
-
-          if (!res.ok) {
-            throw new Error("No se pudieron obtener los pagos realizados.");
-          }
-
-          const data = await res.json();
-          const pagosOrdenados = data.sort((a: Pago, b: Pago) =>
-            new Date(b.fecha_pago).getTime() - new Date(a.fecha_pago).getTime()
-          );
-          setPagos(pagosOrdenados);
+          await cargarPagos();
         } catch (err) {
           setError("Ocurrió un error al obtener los pagos.");
         }
@@ -272,6 +289,17 @@ export default function Pagos() {
           ) : (
               <p className="text-gray-500 text-center">No has realizado pagos aún.</p>
           )}
+          {siguiente && (
+              <div className="flex justify-center mt-4">
+                <button
+                    onClick={handleCargarMas}
+                    disabled={cargandoMas}
+                    className="px-4 py-2 bg-gray-300 text-gray-800 rounded-lg hover:bg-gray-400 transition-colors"
+                >
+                  {cargandoMas ? "Cargando..." : "Cargar más"}
+                </button>
+              </div>
+          )}
         </div>
 
         <div className="flex justify-center mt-10">
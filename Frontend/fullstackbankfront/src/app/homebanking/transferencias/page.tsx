@@ -33,6 +33,46 @@ export default function Transferencias() {
   const [isModalOpen, setIsModalOpen] = useState(false);
   const [usernameLogueado, setUsernameLogueado] = useState<string>("");
   const [loading, setLoading] = useState<boolean>(false);
+  const [siguiente, setSiguiente] = useState<string | null>(null);
+  const [cargandoMas, setCargandoMas] = useState<boolean>(false);
+
+  // el historial viene paginado: `next` es la URL de la página siguiente, o null si no hay más
+  async function cargarTransferencias(
+    url = "http://localhost:8000/api/finanzas/transferencias/",
+    agregar = false
+  ) {
+    const token = localStorage.getItem("authToken");
+    const res = await fetch(url, {
+      method: "GET",
+      headers: {
+        "Content-Type": "application/json",
+        Authorization: `Bearer ${token}`,
+      },
+    });
+
+    if (!res.ok) {
+      throw new Error("Error al cargar las transferencias.");
+    }
+
+    const data = await res.json();
+    const transferenciasFiltradas = data.results.filter((transferencia: Transferencia) =>
+      transferencia.cuenta_origen === cuentaId || transferencia.cuenta_destino === cuentaId
+    );
+    setTransferencias((prev) => (agregar ? [...prev, ...transferenciasFiltradas] : transferenciasFiltradas));
+    setSiguiente(data.next);
+  }
+
+  const handleCargarMas = async () => {
+    if (!siguiente) return;
+    setCargandoMas(true);
+    try {
+      await cargarTransferencias(siguiente, true);
+    } catch (err) {
+      setError("Ocurrió un error al cargar más transferencias.");
+    } finally {
+      setCargandoMas(false);
+    }
+  };
 
   useEffect(() => {
     async function fetchUsuario() {
@@ -101,24 +141,7 @@ export default function Transferencias() {
     if (usuarioId !== null) {
       async function fetchTransferencias() {
         try {
-          const token = localStorage.getItem("authToken");
-          const res = await fetch("http://localhost:8000/api/finanzas/transferencias/", {
-            method: "GET",
-            headers: {
-              "Content-Type": "application/json",
-              Authorization: `Bearer ${token}`,
-            },
-          });
-
-          if (!res.ok) {
-            throw new Error("Error al cargar las transferencias.");
-          }
-
-          const data = await res.json();
-          const transferenciasFiltradas = data.filter((transferencia: Transferencia) => 
-            transferencia.cuenta_origen === cuentaId || transferencia.cuenta_destino === cuentaId
-          );
-          setTransferencias(transferenciasFiltradas.reverse());
+          await cargarTransferencias();
         } catch (err) {
           setError("Ocurrió un error al cargar las transferencias.");
         }
@@ -164,19 +187,8 @@ export default function Transferencias() {
       setDescripcion("");
       setIsModalOpen(false);
 
-      const resTransferencias = await fetch("http://localhost:8000/api/finanzas/transferencias/", {
-        method: "GET",
-        headers: {
-          "Content-Type": "application/json",
-          Authorization: `Bearer ${token}`,
-        },
-      });
-      const dataTransferencias = await resTransferencias.json();
-      const transferenciasFiltradas = dataTransferencias.filter(
-        (transferencia: Transferencia) =>
-          transferencia.cuenta_origen === cuentaId || transferencia.cuenta_destino === cuentaId
-      );
-      setTransferencias(transferenciasFiltradas.reverse());
+      // se vuelve a la primera página para mostrar la nueva transferencia arriba
+      await cargarTransferencias();
     } catch (err) {
       setError("Ocurrió un error al procesar la transferencia.");
     }
@@ -276,6 +288,17 @@ export default function Transferencias() {
           ) : (
               <p className="text-gray-500 text-center">No se han realizado transferencias aún.</p>
           )}
+          {siguiente && (
+              <div className="flex justify-center mt-4">
+                <button
+                    onClick={handleCargarMas}
+                    disabled={cargandoMas}
+                    className="px-4 py-2 bg-gray-300 text-gray-800 rounded-lg hover:bg-gray-400 transition-colors"
+                >
+                  {cargandoMas ? "Cargando..." : "Cargar más"}
+                </button>
+              </div>
+          )}
         </div>
 
         {isModalOpen && (